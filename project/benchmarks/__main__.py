@@ -0,0 +1,74 @@
+"""
+Benchmark suite of the billing pipeline, runs against a throwaway test database
+
+Run from the project directory:
+    python -m benchmarks --output new.json --compare baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime
+
+
+def int_list(value: str) -> list:
+    return [int(i) for i in value.split(',') if i]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks')
+    parser.add_argument('--units', type=int_list, default=[4, 64, 512, 4096], help='Comma separated unit counts')
+    parser.add_argument('--buildings', type=int_list, default=[1, 10, 100, 1000], help='Comma separated building counts')
+    parser.add_argument('--changelist-rows', type=int_list, default=[1000], help='Comma separated changelist page sizes')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs of each benchmark, median is reported')
+    parser.add_argument('--output', help='Write results to this json file')
+    parser.add_argument('--compare', help='Json file of a previous run to compare with')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='Allowed slowdown and memory growth ratio before failing, queries may not grow at all')
+    args = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project.settings')
+    import django
+    django.setup()
+
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+    from .suite import run_suite, compare
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        results = run_suite(args.units, args.buildings, args.repeat, changelist_rows=args.changelist_rows,
+                            log=lambda key, metrics: print('%-50s %10.4fs %6d queries %12d bytes' % (
+                                key, metrics['seconds'], metrics['queries'], metrics['peak_memory'])))
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ''
+    output = {
+        'meta': {'commit': commit, 'created': datetime.now().isoformat(), 'python': platform.python_version()},
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(output, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.threshold)
+        for key, metric, old, new in regressions:
+            print('REGRESSION %s %s: %s -> %s' % (key, metric, old, new), file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
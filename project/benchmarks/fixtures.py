@@ -0,0 +1,29 @@
+import jdatetime
+
+from building.models import Building, Usage, UnitUsage, WaterBill, GasBill, SubmeterCalculator, ExtraCharge, Debt
+
+
+def create_submeter_calculator(units: int, name: str = 'benchmark') -> SubmeterCalculator:
+    """
+    Building with units, two readings, both bills, an extra charge and a debt for every tenth unit
+    """
+    jalali_date = jdatetime.date(1401, 6, 1)
+    building = Building.objects.create(name=name, units=units)
+    pre_usage = Usage.objects.create(building=building, register_date=jdatetime.date(1401, 4, 10))
+    cur_usage = Usage.objects.create(building=building, register_date=jdatetime.date(1401, 5, 19))
+    UnitUsage.objects.bulk_create(
+        [UnitUsage(usage=pre_usage, unit=unit, amount=1000000 + unit) for unit in range(1, units + 1)] +
+        # Spread usages over every price bracket
+        [UnitUsage(usage=cur_usage, unit=unit, amount=1000000 + unit + (unit * 7919) % 90000) for unit in range(1, units + 1)],
+        batch_size=1000,
+    )
+    water_bill = WaterBill.objects.create(building=building, issuance_date=jalali_date, current_reading=jalali_date,
+                                          payment_deadline=jalali_date, water_consumption_price=695800 * units,
+                                          total_payment=1227700 * units)
+    gas_bill = GasBill.objects.create(building=building, issuance_date=jalali_date, current_reading=jalali_date,
+                                      payment_deadline=jalali_date, total_payment=339300 * units)
+    sc = SubmeterCalculator.objects.create(water_bill=water_bill, gas_bill=gas_bill,
+                                           previous_usage=pre_usage, current_usage=cur_usage)
+    ExtraCharge.objects.create(submeter_calculator=sc, title='maintenance', amount=50000)
+    Debt.objects.bulk_create([Debt(submeter_calculator=sc, unit=unit, amount=10000) for unit in range(1, units + 1, 10)])
+    return sc
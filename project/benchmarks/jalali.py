@@ -0,0 +1,78 @@
+"""
+Micro-benchmark of Jalali humanize functions against the uncached versions they replaced,
+on the columns of a 1000 row water bill changelist
+
+Run from the project directory:
+    python -m benchmarks.jalali [rows]
+"""
+import datetime
+import os
+import sys
+import timeit
+
+import jdatetime
+
+
+def legacy_date_farsi_month_name(my_date) -> str:
+    from project.functions import months_fa
+
+    if not isinstance(my_date, jdatetime.date):
+        my_date = jdatetime.date.fromgregorian(date=my_date)
+    return '%(day)d %(month)s %(year)d' % {'day': my_date.day, 'month': months_fa[my_date.month], 'year': my_date.year}
+
+
+def legacy_datetime_farsi_month_name(my_datetime) -> str:
+    from django.utils import timezone
+    from project.functions import months_fa
+
+    if not isinstance(my_datetime, jdatetime.datetime):
+        my_datetime = jdatetime.datetime.fromgregorian(datetime=timezone.localtime(my_datetime))
+    return '%(day)d %(month)s %(year)d - %(hour)d:%(minute)d' % {
+        'day': my_datetime.day, 'month': months_fa[my_datetime.month], 'year': my_datetime.year,
+        'hour': my_datetime.hour, 'minute': my_datetime.minute,
+    }
+
+
+def changelist_columns(rows: int) -> tuple:
+    """
+    Issuance dates shared by bills of a cycle and distinct creation datetimes
+    """
+    start = datetime.datetime(2022, 3, 21, 9, tzinfo=datetime.timezone.utc)
+    issuance_dates = [(start + datetime.timedelta(days=30 * (i % 24))).date() for i in range(rows)]
+    created = [start + datetime.timedelta(days=30 * (i % 24), minutes=i) for i in range(rows)]
+    return issuance_dates, created
+
+
+def main(rows: int = 1000) -> None:
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project.settings')
+    import django
+    django.setup()
+
+    from project.functions import clear_jalali_caches, date_farsi_month_name, datetime_farsi_month_name
+
+    issuance_dates, created = changelist_columns(rows)
+
+    def cold(func):
+        def run():
+            clear_jalali_caches()
+            func()
+        return run
+
+    per_row = lambda: [(date_farsi_month_name(d), datetime_farsi_month_name(c)) for d, c in zip(issuance_dates, created)]
+    timings = {
+        'legacy per row': lambda: [(legacy_date_farsi_month_name(d), legacy_datetime_farsi_month_name(c))
+                                   for d, c in zip(issuance_dates, created)],
+        'memoized, cold cache': cold(per_row),
+        'memoized, warm cache': per_row,
+    }
+
+    print(f'{rows:,} changelist rows, issuance date and creation datetime columns, best of 5')
+    baseline = None
+    for name, func in timings.items():
+        seconds = min(timeit.repeat(func, number=1, repeat=5))
+        baseline = baseline or seconds
+        print(f'{name:>22}: {seconds * 1000:9.2f} ms  {baseline / seconds:6.1f}x')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,53 @@
+"""
+Micro-benchmark of round_price against the string based version it replaced
+
+Run from the project directory:
+    python -m benchmarks.round_price [count]
+"""
+import sys
+import timeit
+
+import numpy as np
+
+from building.functions import round_price, round_prices
+
+
+def legacy_round_price(price: int) -> int:
+    if price == 0:
+        return 0
+
+    if len(str(price)) <= 2:
+        return 100
+
+    else:
+        # Delete last digit
+        price //= 10
+        if price % 10 >= 5:
+            price //= 10
+            price += 1
+        else:
+            price //= 10
+        price *= 100
+        return price
+
+
+def main(count: int = 1_000_000) -> None:
+    prices = np.random.default_rng(0).integers(0, 2_000_000, count)
+    price_list = prices.tolist()
+
+    timings = {
+        'legacy round_price': lambda: [legacy_round_price(price) for price in price_list],
+        'round_price': lambda: [round_price(price) for price in price_list],
+        'round_prices': lambda: round_prices(prices),
+    }
+
+    print(f'{count:,} prices, best of 5')
+    baseline = None
+    for name, func in timings.items():
+        seconds = min(timeit.repeat(func, number=1, repeat=5))
+        baseline = baseline or seconds
+        print(f'{name:>20}: {seconds * 1000:9.2f} ms  {baseline / seconds:6.1f}x')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,156 @@
+import gc
+import statistics
+import tracemalloc
+from io import StringIO
+from time import perf_counter
+
+import jdatetime
+import numpy as np
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from building.functions import get_price_over_14_m3, get_prices_over_14_m3, round_price, round_prices
+from building.models import Building, SubmeterCalculator, Result, WaterBill
+
+from .fixtures import create_submeter_calculator
+
+
+def measure(func, repeat: int, setup=None) -> dict:
+    """
+    Median wall time, queries and peak traced memory of func
+
+    :param setup: called before every run of func, it is not timed, traced or counted
+    """
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        gc.collect()
+        started = perf_counter()
+        func()
+        timings.append(perf_counter() - started)
+
+    # Memory and queries of a separate run so tracing does not slow down timed runs
+    if setup is not None:
+        setup()
+    tracemalloc.start()
+    with CaptureQueriesContext(connection) as queries:
+        func()
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {'seconds': statistics.median(timings), 'queries': len(queries), 'peak_memory': peak_memory}
+
+
+def unit_benchmarks(units: int, client: Client) -> dict:
+    rng = np.random.default_rng(units)
+    usages = rng.uniform(0, 120000, units)
+    usage_list = usages.tolist()
+    prices = rng.integers(0, 2000000, units)
+    price_list = prices.tolist()
+
+    sc = create_submeter_calculator(units, name='units %d' % units)
+    result = sc.calculate_submeter_prices()['result_object']
+
+    return {
+        'get_price_over_14_m3': lambda: [get_price_over_14_m3(usage) for usage in usage_list],
+        'get_prices_over_14_m3': lambda: get_prices_over_14_m3(usages),
+        'round_price': lambda: [round_price(price) for price in price_list],
+        'round_prices': lambda: round_prices(prices),
+        'calculate_submeter_prices': lambda: sc.calculate_submeter_prices(force=True),
+        'result_change_page': lambda: client.get(reverse('admin:building_result_change', args=[result.id])),
+        'printable_result_view': lambda: client.get(reverse('admin:building_result_printable_result', args=[result.id])),
+    }
+
+
+def building_benchmarks(buildings: int) -> dict:
+    SubmeterCalculator.objects.all().delete()
+    for i in range(buildings):
+        create_submeter_calculator(16, name='building %d' % i)
+
+    def calculate_all():
+        call_command('calculate_all', '--workers', '1', stdout=StringIO())
+
+    return {'calculate_all': calculate_all}
+
+
+def clear_results() -> None:
+    """
+    Setup of building benchmarks, so every run calculates all calculators again
+    """
+    Result.objects.all().delete()
+
+
+def changelist_benchmarks(rows: int, client: Client) -> dict:
+    """
+    Water bill changelist showing rows bills on one page, bills of a cycle share dates
+    """
+    WaterBill.objects.all().delete()
+    building = Building.objects.create(name='changelist', units=4)
+    bills = []
+    for i in range(rows):
+        jalali_date = jdatetime.date(1400, 1, 1) + jdatetime.timedelta(days=30 * (i % 24))
+        bills.append(WaterBill(building=building, issuance_date=jalali_date, current_reading=jalali_date,
+                               payment_deadline=jalali_date, water_consumption_price=695800, total_payment=1227700))
+    WaterBill.objects.bulk_create(bills, batch_size=1000)
+
+    model_admin = admin.site._registry[WaterBill]
+    url = reverse('admin:building_waterbill_changelist')
+
+    def changelist():
+        list_per_page = model_admin.list_per_page
+        model_admin.list_per_page = rows
+        try:
+            client.get(url)
+        finally:
+            model_admin.list_per_page = list_per_page
+
+    return {'water_bill_changelist': changelist}
+
+
+def run_suite(units_sizes, building_counts, repeat: int, log=print, changelist_rows=()) -> dict:
+    user = User.objects.create_superuser(username='benchmark', password='benchmark')
+    client = Client()
+    client.force_login(user)
+
+    results = {}
+    for units in units_sizes:
+        for name, func in unit_benchmarks(units, client).items():
+            key = '%s[units=%d]' % (name, units)
+            results[key] = measure(func, repeat)
+            log(key, results[key])
+
+    for rows in changelist_rows:
+        for name, func in changelist_benchmarks(rows, client).items():
+            key = '%s[rows=%d]' % (name, rows)
+            results[key] = measure(func, repeat)
+            log(key, results[key])
+
+    for buildings in building_counts:
+        for name, func in building_benchmarks(buildings).items():
+            key = '%s[buildings=%d]' % (name, buildings)
+            results[key] = measure(func, repeat, setup=clear_results)
+            log(key, results[key])
+
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """
+    :return regressions as (benchmark, metric, baseline value, new value)
+    """
+    regressions = []
+    for key, metrics in results.items():
+        if key not in baseline:
+            continue
+        for metric in ('seconds', 'peak_memory'):
+            if metrics[metric] > baseline[key][metric] * (1 + threshold):
+                regressions.append((key, metric, baseline[key][metric], metrics[metric]))
+        if metrics['queries'] > baseline[key]['queries']:
+            regressions.append((key, 'queries', baseline[key]['queries'], metrics['queries']))
+    return regressions
@@ -1,11 +1,84 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.core.exceptions import ValidationError, PermissionDenied
+from django.http import Http404, HttpResponse
 from django.utils.translation import gettext_lazy as _
 from django.urls import path
-from django.shortcuts import redirect, reverse, render
+from django.shortcuts import redirect, reverse, render, get_object_or_404
 from django.template.response import TemplateResponse
 from adminsortable2.admin import SortableStackedInline, SortableTabularInline, SortableAdminBase
 
-from .models import Building, Usage, UnitUsage, WaterBill, GasBill, SubmeterCalculator, ExtraCharge, Debt, Result, UnitResult
+from .exports import FORMATS, export_response, reading_export, unit_result_export
+from .jobs import enqueue_calculation
+from .pagination import KeysetPaginationMixin
+from .printing import get_printable_result_html
+from .readings import ReadingImporter
+from project.functions import months_fa
+from .models import (CalculationJob, Building, City, CityCoefficient, TariffSchedule, TariffBracket, Usage, UnitUsage, WaterBill, GasBill,
+                     SubmeterCalculator, ExtraCharge, Debt, Result, UnitResult)
+
+
+class JalaliPeriodListFilter(admin.SimpleListFilter):
+    """
+    Filter by stored jalali_year and jalali_month, value is like 1402-07
+    """
+    title = _('jalali month')
+    parameter_name = 'jalali_period'
+
+    def lookups(self, request, model_admin):
+        return [('%d-%02d' % (year, month), '%s %d' % (months_fa[month], year))
+                for year, month in model_admin.get_queryset(request).jalali_periods()]
+
+    def queryset(self, request, queryset):
+        if not self.value():
+            return queryset
+        try:
+            year, month = map(int, self.value().split('-'))
+        except ValueError:
+            raise IncorrectLookupParameters
+        return queryset.in_jalali_period(year, month)
+
+
+def export_action(build, export_format: str, name: str, description: str):
+    """
+    Admin action downloading export of selected objects
+    :param build: unit_result_export or reading_export
+    """
+    def action(modeladmin, request, queryset):
+        return export_response(build(queryset=queryset), export_format, name)
+
+    action.__name__ = 'export_%s_%s' % (name.replace('-', '_'), export_format)
+    return admin.action(action, description=description % {'format': export_format.upper()})
+
+
+class CityCoefficientInlineAdmin(admin.TabularInline):
+    model = CityCoefficient
+    fields = ('coefficient', 'valid_from', 'valid_until')
+    extra = 0
+
+
+@admin.register(City)
+class CityAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'created_jalali_humanize')
+    list_display_links = ('id', 'name')
+    search_fields = ('name',)
+    ordering = ('name',)
+    inlines = (CityCoefficientInlineAdmin,)
+
+
+class TariffBracketInlineAdmin(admin.TabularInline):
+    model = TariffBracket
+    fields = ('upper_bound', 'slope', 'intercept')
+    extra = 0
+
+
+@admin.register(TariffSchedule)
+class TariffScheduleAdmin(admin.ModelAdmin):
+    list_display = ('id', 'title', 'valid_from', 'valid_until', 'created_jalali_humanize')
+    list_display_links = ('id', 'title')
+    ordering = ('-valid_from',)
+    inlines = (TariffBracketInlineAdmin,)
 
 
 @admin.register(Building)
@@ -13,10 +86,14 @@ class BuildingAdmin(admin.ModelAdmin):
     list_display = ('id', 'name', 'units', 'created_jalali_humanize')
     list_display_links = ('id', 'name')
     search_fields = ('name',)
-    list_filter = ('created',)
+    list_filter = ('city', 'created')
     ordering = ('-created',)
 
 
+class ImportReadingsForm(forms.Form):
+    file = forms.FileField(label=_('file'), help_text=_('CSV or XLSX with building, date, unit and liters columns'))
+
+
 class UnitUsageInlineAdmin(SortableStackedInline):
     model = UnitUsage
     fields = ('unit', 'amount')
@@ -24,19 +101,58 @@ class UnitUsageInlineAdmin(SortableStackedInline):
 
 
 @admin.register(Usage)
-class UsageAdmin(SortableAdminBase, admin.ModelAdmin):
+class UsageAdmin(KeysetPaginationMixin, SortableAdminBase, admin.ModelAdmin):
     list_display = ('id', 'register_date_jalali_humanize', 'building', 'last_update_jalali_humanize', 'created_jalali_humanize')
     list_display_links = ('id', 'register_date_jalali_humanize')
-    list_filter = ('register_date',)
+    list_filter = (JalaliPeriodListFilter, 'register_date')
+    list_select_related = ('building',)
     ordering = ('-register_date',)
     inlines = (UnitUsageInlineAdmin,)
+    actions = [export_action(reading_export, export_format, 'readings', _('Export readings as %(format)s'))
+               for export_format in FORMATS]
+
+    def get_urls(self):
+        urls = super().get_urls()
+        my_urls = [
+            path('import/', self.admin_site.admin_view(self.import_readings_view), name='building_usage_import_readings'),
+        ]
+        return my_urls + urls
+
+    def import_readings_view(self, request):
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+
+        importer = None
+        form = ImportReadingsForm(request.POST or None, request.FILES or None)
+        if form.is_valid():
+            file = form.cleaned_data['file']
+            try:
+                importer = ReadingImporter().import_file(file, file.name)
+            except ValidationError as e:
+                form.add_error('file', e.messages)
+            else:
+                self.message_user(request, _('%(imported)d of %(rows)d rows imported into %(usages)d new usages.') % {
+                    'imported': importer.imported, 'rows': importer.rows, 'usages': importer.usages_created},
+                    level=messages.WARNING if importer.error_count else messages.SUCCESS)
+                if not importer.error_count:
+                    return redirect('admin:building_usage_changelist')
+
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': _('Import readings'),
+            'form': form,
+            'importer': importer,
+        }
+        return TemplateResponse(request, 'admin/import_readings.html', context=context)
 
 
 @admin.register(WaterBill)
 class WaterBillAdmin(admin.ModelAdmin):
     list_display = ('id', 'issuance_date_jalali_humanize', 'total_payment_humanize', 'building', 'created_jalali_humanize')
     list_display_links = ('id', 'issuance_date_jalali_humanize')
-    list_filter = ('created',)
+    list_filter = (JalaliPeriodListFilter, 'created')
+    list_select_related = ('building',)
     ordering = ('-issuance_date',)
     readonly_fields = ('tax_humanize', 'share_of_tax_for_each_unit_humanize')
 
@@ -71,7 +187,8 @@ class WaterBillAdmin(admin.ModelAdmin):
 class GasBillAdmin(admin.ModelAdmin):
     list_display = ('id', 'issuance_date_jalali_humanize', 'total_payment_humanize', 'building', 'created_jalali_humanize')
     list_display_links = ('id', 'issuance_date_jalali_humanize')
-    list_filter = ('created',)
+    list_filter = (JalaliPeriodListFilter, 'created')
+    list_select_related = ('building',)
     ordering = ('-issuance_date',)
     readonly_fields = ('share_of_price_for_each_unit_humanize',)
 
@@ -112,21 +229,68 @@ class DebtInlineAdmin(admin.TabularInline):
 
 
 @admin.register(SubmeterCalculator)
-class SubmeterCalculatorAdmin(SortableAdminBase, admin.ModelAdmin):
+class SubmeterCalculatorAdmin(KeysetPaginationMixin, SortableAdminBase, admin.ModelAdmin):
     list_display = ('id', 'water_bill', 'current_usage', 'created_jalali_humanize')
     list_display_links = ('id', 'water_bill')
-    list_filter = ('water_bill__issuance_date', 'created')
+    list_filter = ('water_bill__issuance_date', 'created', 'archived')
+    list_select_related = ('water_bill__building', 'current_usage')
     raw_id_fields = ('water_bill', 'gas_bill', 'previous_usage', 'current_usage')
     ordering = ('-created',)
     inlines = (ExtraChargeInlineAdmin, DebtInlineAdmin)
     
     change_form_template = 'admin/submeter_change_form.html'
 
+    def get_urls(self):
+        urls = super().get_urls()
+        my_urls = [
+            path('<int:object_id>/preview/', self.admin_site.admin_view(self.preview_view), name='building_submetercalculator_preview'),
+            path('<int:object_id>/commit/', self.admin_site.admin_view(self.commit_view), name='building_submetercalculator_commit'),
+        ]
+        return my_urls + urls
+
+    def preview_view(self, request, object_id):
+        obj = self.get_object(request, object_id)
+        if obj is None or not self.has_view_or_change_permission(request, obj):
+            raise PermissionDenied
+
+        try:
+            calculation = obj.preview_submeter_prices()
+        except ValidationError as e:
+            self.message_user(request, ' '.join(e.messages), level=messages.ERROR)
+            return redirect('admin:building_submetercalculator_change', obj.id)
+
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'original': obj,
+            'title': _('Preview of %s') % obj,
+            'calculation': calculation,
+            'has_change_permission': self.has_change_permission(request, obj),
+        }
+        return TemplateResponse(request, 'admin/submeter_preview.html', context=context)
+
+    def commit_view(self, request, object_id):
+        obj = self.get_object(request, object_id)
+        if request.method != 'POST' or obj is None or not self.has_change_permission(request, obj):
+            raise PermissionDenied
+
+        return self.calculate_and_redirect(request, obj)
+
+    def calculate_and_redirect(self, request, obj):
+        try:
+            job = enqueue_calculation(obj)
+        except ValidationError as e:
+            self.message_user(request, ' '.join(e.messages), level=messages.ERROR)
+            return redirect('admin:building_submetercalculator_change', obj.id)
+        self.message_user(request, _('Submeter prices calculation queued.'))
+        return redirect('admin:building_calculationjob_status', job.id)
+
     def response_change(self, request, obj):
+        if "_preview_function" in request.POST:
+            return redirect('admin:building_submetercalculator_preview', obj.id)
+
         if "_calculate_function" in request.POST:
-            result_object = obj.calculate_submeter_prices()['result_object']
-            self.message_user(request, _('Submeter prices calculated.'))
-            return redirect('admin:building_result_change', result_object.id)
+            return self.calculate_and_redirect(request, obj)
 
         return super().response_change(request, obj)
 
@@ -137,20 +301,23 @@ class UnitResultInlineAdmin(SortableTabularInline):
 
 
 @admin.register(Result)
-class ResultAdmin(SortableAdminBase, admin.ModelAdmin):
+class ResultAdmin(KeysetPaginationMixin, SortableAdminBase, admin.ModelAdmin):
     list_display = ('id', 'created_jalali_humanize', 'due_date_jalali_humanize')
     list_display_links = ('id',)
-    list_filter = ('created',)
+    list_filter = (JalaliPeriodListFilter, 'created')
+    list_select_related = ('submeter_calculator__water_bill__building',)
     ordering = ('-created',)
     raw_id_fields = ('submeter_calculator',)
     inlines = (UnitResultInlineAdmin,)
-    readonly_fields = ('id', 'submeter_calculator_details_pretty_print')
-    fields = ('id', 'submeter_calculator', 'due_date', 'my_notes', 'client_notes', 'submeter_calculator_details', 'submeter_calculator_details_pretty_print')
+    actions = [export_action(unit_result_export, export_format, 'unit-results', _('Export unit results as %(format)s'))
+               for export_format in FORMATS]
+    readonly_fields = ('id', 'submeter_calculator_details_pretty_print', 'input_fingerprint')
+    fields = ('id', 'submeter_calculator', 'due_date', 'my_notes', 'client_notes', 'submeter_calculator_details_pretty_print', 'input_fingerprint')
 
     change_form_template = 'admin/result_change_form.html'
 
     def submeter_calculator_details_pretty_print(self, obj):
-        return '\n'.join([f'{key}: {value}' for key,value in obj.submeter_calculator_details.items()])
+        return '\n'.join([f'{key}: {value}' for key,value in (obj.submeter_calculator_details or {}).items()])
         # return obj.submeter_calculator_details
 
 
@@ -162,18 +329,59 @@ class ResultAdmin(SortableAdminBase, admin.ModelAdmin):
         return my_urls + urls
 
     def printable_result_view(self, request, result_id):
-
-        result = Result.objects.get(id=result_id)
-        context = {
-            'result': result,
-            'sc': result.submeter_calculator,
-            'water_bill': result.submeter_calculator.water_bill,
-            'gas_bill': result.submeter_calculator.gas_bill,
-        }
-        return TemplateResponse(request, 'building/printable_result.html', context=context)
+        try:
+            html = get_printable_result_html(result_id)
+        except Result.DoesNotExist:
+            raise Http404
+        return HttpResponse(html)
 
     def response_change(self, request, obj):
         if '_printable_result' in request.POST:
             return redirect('admin:building_result_printable_result', obj.id)
+
+        if '_recalculate' in request.POST:
+            try:
+                changed_units = obj.recalculate()['changed_units']
+            except ValidationError as e:
+                self.message_user(request, ' '.join(e.messages), level=messages.ERROR)
+            else:
+                self.message_user(request, _('Result recalculated, %(count)d unit results changed.') % {'count': len(changed_units)})
+            return redirect(request.path)
     
         return super().response_change(request, obj)
+
+
+@admin.register(CalculationJob)
+class CalculationJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'submeter_calculator', 'status', 'duration', 'created_jalali_humanize')
+    list_display_links = ('id',)
+    list_filter = ('status', 'created')
+    list_select_related = ('submeter_calculator__water_bill',)
+    ordering = ('-id',)
+    raw_id_fields = ('submeter_calculator', 'result')
+    readonly_fields = ('status', 'result', 'started', 'finished', 'duration', 'error')
+    fields = ('submeter_calculator', 'force', 'status', 'result', 'started', 'finished', 'duration', 'error')
+
+    def get_urls(self):
+        urls = super().get_urls()
+        my_urls = [
+            path('<int:job_id>/status/', self.admin_site.admin_view(self.status_view), name='building_calculationjob_status'),
+        ]
+        return my_urls + urls
+
+    def status_view(self, request, job_id):
+        job = get_object_or_404(CalculationJob, id=job_id)
+        if not self.has_view_or_change_permission(request, job):
+            raise PermissionDenied
+
+        if job.result_id:
+            return redirect('admin:building_result_change', job.result_id)
+
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'original': job,
+            'title': _('Calculation job %s') % job.id,
+            'job': job,
+        }
+        return TemplateResponse(request, 'admin/calculation_job_status.html', context=context)
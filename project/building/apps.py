@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class BuildingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'building'
+
+    def ready(self) -> None:
+        from django.conf import settings
+        from django.utils.module_loading import import_string
+        from . import signals  # noqa: F401
+        from . import instrumentation
+
+        for collector in getattr(settings, 'BUILDING_INSTRUMENTATION_COLLECTORS', []):
+            instrumentation.add_collector(import_string(collector))
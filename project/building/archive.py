@@ -0,0 +1,350 @@
+"""
+Archive of results and readings of closed periods
+
+archive_periods moves Result and UnitResult rows, and UnitUsage rows, of periods
+before a date out of the database into two archives under settings.ARCHIVE_ROOT:
+
+    <name>.data         append-only file of zlib compressed JSON blocks, one block
+                        for each result or usage
+    <name>.index.npy    (key, record, offset, length) of each archived row sorted by
+                        key, key packs building, jalali period and unit into an uint64
+    <name>.records.npy  same entries, one for each record, sorted by record
+
+record is the id the result or usage had in database. Indexes are read memory
+mapped, so a lookup by building and period, or by id, is a binary search which
+touches a few pages only. Blocks are written and flushed to disk before the
+indexes pointing at them replace old ones atomically, so readers never see an
+entry without its data, and rows are deleted from database only after that.
+
+Usage, SubmeterCalculator and bills stay in database. Printable results and
+exports rebuild archived rows around them, see printing.printable_result and
+exports.unit_result_export. Calculators of archived periods are marked
+archived, they can not be calculated again since their readings are archived.
+"""
+import base64
+import bisect
+import json
+import os
+import tempfile
+import zlib
+from itertools import chain
+
+import jdatetime
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Subquery
+
+from .models import Result, SubmeterCalculator, UnitResult, UnitUsage, Usage
+
+
+INDEX_DTYPE = np.dtype([('key', '<u8'), ('record', '<u8'), ('offset', '<u8'), ('length', '<u4')])
+# Bits of each part of key, from highest: building 30, year 14, month 4, unit 16
+_PERIOD_SHIFT = 16
+_PERIOD_MASK = (1 << 18) - 1
+_BUILDING_SHIFT = 34
+
+
+def archive_key(building: int, year: int, month: int, unit: int) -> int:
+    if not (0 <= building < 1 << 30 and 0 <= year < 1 << 14 and 0 <= month < 16 and 0 <= unit < 1 << 16):
+        raise ValueError('building %s, period %s-%s or unit %s out of range of archive keys' % (building, year, month, unit))
+    return building << _BUILDING_SHIFT | year << 20 | month << _PERIOD_SHIFT | unit
+
+
+def entry_buildings(entries: np.ndarray) -> set:
+    """
+    Buildings of index entries
+    """
+    return set((entries['key'] >> _BUILDING_SHIFT).tolist())
+
+
+def _period_code(year: int, month: int) -> int:
+    return year << 4 | month
+
+
+def _chunks(values: list, size: int):
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+class Archive:
+    """
+    Append-only compressed blocks of one kind with memory mapped indexes, see module docstring
+    """
+    # {path: ((inode, mtime, size), memory mapped array)} shared by instances
+    _mapped = {}
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def path(self, suffix: str) -> str:
+        # Read on every call so tests can override ARCHIVE_ROOT
+        return os.path.join(settings.ARCHIVE_ROOT, self.name + suffix)
+
+    def _load(self, suffix: str) -> np.ndarray:
+        path = self.path(suffix)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return np.zeros(0, dtype=INDEX_DTYPE)
+        # Indexes are replaced, never changed in place, so a new inode means a new index
+        signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        mapped = self._mapped.get(path)
+        if mapped is None or mapped[0] != signature:
+            mapped = (signature, np.load(path, mmap_mode='r'))
+            self._mapped[path] = mapped
+        return mapped[1]
+
+    @property
+    def index(self) -> np.ndarray:
+        return self._load('.index.npy')
+
+    @property
+    def record_index(self) -> np.ndarray:
+        return self._load('.records.npy')
+
+    def _read(self, file, entry) -> dict:
+        file.seek(int(entry['offset']))
+        return json.loads(zlib.decompress(file.read(int(entry['length']))))
+
+    def get(self, record: int) -> dict | None:
+        """
+        Data of record or None
+        """
+        index = self.record_index
+        # bisect reads a few items of the memory mapped column, searchsorted would copy all of it
+        i = bisect.bisect_left(index['record'], record)
+        if i == len(index) or index['record'][i] != record:
+            return None
+        with open(self.path('.data'), 'rb') as file:
+            return self._read(file, index[i])
+
+    def find(self, buildings=None, start: tuple | None = None, end: tuple | None = None, records=None) -> np.ndarray:
+        """
+        Index entries of rows in buildings between start and end (year, month) periods, sorted by key
+        :param records: only entries of these records if not None
+        """
+        index = self.index
+        if buildings is not None:
+            keys = index['key']
+            index = np.concatenate([index[:0]] + [
+                index[bisect.bisect_left(keys, archive_key(building, 0, 0, 0)):bisect.bisect_left(keys, archive_key(building + 1, 0, 0, 0))]
+                for building in sorted({int(building) for building in buildings})
+            ])
+        if start or end:
+            periods = (index['key'] >> _PERIOD_SHIFT) & _PERIOD_MASK
+            index = index[(periods >= _period_code(*(start or (0, 0)))) & (periods <= _period_code(*(end or ((1 << 14) - 1, 15))))]
+        if records is not None:
+            index = index[np.isin(index['record'], np.asarray(list(records), dtype=np.uint64))]
+        return index
+
+    def iter_blocks(self, entries: np.ndarray):
+        """
+        (record, data) of each block entries point at, in order of entries
+        """
+        if not len(entries):
+            return
+        _, first = np.unique(entries['offset'], return_index=True)
+        with open(self.path('.data'), 'rb') as file:
+            for i in np.sort(first):
+                yield int(entries['record'][i]), self._read(file, entries[i])
+
+    def _write_index(self, suffix: str, index: np.ndarray) -> None:
+        fd, temp_path = tempfile.mkstemp(dir=settings.ARCHIVE_ROOT, prefix='.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                np.save(file, index)
+                file.flush()
+                os.fsync(file.fileno())
+            # mkstemp makes files only their owner reads, data file is readable like any new file
+            os.chmod(temp_path, os.stat(self.path('.data')).st_mode & 0o777)
+            os.replace(temp_path, self.path(suffix))
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def append(self, blocks) -> int:
+        """
+        Write blocks and add them to indexes, returns number of rows added
+        :param blocks: iterable of (record, [key of each row], data)
+        """
+        os.makedirs(settings.ARCHIVE_ROOT, exist_ok=True)
+        entries = []
+        with open(self.path('.data'), 'ab') as file:
+            # A block half written by an interrupted run stays unindexed at end of file
+            file.seek(0, os.SEEK_END)
+            for record, keys, data in blocks:
+                compressed = zlib.compress(json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode(), 9)
+                offset = file.tell()
+                file.write(compressed)
+                entries += [(key, record, offset, len(compressed)) for key in keys]
+            file.flush()
+            os.fsync(file.fileno())
+        if not entries:
+            return 0
+
+        index = np.sort(np.concatenate([self.index, np.array(entries, dtype=INDEX_DTYPE)]), order=['key', 'record'])
+        _, first = np.unique(index['record'], return_index=True)
+        self._write_index('.records.npy', index[first])
+        self._write_index('.index.npy', index)
+        return len(entries)
+
+
+results_archive = Archive('results')
+readings_archive = Archive('readings')
+
+
+def archived_result(result_id: int) -> tuple:
+    """
+    Unsaved Result of an archived result and list of its unsaved unit results, raises Result.DoesNotExist
+    """
+    data = results_archive.get(result_id)
+    if data is None:
+        raise Result.DoesNotExist('result %s is not archived' % result_id)
+    try:
+        sc = SubmeterCalculator.objects.select_related('water_bill__building', 'gas_bill__building') \
+            .prefetch_related('extra_charges', 'debts').get(id=data['submeter_calculator'])
+    except SubmeterCalculator.DoesNotExist:
+        raise Result.DoesNotExist('calculator of archived result %s is deleted' % result_id)
+
+    year, month = data['period']
+    result = Result(
+        id=data['id'], submeter_calculator=sc, my_notes=data['my_notes'], client_notes=data['client_notes'],
+        due_date=data['due_date'] and jdatetime.datetime.strptime(data['due_date'], '%Y-%m-%d').date(),
+        packed_details=data['details'] and base64.b64decode(data['details']),
+        input_fingerprint=data['input_fingerprint'], jalali_year=year, jalali_month=month,
+    )
+    unit_results = [
+        UnitResult(result=result, unit=unit, usage_amount=usage_amount, price=price, debt=debt, total_payment=total_payment)
+        for unit, usage_amount, price, debt, total_payment in data['units']
+    ]
+    return result, unit_results
+
+
+def closed_results(before: jdatetime.date):
+    """
+    Results of water bills issued before date
+    """
+    return Result.objects.filter(submeter_calculator__water_bill__issuance_date__lt=before)
+
+
+def closed_usages(before: jdatetime.date):
+    """
+    Usages registered before date, except ones calculators of later bills read and
+    last one of each building, which new readings are compared with
+    """
+    later_calculators = SubmeterCalculator.objects.filter(water_bill__issuance_date__gte=before)
+    last_register_date = Usage.objects.filter(building=OuterRef('building'), register_date__lt=before) \
+        .order_by('-register_date').values('register_date')[:1]
+    return Usage.objects.filter(register_date__lt=before) \
+        .exclude(id__in=later_calculators.values('previous_usage')) \
+        .exclude(id__in=later_calculators.values('current_usage')) \
+        .exclude(register_date=Subquery(last_register_date))
+
+
+class PeriodArchiver:
+    """
+    Moves results and readings of periods before a date into archives, see module docstring
+    """
+
+    def __init__(self, before: jdatetime.date, batch_size: int = 1000) -> None:
+        self.before = before
+        self.batch_size = batch_size
+        self.summary = {'results': 0, 'unit_results': 0, 'usages': 0, 'unit_usages': 0}
+        # Rows in archives, by this run or an interrupted earlier one, deleted from database at end
+        self.archived_result_ids = []
+        self.archived_unit_usage_ids = []
+
+    def result_blocks(self, result_ids: list):
+        for batch in _chunks(result_ids, self.batch_size):
+            # Results archived by an interrupted run are in database still
+            archived = set(results_archive.find(records=batch)['record'].tolist())
+            units = {}
+            for result_id, *values in UnitResult.objects.filter(result_id__in=batch).order_by('result_id', 'unit') \
+                    .values_list('result_id', 'unit', 'usage_amount', 'price', 'debt', 'total_payment'):
+                units.setdefault(result_id, []).append(values)
+
+            rows = Result.objects.filter(id__in=batch).order_by('id').values_list(
+                'id', 'submeter_calculator_id', 'submeter_calculator__water_bill__building_id', 'jalali_year',
+                'jalali_month', 'submeter_calculator__water_bill__issuance_date', 'due_date', 'created', 'my_notes',
+                'client_notes', 'input_fingerprint', 'packed_details',
+            )
+            for (result_id, sc_id, building_id, year, month, issuance_date, due_date, created, my_notes, client_notes,
+                 input_fingerprint, packed_details) in rows:
+                unit_rows = units.get(result_id, [])
+                # A result without unit results is still found by its building and period
+                keys = [archive_key(building_id, year or 0, month or 0, unit) for unit, *_ in unit_rows or [(0,)]]
+                self.archived_result_ids.append(result_id)
+                if result_id in archived:
+                    continue
+                self.summary['results'] += 1
+                self.summary['unit_results'] += len(unit_rows)
+                yield result_id, keys, {
+                    'id': result_id, 'submeter_calculator': sc_id, 'building': building_id, 'period': [year, month],
+                    'issuance_date': str(issuance_date), 'due_date': due_date and str(due_date), 'created': str(created),
+                    'my_notes': my_notes, 'client_notes': client_notes, 'input_fingerprint': input_fingerprint,
+                    'details': packed_details and base64.b64encode(bytes(packed_details)).decode(),
+                    'units': unit_rows,
+                }
+
+    def usage_blocks(self, usage_ids: list):
+        for batch in _chunks(usage_ids, self.batch_size):
+            # Readings archived by an interrupted run, usages may also get new readings after archiving
+            archived = set()
+            for _usage_id, data in readings_archive.iter_blocks(readings_archive.find(records=batch)):
+                archived.update(data['ids'])
+            units = {}
+            for unit_usage_id, usage_id, unit, amount in UnitUsage.objects.filter(usage_id__in=batch) \
+                    .order_by('usage_id', 'unit').values_list('id', 'usage_id', 'unit', 'amount'):
+                units.setdefault(usage_id, []).append((unit_usage_id, unit, amount))
+
+            rows = Usage.objects.filter(id__in=batch).order_by('id').values_list(
+                'id', 'building_id', 'register_date', 'jalali_year', 'jalali_month',
+            )
+            for usage_id, building_id, register_date, year, month in rows:
+                unit_rows = []
+                for unit_usage_id, unit, amount in units.get(usage_id, []):
+                    self.archived_unit_usage_ids.append(unit_usage_id)
+                    if unit_usage_id not in archived:
+                        unit_rows.append((unit_usage_id, unit, amount))
+                if not unit_rows:
+                    continue
+                self.summary['usages'] += 1
+                self.summary['unit_usages'] += len(unit_rows)
+                # New readings of an archived usage go to another block of same usage
+                yield usage_id, [archive_key(building_id, year or 0, month or 0, unit) for _, unit, _ in unit_rows], {
+                    'id': usage_id, 'building': building_id, 'register_date': str(register_date),
+                    'units': [(unit, amount) for _, unit, amount in unit_rows],
+                    'ids': [unit_usage_id for unit_usage_id, _, _ in unit_rows],
+                }
+
+    def run(self, dry_run: bool = False) -> dict:
+        """
+        Archive, then delete archived rows from database; only count them if dry_run
+        """
+        result_ids = list(closed_results(self.before).order_by('id').values_list('id', flat=True))
+        usage_ids = list(closed_usages(self.before).filter(Exists(UnitUsage.objects.filter(usage=OuterRef('pk'))))
+                         .order_by('id').values_list('id', flat=True))
+        if dry_run:
+            # Consume blocks to count them without writing anything
+            for _block in chain(self.result_blocks(result_ids), self.usage_blocks(usage_ids)):
+                pass
+            return self.summary
+
+        # fcntl is not available on every platform, it is only needed here
+        import fcntl
+        os.makedirs(settings.ARCHIVE_ROOT, exist_ok=True)
+        with open(os.path.join(settings.ARCHIVE_ROOT, '.lock'), 'w') as lock:
+            # Two runs appending at once would lose index entries of one of them
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            results_archive.append(self.result_blocks(result_ids))
+            readings_archive.append(self.usage_blocks(usage_ids))
+
+        for batch in _chunks(self.archived_result_ids, self.batch_size):
+            with transaction.atomic():
+                # calculate_all picks calculators without results, these have archived ones
+                SubmeterCalculator.objects.filter(results__id__in=batch).update(archived=True)
+                Result.objects.filter(id__in=batch).delete()
+        for batch in _chunks(self.archived_unit_usage_ids, self.batch_size):
+            UnitUsage.objects.filter(id__in=batch).delete()
+        return self.summary
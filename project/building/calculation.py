@@ -0,0 +1,269 @@
+import hashlib
+import json
+import struct
+from typing import NamedTuple
+
+import numpy as np
+from django.core.exceptions import ValidationError
+from django.utils.translation import gettext_lazy as _
+
+from .functions import round_prices
+from .tariffs import CompiledTariff
+
+
+class CalculationInputs(NamedTuple):
+    """
+    Everything calculate_submeter_prices needs, loaded up front so the
+    calculation itself never touches the database
+    """
+    # Unit numbers in ascending order, usages are in the same order
+    units: tuple
+    # Usage of each unit between previous and current reading (liter)
+    usages: tuple
+    usage_duration_days: int
+    water_consumption_price: int
+    # Share of tax, gas bill and extra charges for each unit (Toman)
+    extra_prices: int
+    # {unit: amount}
+    debts: dict
+    # Water price table and city coefficient valid on current usage date
+    tariff: CompiledTariff
+    city_coefficient: float
+
+
+def fingerprint_inputs(inputs: CalculationInputs) -> str:
+    """
+    Hash of everything a calculation depends on, equal inputs give equal results
+    """
+    canonical = json.dumps([
+        inputs.units,
+        inputs.usages,
+        inputs.usage_duration_days,
+        inputs.water_consumption_price,
+        inputs.extra_prices,
+        sorted(inputs.debts.items()),
+        inputs.tariff.version,
+        inputs.city_coefficient,
+    ], separators=(',', ':'))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def pair_unit_readings(previous: dict, current: dict, units_count: int) -> tuple:
+    """
+    Pair previous and current readings by unit number
+    :param previous: {unit: amount} of previous usage
+    :param current: {unit: amount} of current usage
+    :param units_count: number of building units
+    :return (units, usages) tuples sorted by unit
+    """
+    missing_in_previous = sorted(current.keys() - previous.keys())
+    if missing_in_previous:
+        raise ValidationError({'previous_usage': _('previous usage has no reading for units %s') % missing_in_previous})
+
+    missing_in_current = sorted(previous.keys() - current.keys())
+    if missing_in_current:
+        raise ValidationError({'current_usage': _('current usage has no reading for units %s') % missing_in_current})
+
+    if len(current) != units_count:
+        raise ValidationError({'current_usage': _('current usage must have same unit count as building units (%d)') % units_count})
+
+    units = tuple(sorted(current))
+    usages = tuple(current[unit] - previous[unit] for unit in units)
+
+    decreased = [unit for unit, usage in zip(units, usages) if usage < 0]
+    if decreased:
+        raise ValidationError({'current_usage': _('current reading is less than previous reading for units %s') % decreased})
+
+    return units, usages
+
+
+class _Frozen:
+    """
+    Base of compact immutable result objects
+    """
+    __slots__ = ()
+
+    def __init__(self, **kwargs) -> None:
+        for name in self.__slots__:
+            object.__setattr__(self, name, kwargs[name])
+
+    def __setattr__(self, name, value) -> None:
+        raise AttributeError('%s is immutable' % type(self).__name__)
+
+    def __delattr__(self, name) -> None:
+        raise AttributeError('%s is immutable' % type(self).__name__)
+
+    def __eq__(self, other) -> bool:
+        if type(other) is not type(self):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self) -> str:
+        return '%s(%s)' % (type(self).__name__, ', '.join('%s=%r' % (name, getattr(self, name)) for name in self.__slots__))
+
+    def __reduce__(self):
+        return _rebuild, (type(self), {name: getattr(self, name) for name in self.__slots__})
+
+
+def _rebuild(cls, kwargs):
+    return cls(**kwargs)
+
+
+class UnitPrice(_Frozen):
+    """
+    Calculated payment of one unit, same fields as UnitResult
+    """
+    __slots__ = ('unit', 'usage_amount', 'price', 'debt', 'total_payment')
+
+
+class PriceCalculation(_Frozen):
+    """
+    Outcome of calculate_prices, nothing is saved to the database
+    """
+    __slots__ = ('units', 'usage_list', 'price_list', 'price_difference_ratio', 'price_with_ratio_list',
+                 'extra_prices', 'debts', 'water_consumption_price')
+
+    def details(self) -> dict:
+        """
+        Same shape as Result.submeter_calculator_details
+        """
+        return {
+            'usage_list': list(self.usage_list),
+            'price_list': list(self.price_list),
+            'price_difference_ratio': self.price_difference_ratio,
+            'price_with_ratio_list': list(self.price_with_ratio_list),
+            'extra_prices': self.extra_prices,
+            'debts': dict(self.debts),
+        }
+
+
+def calculate_prices(inputs: CalculationInputs) -> PriceCalculation:
+    """
+    Calculate price of each unit, a pure function of inputs
+    """
+    water_consumption_price = inputs.water_consumption_price
+
+    # duration between current and previous usage
+    usage_duration_days = inputs.usage_duration_days
+
+    # Our price table is for 30 days duration
+    usages_30_days = (np.array(inputs.usages, dtype=np.int64) * 30) / usage_duration_days
+
+    # Price from usage-price table * affect duration on price * price coefficient of the city
+    # divide by 10 to get price as toman then ceiling to an integral at last reound it
+    prices = round_prices(np.ceil(
+        (inputs.tariff.prices(usages_30_days) * (usage_duration_days / 30) * inputs.city_coefficient) / 10
+        ))
+    price_list = prices.tolist()
+
+    # Bill can not be split by usage when no unit used water
+    if not sum(price_list):
+        raise ValidationError({'current_usage': _('current usage has no consumption since previous usage to split water bill by')})
+
+    # Get difference ratio between actual water_consumption_price and our calculation
+    price_difference_ratio = water_consumption_price / sum(price_list)
+
+    # Multiply each price with price_difference_ratio to reach water_consumption_price
+    price_with_ratio_list = round_prices(np.ceil(prices * price_difference_ratio)).tolist()
+
+    units = []
+    for unit, usage, price_with_ratio in zip(inputs.units, inputs.usages, price_with_ratio_list):
+        # Get unit debt or zero
+        unit_debt = inputs.debts.get(unit) or 0
+        units.append(UnitPrice(unit=unit, usage_amount=usage, price=price_with_ratio, debt=unit_debt,
+                               total_payment=price_with_ratio + inputs.extra_prices + unit_debt))
+
+    return PriceCalculation(
+        units=tuple(units),
+        usage_list=tuple(inputs.usages),
+        price_list=tuple(price_list),
+        price_difference_ratio=price_difference_ratio,
+        price_with_ratio_list=tuple(price_with_ratio_list),
+        extra_prices=inputs.extra_prices,
+        debts=inputs.debts,
+        water_consumption_price=water_consumption_price,
+    )
+
+
+def try_calculate_prices(item: tuple) -> tuple:
+    """
+    calculate_prices for process pools
+    :param item: (key, CalculationInputs)
+    :return (key, PriceCalculation, None) or (key, None, error message)
+    """
+    key, inputs = item
+    try:
+        return key, calculate_prices(inputs), None
+    except Exception as e:
+        return key, None, '%s: %s' % (type(e).__name__, e)
+
+
+# Formats of packed details, first byte of packed data
+DETAILS_JSON = 0
+DETAILS_PACKED = 1
+# Format, units, debts, price_difference_ratio and extra_prices, then little endian uint32 arrays of
+# usage_list, price_list, price_with_ratio_list, units of debts and amounts of debts
+_DETAILS_HEADER = struct.Struct('<BIIdq')
+_UINT32 = np.dtype('<u4')
+_DETAILS_LISTS = ('usage_list', 'price_list', 'price_with_ratio_list')
+
+
+def _uint32_array(values) -> np.ndarray | None:
+    values = list(values)
+    if not all(type(value) is int and 0 <= value < 2 ** 32 for value in values):
+        return None
+    return np.array(values, dtype=_UINT32)
+
+
+def pack_details(details: dict | None) -> bytes | None:
+    """
+    Compact bytes of PriceCalculation.details(), details of any other shape are kept as JSON
+    """
+    if details is None:
+        return None
+    arrays = None
+    if set(details) == {*_DETAILS_LISTS, 'price_difference_ratio', 'extra_prices', 'debts'} \
+            and isinstance(details['price_difference_ratio'], (int, float)) and type(details['extra_prices']) is int \
+            and isinstance(details['debts'], dict) and all(str(unit).isdigit() for unit in details['debts']):
+        arrays = [_uint32_array(details[key]) for key in _DETAILS_LISTS]
+        arrays += [_uint32_array(int(unit) for unit in details['debts']), _uint32_array(details['debts'].values())]
+    if arrays is None or any(array is None for array in arrays) or len({len(array) for array in arrays[:3]}) != 1:
+        return bytes([DETAILS_JSON]) + json.dumps(details, separators=(',', ':')).encode()
+
+    header = _DETAILS_HEADER.pack(DETAILS_PACKED, len(arrays[0]), len(arrays[3]), details['price_difference_ratio'],
+                                  details['extra_prices'])
+    return header + b''.join(array.tobytes() for array in arrays)
+
+
+def unpack_details(data) -> dict | None:
+    """
+    Details packed by pack_details, in the shape they had as JSON
+    :param data: bytes or memoryview
+    """
+    if data is None:
+        return None
+    data = bytes(data)
+    if data[0] == DETAILS_JSON:
+        return json.loads(data[1:])
+
+    _format, units, debts, price_difference_ratio, extra_prices = _DETAILS_HEADER.unpack_from(data)
+    values = np.frombuffer(data, dtype=_UINT32, offset=_DETAILS_HEADER.size).tolist()
+    details = {key: values[i * units:(i + 1) * units] for i, key in enumerate(_DETAILS_LISTS)}
+    debt_units = values[3 * units:3 * units + debts]
+    details['price_difference_ratio'] = price_difference_ratio
+    details['extra_prices'] = extra_prices
+    # JSON object keys are strings
+    details['debts'] = {str(unit): amount for unit, amount in zip(debt_units, values[3 * units + debts:])}
+    return details
+
+
+def unpack_extra_prices(data) -> int | None:
+    """
+    extra_prices of packed details, without decoding the lists
+    """
+    if data is None:
+        return None
+    data = bytes(data)
+    if data[0] == DETAILS_JSON:
+        return json.loads(data[1:]).get('extra_prices')
+    return _DETAILS_HEADER.unpack_from(data)[4]
@@ -0,0 +1,212 @@
+"""
+Streaming export of unit results and readings to CSV, XLSX and JSONL
+
+Rows are read with QuerySet.iterator, which uses a server-side cursor on
+PostgreSQL, and written one by one, so memory stays flat however many rows
+are exported. CSV and JSONL are streamed as they are written. XLSX is a zip
+file, it is written to a temporary file first in openpyxl write-only mode.
+Readings are exported in the columns import_readings reads. Rows archived by
+archive_periods come first, then rows in database.
+
+    export_response(unit_result_export(buildings=[1], start=(1402, 1), end=(1402, 6)), 'csv', 'unit-results')
+"""
+import csv
+import json
+import tempfile
+from itertools import chain, groupby
+from typing import NamedTuple
+
+import numpy as np
+from django.db.models import QuerySet
+from django.http import FileResponse, StreamingHttpResponse
+
+from .archive import entry_buildings, readings_archive, results_archive
+from .fields import jalali_period_range_filter
+from .functions import period_str, str_or_none
+from .models import Building, UnitResult, UnitUsage
+
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/jsonl; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+FORMATS = tuple(CONTENT_TYPES)
+# Rows of one XLSX sheet including header, more rows continue on next sheet
+XLSX_SHEET_ROWS = 1048576
+# Size of each chunk of a streamed response
+STREAM_BUFFER_SIZE = 64 * 1024
+
+
+class Export(NamedTuple):
+    columns: tuple
+    # Iterator of tuples in same order as columns
+    rows: object
+
+
+def _archived_unit_result_rows(buildings, start: tuple | None, end: tuple | None):
+    entries = results_archive.find(buildings, start, end)
+    if not len(entries):
+        return
+    names = dict(Building.objects.filter(id__in=entry_buildings(entries)).values_list('id', 'name'))
+    for _result_id, data in results_archive.iter_blocks(np.sort(entries, order=['record', 'offset'])):
+        for unit, usage_amount, price, debt, total_payment in data['units']:
+            yield (data['id'], data['building'], names.get(data['building']), period_str(*data['period']),
+                   data['issuance_date'], data['due_date'], unit, usage_amount, price, debt, total_payment)
+
+
+def _archived_reading_rows(queryset: QuerySet | None, buildings, start: tuple | None, end: tuple | None):
+    records = None if queryset is None else queryset.values_list('id', flat=True)
+    entries = readings_archive.find(buildings, start, end, records)
+    # Blocks come by building and period, usages of one period are few and sorted in memory
+    blocks = readings_archive.iter_blocks(entries)
+    for _period_key, group in groupby(blocks, key=lambda block: (block[1]['building'], block[1]['register_date'][:7])):
+        for _usage_id, data in sorted(group, key=lambda block: (block[1]['register_date'], block[0])):
+            for unit, amount in data['units']:
+                yield data['building'], data['register_date'], unit, amount
+
+
+def unit_result_export(queryset: QuerySet | None = None, buildings=None, start: tuple | None = None,
+                       end: tuple | None = None, chunk_size: int = 2000) -> Export:
+    """
+    Every unit result with its building, period and payments
+    :param queryset: Result queryset to export, all results if None
+    :param start: first (year, month) jalali period of water bills
+    :param end: last (year, month) jalali period of water bills
+    """
+    unit_results = UnitResult.objects.all()
+    if queryset is not None:
+        unit_results = unit_results.filter(result__in=queryset)
+    if buildings:
+        unit_results = unit_results.filter(result__submeter_calculator__water_bill__building__in=buildings)
+    if start or end:
+        unit_results = unit_results.filter(jalali_period_range_filter(start or (1, 1), end or (9999, 12), prefix='result__jalali_'))
+
+    values = unit_results.order_by('result_id', 'unit').values_list(
+        'result_id', 'result__submeter_calculator__water_bill__building_id', 'result__submeter_calculator__water_bill__building__name',
+        'result__jalali_year', 'result__jalali_month', 'result__submeter_calculator__water_bill__issuance_date',
+        'result__due_date', 'unit', 'usage_amount', 'price', 'debt', 'total_payment',
+    )
+    rows = (
+        (result_id, building_id, building, period_str(year, month), str_or_none(issuance_date), str_or_none(due_date),
+         unit, usage_amount, price, debt, total_payment)
+        for (result_id, building_id, building, year, month, issuance_date, due_date,
+             unit, usage_amount, price, debt, total_payment) in values.iterator(chunk_size=chunk_size)
+    )
+    # A queryset selects results in database, archived results are not in it
+    if queryset is None:
+        rows = chain(_archived_unit_result_rows(buildings, start, end), rows)
+    return Export(('result', 'building_id', 'building', 'period', 'issuance_date', 'due_date',
+                   'unit', 'usage_amount', 'price', 'debt', 'total_payment'), rows)
+
+
+def reading_export(queryset: QuerySet | None = None, buildings=None, start: tuple | None = None,
+                   end: tuple | None = None, chunk_size: int = 2000) -> Export:
+    """
+    Every unit reading, in the columns import_readings reads
+    :param queryset: Usage queryset to export, all usages if None
+    :param start: first (year, month) jalali period of registration
+    :param end: last (year, month) jalali period of registration
+    """
+    unit_usages = UnitUsage.objects.all()
+    if queryset is not None:
+        unit_usages = unit_usages.filter(usage__in=queryset)
+    if buildings:
+        unit_usages = unit_usages.filter(usage__building__in=buildings)
+    if start or end:
+        unit_usages = unit_usages.filter(jalali_period_range_filter(start or (1, 1), end or (9999, 12), prefix='usage__jalali_'))
+
+    values = unit_usages.order_by('usage__building_id', 'usage__register_date', 'usage_id', 'unit').values_list(
+        'usage__building_id', 'usage__register_date', 'unit', 'amount',
+    )
+    rows = chain(_archived_reading_rows(queryset, buildings, start, end), (
+        (building_id, str_or_none(register_date), unit, amount)
+        for building_id, register_date, unit, amount in values.iterator(chunk_size=chunk_size)
+    ))
+    return Export(('building', 'date', 'unit', 'liters'), rows)
+
+
+class _Echo:
+    """
+    File like object whose write returns what is written, for csv.writer
+    """
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def _buffered(parts, size: int = STREAM_BUFFER_SIZE):
+    """
+    Join small strings into chunks of about size characters
+    """
+    buffer = []
+    length = 0
+    for part in parts:
+        buffer.append(part)
+        length += len(part)
+        if length >= size:
+            yield ''.join(buffer)
+            buffer = []
+            length = 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def iter_csv(export: Export):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(export.columns)
+    for row in export.rows:
+        yield writer.writerow(row)
+
+
+def iter_jsonl(export: Export):
+    for row in export.rows:
+        yield json.dumps(dict(zip(export.columns, row)), ensure_ascii=False) + '\n'
+
+
+def write_xlsx(export: Export, file) -> None:
+    # openpyxl is only needed for XLSX files
+    from openpyxl import Workbook
+
+    # Write-only workbooks keep rows in a temporary file instead of memory
+    workbook = Workbook(write_only=True)
+    sheet = None
+    sheet_rows = 0
+    for row in export.rows:
+        if sheet_rows in (0, XLSX_SHEET_ROWS):
+            sheet = workbook.create_sheet()
+            sheet.append(export.columns)
+            sheet_rows = 1
+        sheet.append(row)
+        sheet_rows += 1
+    if sheet is None:
+        workbook.create_sheet().append(export.columns)
+    workbook.save(file)
+
+
+def write_export(export: Export, export_format: str, file) -> None:
+    """
+    Write export to file, binary file for xlsx and text file otherwise
+    """
+    if export_format == 'xlsx':
+        write_xlsx(export, file)
+        return
+    for chunk in _buffered(iter_csv(export) if export_format == 'csv' else iter_jsonl(export)):
+        file.write(chunk)
+
+
+def export_response(export: Export, export_format: str, filename: str):
+    """
+    Download of export, filename has no extension
+    """
+    filename = '%s.%s' % (filename, export_format)
+    if export_format == 'xlsx':
+        file = tempfile.TemporaryFile()
+        write_xlsx(export, file)
+        file.seek(0)
+        return FileResponse(file, as_attachment=True, filename=filename, content_type=CONTENT_TYPES['xlsx'])
+
+    chunks = _buffered(iter_csv(export) if export_format == 'csv' else iter_jsonl(export))
+    response = StreamingHttpResponse(chunks, content_type=CONTENT_TYPES[export_format])
+    response['Content-Disposition'] = 'attachment; filename="%s"' % filename
+    return response
@@ -0,0 +1,100 @@
+from uuid import uuid4
+
+from django.db import models
+from django.db.models import Q
+
+
+class JalaliPartField(models.PositiveSmallIntegerField):
+    """
+    Jalali year or month of a date field, stored so period filters are index lookups
+
+    Value is computed from source in pre_save, which save() and bulk_create() both call.
+    source may follow foreign keys like 'submeter_calculator__water_bill__issuance_date',
+    select them related before bulk_create to avoid a query for each object.
+    QuerySet.update() of source does not update this field.
+    """
+    PARTS = ('year', 'month')
+
+    def __init__(self, *args, source: str = None, part: str = None, **kwargs) -> None:
+        if part not in self.PARTS:
+            raise ValueError('part must be one of %s' % (self.PARTS,))
+        self.source = source
+        self.part = part
+        kwargs.setdefault('editable', False)
+        kwargs.setdefault('null', True)
+        kwargs.setdefault('blank', True)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs['source'] = self.source
+        kwargs['part'] = self.part
+        for key in ('editable', 'null', 'blank'):
+            kwargs.pop(key, None)
+        return name, path, args, kwargs
+
+    def source_date(self, model_instance):
+        """
+        jdatetime.date of source or None
+        """
+        *relations, field_name = self.source.split('__')
+        instance = model_instance
+        for relation in relations:
+            instance = getattr(instance, relation)
+            if instance is None:
+                return None
+        value = getattr(instance, field_name)
+        if value is None:
+            return None
+        return instance._meta.get_field(field_name).to_python(value)
+
+    def pre_save(self, model_instance, add):
+        value = self.source_date(model_instance)
+        if value is not None:
+            value = getattr(value, self.part)
+        setattr(model_instance, self.attname, value)
+        return value
+
+
+class RowVersionField(models.UUIDField):
+    """
+    Random token replaced on every save and bulk_create, like auto_now but never repeats
+
+    Token changes whenever the row may have changed, so it can back strong ETags.
+    QuerySet.update() and bulk_update() must set it to a new uuid4() themselves.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        kwargs.setdefault('default', uuid4)
+        kwargs.setdefault('editable', False)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        for key in ('default', 'editable'):
+            kwargs.pop(key, None)
+        return name, path, args, kwargs
+
+    def pre_save(self, model_instance, add):
+        value = uuid4()
+        setattr(model_instance, self.attname, value)
+        return value
+
+
+def jalali_period_filter(year: int, month: int | None = None, prefix: str = 'jalali_') -> Q:
+    if month is None:
+        return Q(**{prefix + 'year': year})
+    return Q(**{prefix + 'year': year, prefix + 'month': month})
+
+
+def jalali_period_range_filter(start: tuple, end: tuple, prefix: str = 'jalali_') -> Q:
+    """
+    Periods from start to end, both (year, month) and inclusive
+    """
+    year, month = prefix + 'year', prefix + 'month'
+    (start_year, start_month), (end_year, end_month) = start, end
+    if start_year == end_year:
+        return Q(**{year: start_year, month + '__gte': start_month, month + '__lte': end_month})
+    return (Q(**{year: start_year, month + '__gte': start_month})
+            | Q(**{year + '__gt': start_year, year + '__lt': end_year})
+            | Q(**{year: end_year, month + '__lte': end_month}))
@@ -1,3 +1,13 @@
+import numpy as np
+
+
+# Water price table, bracket i covers (WATER_TARIFF_BOUNDS[i-1], WATER_TARIFF_BOUNDS[i]] m3
+# and its price is usage * WATER_TARIFF_SLOPES[i] - WATER_TARIFF_INTERCEPTS[i]
+WATER_TARIFF_BOUNDS = np.array([5, 10, 14, 21, 28, 42, 56])
+WATER_TARIFF_SLOPES = np.array([2824, 4229, 5630, 16811, 25217, 50433, 100866, 168110])
+WATER_TARIFF_INTERCEPTS = np.array([0, 7025, 21035, 177569, 354085, 1060147, 3178333, 6943997])
+
+
 def get_price_over_14_m3(usage: int) -> int | float:
     """
     Pass usage as liter
@@ -5,7 +15,7 @@ def get_price_over_14_m3(usage: int) -> int | float:
     """
     # convert  liter to m3
     usage = usage / 1000
-    if 0 < usage <= 5:
+    if 0 <= usage <= 5:
         return usage * 2824
 
     elif 5 < usage <= 10:
@@ -30,21 +40,54 @@ def get_price_over_14_m3(usage: int) -> int | float:
         return (usage * 168110) - 6943997
 
 
+def get_prices_over_14_m3(usages: np.ndarray) -> np.ndarray:
+    """
+    Batch version of get_price_over_14_m3
+    Pass usages as liter
+    :return prices as float64 array, same as get_price_over_14_m3 for each usage
+    """
+    # convert  liter to m3
+    usages = np.asarray(usages) / 1000
+    if (usages < 0).any():
+        raise ValueError('usages must not be negative')
+
+    brackets = np.searchsorted(WATER_TARIFF_BOUNDS, usages, side='left')
+    return (usages * WATER_TARIFF_SLOPES[brackets]) - WATER_TARIFF_INTERCEPTS[brackets]
+
+
 def round_price(price: int) -> int:
+    """
+    Round price half up to hundreds, prices below 100 become 100
+    """
     if price == 0:
         return 0
 
-    if len(str(price)) <= 2:
+    if price < 100:
         return 100
 
-    else:
-        # Delete last digit
-        price //= 10
-        if price % 10 >= 5:
-            price //= 10
-            price += 1
-        else:
-            price //= 10
-        price *= 100
-        return price
-    
\ No newline at end of file
+    # Drop last digit then round half up on the next one
+    return (price // 10 + 5) // 10 * 100
+
+
+def round_prices(prices: np.ndarray) -> np.ndarray:
+    """
+    Batch version of round_price
+    :return int64 array, same as round_price for each price
+    """
+    prices = np.asarray(prices, dtype=np.int64)
+    rounded = (prices // 10 + 5) // 10 * 100
+    rounded[prices < 100] = 100
+    rounded[prices == 0] = 0
+    return rounded
+
+
+def period_str(year: int | None, month: int | None) -> str | None:
+    """
+    Jalali period like 1402-07, None if there is no period
+    """
+    return None if year is None else '%d-%02d' % (year, month)
+
+
+def str_or_none(value) -> str | None:
+    # Jalali dates are written like 1402-07-01
+    return None if value is None else str(value)
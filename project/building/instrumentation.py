@@ -0,0 +1,137 @@
+"""
+Timing of calculation phases
+
+Nothing is measured until a collector is added, either with add_collector or
+by listing dotted paths in settings.BUILDING_INSTRUMENTATION_COLLECTORS.
+A collector is called with the CalculationRun after each run finishes.
+
+    with instrumentation.run('calculate_submeter_prices') as current_run:
+        with current_run.span('load'):
+            ...
+"""
+import logging
+from time import perf_counter
+
+from django.db import connection
+
+
+logger = logging.getLogger(__name__)
+
+_collectors = []
+
+
+def add_collector(collector) -> None:
+    if collector not in _collectors:
+        _collectors.append(collector)
+
+
+def remove_collector(collector) -> None:
+    if collector in _collectors:
+        _collectors.remove(collector)
+
+
+def log_collector(current_run: 'CalculationRun') -> None:
+    """
+    Collector which logs summary of each run
+    """
+    logger.info('%s', current_run.as_dict())
+
+
+class _Span:
+    __slots__ = ('run', 'name', 'started', 'queries')
+
+    def __init__(self, current_run: 'CalculationRun', name: str) -> None:
+        self.run = current_run
+        self.name = name
+
+    def __enter__(self) -> '_Span':
+        self.queries = self.run.queries
+        self.started = perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        phase = self.run.phases.setdefault(self.name, {'seconds': 0.0, 'queries': 0})
+        phase['seconds'] += perf_counter() - self.started
+        phase['queries'] += self.run.queries - self.queries
+
+
+class CalculationRun:
+    """
+    Summary of one run: unit count, query count and wall time of each phase
+    """
+    __slots__ = ('name', 'units', 'queries', 'seconds', 'phases', 'error', '_started', '_query_wrapper')
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.units = 0
+        self.queries = 0
+        self.seconds = 0.0
+        # {phase name: {'seconds': float, 'queries': int}}, in order of first use
+        self.phases = {}
+        self.error = None
+
+    def __enter__(self) -> 'CalculationRun':
+        self._query_wrapper = connection.execute_wrapper(self._count_query)
+        self._query_wrapper.__enter__()
+        self._started = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.seconds = perf_counter() - self._started
+        self._query_wrapper.__exit__(exc_type, exc_value, traceback)
+        if exc_value is not None:
+            self.error = repr(exc_value)
+
+        for collector in list(_collectors):
+            try:
+                collector(self)
+            except Exception:
+                logger.exception('instrumentation collector %r failed', collector)
+
+    def _count_query(self, execute, sql, params, many, context):
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+    def span(self, name: str) -> _Span:
+        return _Span(self, name)
+
+    def set_units(self, units: int) -> None:
+        self.units = units
+
+    def as_dict(self) -> dict:
+        return {
+            'name': self.name,
+            'units': self.units,
+            'queries': self.queries,
+            'seconds': self.seconds,
+            'phases': self.phases,
+            'error': self.error,
+        }
+
+
+class _NullRun:
+    """
+    Stands for both run and span while instrumentation is disabled
+    """
+    __slots__ = ()
+
+    def __enter__(self) -> '_NullRun':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+    def span(self, name: str) -> '_NullRun':
+        return self
+
+    def set_units(self, units: int) -> None:
+        pass
+
+
+_NULL_RUN = _NullRun()
+
+
+def run(name: str) -> CalculationRun | _NullRun:
+    if not _collectors:
+        return _NULL_RUN
+    return CalculationRun(name)
@@ -0,0 +1,90 @@
+import logging
+import traceback
+from datetime import timedelta
+from time import perf_counter
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+
+from .models import CalculationJob, SubmeterCalculator
+
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_calculation(submeter_calculator: SubmeterCalculator, force: bool = False) -> CalculationJob:
+    """
+    Queue a calculation, an unfinished job of same calculator is returned instead of a new one
+    Raises ValidationError for an archived calculator
+    """
+    submeter_calculator.validate_not_archived()
+    fail_stale_jobs()
+    job = CalculationJob.objects.filter(submeter_calculator=submeter_calculator, force=force,
+                                        status__in=(CalculationJob.PENDING, CalculationJob.RUNNING)).first()
+    if job is None:
+        job = CalculationJob.objects.create(submeter_calculator=submeter_calculator, force=force)
+    return job
+
+
+def fail_stale_jobs() -> int:
+    """
+    Mark jobs running longer than CALCULATION_JOB_TIMEOUT as failed, their worker stopped without finishing them
+    :return number of jobs marked
+    """
+    now = timezone.now()
+    return CalculationJob.objects.filter(
+        status=CalculationJob.RUNNING, started__lt=now - timedelta(seconds=settings.CALCULATION_JOB_TIMEOUT),
+    ).update(status=CalculationJob.FAILED, finished=now,
+             error='Worker stopped, job did not finish in %d seconds' % settings.CALCULATION_JOB_TIMEOUT)
+
+
+def claim_next_job() -> CalculationJob | None:
+    """
+    Mark oldest pending job as running and return it, None if queue is empty
+    Claiming is a conditional update so concurrent workers never get the same job
+    """
+    while True:
+        job_id = CalculationJob.objects.filter(status=CalculationJob.PENDING).order_by('id').values_list('id', flat=True).first()
+        if job_id is None:
+            return None
+
+        claimed = CalculationJob.objects.filter(id=job_id, status=CalculationJob.PENDING) \
+            .update(status=CalculationJob.RUNNING, started=timezone.now())
+        if claimed:
+            return CalculationJob.objects.select_related('submeter_calculator').get(id=job_id)
+
+
+def run_job(job: CalculationJob) -> CalculationJob:
+    """
+    Run a claimed job and store its outcome on the job row
+    """
+    started = perf_counter()
+    try:
+        job.result = job.submeter_calculator.calculate_submeter_prices(force=job.force)['result_object']
+        job.status = CalculationJob.DONE
+    except ValidationError as e:
+        job.status = CalculationJob.FAILED
+        job.error = ' '.join(e.messages)
+    except Exception:
+        logger.exception('calculation job %s failed', job.id)
+        job.status = CalculationJob.FAILED
+        job.error = traceback.format_exc()
+
+    job.duration = perf_counter() - started
+    job.finished = timezone.now()
+    job.save(update_fields=['result', 'status', 'error', 'duration', 'finished'])
+    return job
+
+
+def run_pending_jobs() -> int:
+    """
+    Run jobs until the queue is empty
+    :return number of jobs run
+    """
+    fail_stale_jobs()
+    count = 0
+    while (job := claim_next_job()) is not None:
+        run_job(job)
+        count += 1
+    return count
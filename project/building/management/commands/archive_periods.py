@@ -0,0 +1,38 @@
+import json
+from time import perf_counter
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from building.archive import PeriodArchiver
+from building.readings import parse_date
+
+
+class Command(BaseCommand):
+    help = 'Move results and readings of periods before a date from database into archive files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--before', required=True, help='Jalali date like 1402-01-01, earlier bills and readings are archived')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Results or usages read and deleted together')
+        parser.add_argument('--dry-run', action='store_true', help='Only count what would be archived')
+        parser.add_argument('--json', action='store_true', help='Print summary as json')
+
+    def handle(self, *args, **options):
+        try:
+            before = parse_date(options['before'])
+        except ValidationError as e:
+            raise CommandError(' '.join(e.messages))
+
+        started = perf_counter()
+        summary = PeriodArchiver(before, options['batch_size']).run(dry_run=options['dry_run'])
+        summary['seconds'] = perf_counter() - started
+
+        if options['json']:
+            self.stdout.write(json.dumps(summary))
+            return
+        action = 'Would archive' if options['dry_run'] else 'Archived into %s' % settings.ARCHIVE_ROOT
+        self.stdout.write(action + (
+            ' %(results)d results with %(unit_results)d unit results and %(unit_usages)d readings of '
+            '%(usages)d usages in %(seconds).2fs' % summary
+        ))
@@ -0,0 +1,140 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+from time import perf_counter
+
+import jdatetime
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+
+from building.calculation import fingerprint_inputs, try_calculate_prices
+from building.models import SubmeterCalculator, Result, UnitResult
+
+
+def jalali_date(value: str) -> jdatetime.date:
+    try:
+        return jdatetime.datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError('%s is not a jalali date like 1401-06-31' % value)
+
+
+def process_pool(workers: int) -> ProcessPoolExecutor | None:
+    """
+    Pool of worker processes, None for one worker
+
+    Database connections are closed and workers started before this process connects again, so forked
+    workers do not inherit an open connection socket
+    """
+    if workers <= 1:
+        return None
+    connections.close_all()
+    executor = ProcessPoolExecutor(workers)
+    # Workers are forked on first submit
+    executor.submit(int).result()
+    return executor
+
+
+class Command(BaseCommand):
+    help = 'Calculate every submeter calculator which has no result yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--building', type=int, action='append', dest='buildings', help='Building id, can be repeated')
+        parser.add_argument('--from-date', type=jalali_date, help='Water bill issuance date from, jalali YYYY-MM-DD')
+        parser.add_argument('--to-date', type=jalali_date, help='Water bill issuance date to, jalali YYYY-MM-DD')
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Size of process pool, 1 calculates in this process')
+        parser.add_argument('--batch-size', type=int, default=500, help='Calculators loaded and saved together')
+        parser.add_argument('--dry-run', action='store_true', help='Calculate but do not save results')
+        parser.add_argument('--json', action='store_true', help='Print summary as json')
+
+    def handle(self, *args, **options):
+        calculators = SubmeterCalculator.objects.filter(results__isnull=True, archived=False)
+        if options['buildings']:
+            calculators = calculators.filter(water_bill__building__in=options['buildings'])
+        if options['from_date']:
+            calculators = calculators.filter(water_bill__issuance_date__gte=options['from_date'])
+        if options['to_date']:
+            calculators = calculators.filter(water_bill__issuance_date__lte=options['to_date'])
+        ids = list(calculators.order_by('id').values_list('id', flat=True))
+
+        self.dry_run = options['dry_run']
+        self.summary = {'calculators': len(ids), 'succeeded': 0, 'failed': 0, 'units': 0, 'failures': {}}
+        started = perf_counter()
+
+        executor = process_pool(options['workers'])
+        try:
+            for i in range(0, len(ids), options['batch_size']):
+                self.calculate_batch(ids[i:i + options['batch_size']], executor)
+        finally:
+            if executor:
+                executor.shutdown()
+
+        seconds = perf_counter() - started
+        self.summary['seconds'] = seconds
+        self.summary['calculators_per_second'] = self.summary['succeeded'] / seconds if seconds else 0
+        self.summary['units_per_second'] = self.summary['units'] / seconds if seconds else 0
+        self.summary['dry_run'] = self.dry_run
+
+        if options['json']:
+            self.stdout.write(json.dumps(self.summary))
+            return
+
+        for sc_id, error in self.summary['failures'].items():
+            self.stderr.write('calculator %s: %s' % (sc_id, error))
+        self.stdout.write(
+            '%(succeeded)d of %(calculators)d calculators (%(units)d units) calculated in %(seconds).2fs, '
+            '%(calculators_per_second).1f calculators/s, %(units_per_second).1f units/s' % self.summary
+        )
+
+    def fail(self, sc_id: int, error: str) -> None:
+        self.summary['failed'] += 1
+        self.summary['failures'][sc_id] = error
+
+    def calculate_batch(self, ids: list, executor: ProcessPoolExecutor | None) -> None:
+        errors = {}
+        inputs = SubmeterCalculator.load_calculation_inputs_in_bulk(ids, errors=errors)
+        for sc_id, error in errors.items():
+            self.fail(sc_id, ' '.join(error.messages))
+
+        items = list(inputs.items())
+        if executor:
+            outcomes = executor.map(try_calculate_prices, items, chunksize=max(1, len(items) // 32))
+        else:
+            outcomes = map(try_calculate_prices, items)
+
+        calculations = []
+        for sc_id, calculation, error in outcomes:
+            if error:
+                self.fail(sc_id, error)
+            else:
+                calculations.append((sc_id, inputs[sc_id], calculation))
+
+        if not self.dry_run:
+            try:
+                self.save(calculations)
+            except Exception:
+                # Find failed calculators by saving one by one
+                saved = []
+                for item in calculations:
+                    try:
+                        self.save([item])
+                        saved.append(item)
+                    except Exception as e:
+                        self.fail(item[0], '%s: %s' % (type(e).__name__, e))
+                calculations = saved
+
+        self.summary['succeeded'] += len(calculations)
+        self.summary['units'] += sum(len(calculation.units) for _, _, calculation in calculations)
+
+    @transaction.atomic
+    def save(self, calculations: list) -> None:
+        # Water bills are needed for jalali period of results
+        calculators = SubmeterCalculator.objects.select_related('water_bill').in_bulk([sc_id for sc_id, _, _ in calculations])
+        results = Result.objects.bulk_create([
+            Result(submeter_calculator=calculators[sc_id], submeter_calculator_details=calculation.details(),
+                   input_fingerprint=fingerprint_inputs(inputs))
+            for sc_id, inputs, calculation in calculations
+        ])
+        UnitResult.objects.bulk_create(chain.from_iterable(
+            result.build_unit_results(calculation) for result, (_, _, calculation) in zip(results, calculations)
+        ), batch_size=1000)
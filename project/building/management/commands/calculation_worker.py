@@ -0,0 +1,52 @@
+from threading import Event, Thread
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from building.jobs import run_pending_jobs
+
+
+class Command(BaseCommand):
+    help = 'Run queued submeter calculations'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=1, help='Number of jobs run at the same time')
+        parser.add_argument('--poll-interval', type=float, default=2.0, help='Seconds to wait when queue is empty')
+        parser.add_argument('--burst', action='store_true', help='Exit when queue is empty')
+
+    def handle(self, *args, **options):
+        self.stop = Event()
+        self.poll_interval = options['poll_interval']
+        self.burst = options['burst']
+
+        if options['concurrency'] <= 1:
+            self.work()
+            return
+
+        threads = [Thread(target=self.work_in_thread, daemon=True) for _ in range(options['concurrency'])]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(timeout=1)
+        except KeyboardInterrupt:
+            # Let running jobs finish
+            self.stop.set()
+            for thread in threads:
+                thread.join()
+
+    def work(self) -> None:
+        while not self.stop.is_set():
+            count = run_pending_jobs()
+            if count:
+                self.stdout.write('%d calculation jobs done' % count)
+            if self.burst:
+                break
+            self.stop.wait(self.poll_interval)
+
+    def work_in_thread(self) -> None:
+        try:
+            self.work()
+        finally:
+            connection.close()
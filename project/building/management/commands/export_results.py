@@ -0,0 +1,61 @@
+import os
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from building.exports import FORMATS, reading_export, unit_result_export, write_export
+
+
+def jalali_period(value: str) -> tuple:
+    try:
+        year, month = map(int, value.split('-'))
+    except ValueError:
+        raise CommandError('%s is not a jalali period like 1402-07' % value)
+    if not 1 <= month <= 12:
+        raise CommandError('%s is not a jalali period like 1402-07' % value)
+    return year, month
+
+
+class Command(BaseCommand):
+    help = 'Export every unit result, or every reading, to a CSV, XLSX or JSONL file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='Output file, its extension picks format unless --format is given, - for stdout')
+        parser.add_argument('--format', choices=FORMATS, help='Output format')
+        parser.add_argument('--readings', action='store_true', help='Export readings of units instead of unit results')
+        parser.add_argument('--building', type=int, action='append', dest='buildings', help='Building id, can be repeated')
+        parser.add_argument('--from-period', type=jalali_period, help='First jalali period, like 1402-01')
+        parser.add_argument('--to-period', type=jalali_period, help='Last jalali period, like 1402-12')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows fetched from database at once')
+
+    def handle(self, *args, **options):
+        output = options['output']
+        export_format = options['format'] or os.path.splitext(output)[1].lstrip('.').lower()
+        if export_format not in FORMATS:
+            raise CommandError('format must be one of %s, pass --format' % ', '.join(FORMATS))
+        if output == '-' and export_format == 'xlsx':
+            raise CommandError('xlsx can not be written to stdout')
+
+        build = reading_export if options['readings'] else unit_result_export
+        export = build(buildings=options['buildings'], start=options['from_period'], end=options['to_period'],
+                       chunk_size=options['chunk_size'])
+        counter = {'rows': 0}
+
+        def counted(rows):
+            for row in rows:
+                counter['rows'] += 1
+                yield row
+
+        started = perf_counter()
+        export = export._replace(rows=counted(export.rows))
+        if output == '-':
+            write_export(export, export_format, self.stdout)
+        else:
+            binary = export_format == 'xlsx'
+            with open(output, 'wb' if binary else 'w', **({} if binary else {'encoding': 'utf-8', 'newline': ''})) as file:
+                write_export(export, export_format, file)
+
+        seconds = perf_counter() - started
+        # Summary must not mix with rows written to stdout
+        (self.stderr if output == '-' else self.stdout).write('%d rows exported in %.2fs (%.0f rows/s)' % (
+            counter['rows'], seconds, counter['rows'] / seconds if seconds else 0))
@@ -0,0 +1,58 @@
+import json
+from time import perf_counter
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from building.readings import ReadingImporter
+
+
+class Command(BaseCommand):
+    help = 'Import meter readings from CSV or XLSX files with building, date, unit and liters columns'
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='+', help='CSV or XLSX files')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Rows validated and written together')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows of each bulk_create query')
+        parser.add_argument('--max-errors', type=int, default=1000, help='Errors printed for each file, the rest are only counted')
+        parser.add_argument('--json', action='store_true', help='Print summary as json')
+
+    def handle(self, *args, **options):
+        summary = {'files': {}, 'rows': 0, 'imported': 0, 'usages_created': 0, 'errors': 0}
+        started = perf_counter()
+
+        for path in options['files']:
+            importer = ReadingImporter(options['chunk_size'], options['batch_size'], options['max_errors'])
+            try:
+                with open(path, 'rb') as file:
+                    importer.import_file(file, path)
+            except OSError as e:
+                raise CommandError(e)
+            except ValidationError as e:
+                raise CommandError('%s: %s' % (path, ' '.join(e.messages)))
+
+            summary['files'][path] = {'rows': importer.rows, 'imported': importer.imported,
+                                      'usages_created': importer.usages_created, 'errors': importer.error_count,
+                                      'first_errors': importer.errors}
+            for key in ('rows', 'imported', 'usages_created'):
+                summary[key] += getattr(importer, key)
+            summary['errors'] += importer.error_count
+
+            if not options['json']:
+                for line, message in importer.errors:
+                    self.stderr.write('%s:%d: %s' % (path, line, message))
+                if importer.error_count > len(importer.errors):
+                    self.stderr.write('%s: %d more errors' % (path, importer.error_count - len(importer.errors)))
+
+        seconds = perf_counter() - started
+        summary['seconds'] = seconds
+        summary['rows_per_second'] = summary['rows'] / seconds if seconds else 0
+
+        if options['json']:
+            self.stdout.write(json.dumps(summary))
+            return
+
+        self.stdout.write(
+            '%(imported)d of %(rows)d rows imported into %(usages_created)d new usages, %(errors)d rows failed, '
+            'in %(seconds).2fs (%(rows_per_second).0f rows/s)' % summary
+        )
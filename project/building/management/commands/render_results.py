@@ -0,0 +1,113 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+
+from building.models import Result
+from building.printing import (copy_offline_assets, printable_results, printable_result_fingerprint, try_write_printable_files,
+                               write_atomic)
+
+from .calculate_all import jalali_date, process_pool
+
+
+class Command(BaseCommand):
+    help = 'Render printable results and per-unit payment slips to static files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='Output directory')
+        parser.add_argument('--result', type=int, action='append', dest='results', help='Result id, can be repeated')
+        parser.add_argument('--building', type=int, action='append', dest='buildings', help='Building id, can be repeated')
+        parser.add_argument('--from-date', type=jalali_date, help='Water bill issuance date from, jalali YYYY-MM-DD')
+        parser.add_argument('--to-date', type=jalali_date, help='Water bill issuance date to, jalali YYYY-MM-DD')
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Size of process pool, 1 renders in this process')
+        parser.add_argument('--batch-size', type=int, default=200, help='Results loaded together')
+        parser.add_argument('--force', action='store_true', help='Render files which are up to date too')
+
+    def handle(self, *args, **options):
+        results = Result.objects.all()
+        if options['results']:
+            results = results.filter(id__in=options['results'])
+        if options['buildings']:
+            results = results.filter(submeter_calculator__water_bill__building__in=options['buildings'])
+        if options['from_date']:
+            results = results.filter(submeter_calculator__water_bill__issuance_date__gte=options['from_date'])
+        if options['to_date']:
+            results = results.filter(submeter_calculator__water_bill__issuance_date__lte=options['to_date'])
+        ids = list(results.order_by('id').values_list('id', flat=True))
+
+        self.output = options['output']
+        copy_offline_assets(self.output)
+        self.index = self.read_index()
+        self.summary = {'results': len(ids), 'rendered': 0, 'skipped': 0, 'files': 0, 'failures': {}}
+        started = perf_counter()
+
+        executor = process_pool(options['workers'])
+        try:
+            for i in range(0, len(ids), options['batch_size']):
+                self.render_batch(ids[i:i + options['batch_size']], executor, options['force'])
+        finally:
+            if executor:
+                executor.shutdown()
+            self.write_index()
+
+        seconds = perf_counter() - started
+        for result_id, error in self.summary['failures'].items():
+            self.stderr.write('result %s: %s' % (result_id, error))
+        self.stdout.write('%d of %d results rendered (%d files), %d up to date, in %.2fs' % (
+            self.summary['rendered'], self.summary['results'], self.summary['files'], self.summary['skipped'], seconds))
+
+    def read_index(self) -> dict:
+        """
+        {result id: entry} of index.json written by previous runs
+        """
+        try:
+            with open(os.path.join(self.output, 'index.json'), encoding='utf-8') as file:
+                return {entry['result']: entry for entry in json.load(file)['results']}
+        except (FileNotFoundError, ValueError, KeyError):
+            return {}
+
+    def write_index(self) -> None:
+        entries = sorted(self.index.values(), key=lambda entry: (entry['building'], entry['issuance_date'], entry['result']))
+        write_atomic(os.path.join(self.output, 'index.json'), json.dumps({'results': entries}, ensure_ascii=False, indent=1))
+        write_atomic(os.path.join(self.output, 'index.html'), render_to_string('building/rendered_results_index.html', {'entries': entries}))
+
+    def is_up_to_date(self, result_id: int, fingerprint: str) -> bool:
+        entry = self.index.get(result_id)
+        return (entry is not None and entry['fingerprint'] == fingerprint
+                and all(os.path.exists(os.path.join(self.output, path)) for path in entry['files']))
+
+    def render_batch(self, ids: list, executor: ProcessPoolExecutor | None, force: bool) -> None:
+        pending = {}
+        for result in printable_results().filter(id__in=ids):
+            fingerprint = printable_result_fingerprint(result)
+            if not force and self.is_up_to_date(result.id, fingerprint):
+                self.summary['skipped'] += 1
+                continue
+            water_bill = result.submeter_calculator.water_bill
+            pending[result.id] = (result, {
+                'result': result.id,
+                'building': water_bill.building_id,
+                'building_name': water_bill.building.name,
+                'issuance_date': str(water_bill.issuance_date),
+                'fingerprint': fingerprint,
+            })
+
+        items = [(result, self.output) for result, _ in pending.values()]
+        if executor:
+            outcomes = executor.map(try_write_printable_files, items, chunksize=max(1, len(items) // 32))
+        else:
+            outcomes = map(try_write_printable_files, items)
+
+        for result_id, paths, error in outcomes:
+            if error:
+                self.summary['failures'][result_id] = error
+                self.index.pop(result_id, None)
+                continue
+            entry = pending[result_id][1]
+            entry['files'] = paths
+            self.index[result_id] = entry
+            self.summary['rendered'] += 1
+            self.summary['files'] += len(paths)
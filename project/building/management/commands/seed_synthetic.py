@@ -0,0 +1,199 @@
+import csv
+import io
+import random
+from datetime import timedelta
+from time import perf_counter
+
+import jdatetime
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from building.models import Building, Usage, UnitUsage, WaterBill, GasBill, SubmeterCalculator, ExtraCharge, Debt
+from building.tariffs import BUILTIN_TARIFF
+
+
+def units_range(value: str) -> tuple:
+    """
+    "16" or "4-64"
+    """
+    try:
+        low, _, high = value.partition('-')
+        low, high = int(low), int(high or low)
+    except ValueError:
+        raise CommandError('units must be like 16 or 4-64')
+    if not 2 <= low <= high:
+        raise CommandError('units must be at least 2')
+    return low, high
+
+
+class Command(BaseCommand):
+    help = 'Generate deterministic synthetic buildings, readings, bills and calculators for load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--buildings', type=int, default=100, help='Number of buildings')
+        parser.add_argument('--units', type=units_range, default=(4, 64), help='Units of each building, like 16 or 4-64')
+        parser.add_argument('--periods', type=int, default=24, help='Monthly billing periods of each building')
+        parser.add_argument('--start-date', default='1398-01-01', help='Jalali date of first reading')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--chunk-size', type=int, default=50, help='Buildings written in one transaction')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows of each bulk_create query')
+        parser.add_argument('--no-copy', action='store_true', help='Use bulk_create on PostgreSQL too')
+
+    def handle(self, *args, **options):
+        try:
+            self.start_date = jdatetime.datetime.strptime(options['start_date'], '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError('start-date must be a jalali date like 1398-01-01')
+        self.units = options['units']
+        self.periods = options['periods']
+        self.seed = options['seed']
+        self.batch_size = options['batch_size']
+        self.use_copy = connection.vendor == 'postgresql' and not options['no_copy']
+        self.rows = 0
+
+        started = perf_counter()
+        for first in range(0, options['buildings'], options['chunk_size']):
+            numbers = range(first, min(first + options['chunk_size'], options['buildings']))
+            with transaction.atomic():
+                self.seed_buildings(numbers)
+            if options['verbosity'] > 1:
+                self.stdout.write('%d buildings written' % numbers.stop)
+
+        seconds = perf_counter() - started
+        self.stdout.write('%d rows of %d buildings written in %.1fs (%.0f rows/s)' % (
+            self.rows, options['buildings'], seconds, self.rows / seconds if seconds else 0))
+
+    def seed_buildings(self, numbers: range) -> None:
+        # Every building has its own random generator so output does not depend on chunk size
+        generators = {number: random.Random('%d-%d' % (self.seed, number)) for number in numbers}
+
+        buildings = self.bulk_create(Building, [
+            Building(name='synthetic %d-%d' % (self.seed, number), units=generators[number].randint(*self.units))
+            for number in numbers
+        ])
+
+        # Reading dates and amounts, one more reading than periods
+        dates = {}
+        amounts = {}
+        for number, building in zip(numbers, buildings):
+            rng = generators[number]
+            building_dates = [self.start_date]
+            for _ in range(self.periods):
+                building_dates.append(building_dates[-1] + timedelta(days=rng.randint(28, 35)))
+            dates[building.id] = building_dates
+            amounts[building.id] = self.readings(rng, building.units, building_dates)
+
+        usages = self.bulk_create(Usage, [
+            Usage(building=building, register_date=date) for building in buildings for date in dates[building.id]
+        ])
+        usage_ids = {}
+        for usage in usages:
+            usage_ids.setdefault(usage.building_id, []).append(usage.id)
+
+        self.copy(UnitUsage, ('usage_id', 'unit', 'amount'), (
+            (usage_ids[building.id][period], unit, amount)
+            for building in buildings
+            for period, period_amounts in enumerate(amounts[building.id])
+            for unit, amount in enumerate(period_amounts, start=1)
+        ))
+
+        water_bills = []
+        gas_bills = []
+        # (extra charges, debts) of each period without calculator id
+        charges = []
+        for number, building in zip(numbers, buildings):
+            rng = generators[number]
+            building_dates = dates[building.id]
+            building_amounts = amounts[building.id]
+            for period in range(self.periods):
+                days = (building_dates[period + 1] - building_dates[period]).days
+                usages_30_days = (building_amounts[period + 1] - building_amounts[period]) * 30 / days
+                water_price = int(BUILTIN_TARIFF.prices(usages_30_days).sum() * (days / 30) * 1.49 / 10 * rng.uniform(0.9, 1.1))
+                water_price = max(water_price, 1000)
+                issuance_date = building_dates[period + 1] + timedelta(days=rng.randint(1, 7))
+                bill_dates = {'issuance_date': issuance_date, 'current_reading': building_dates[period + 1],
+                              'payment_deadline': issuance_date + timedelta(days=20)}
+                water_bills.append(WaterBill(building=building, water_consumption_price=water_price,
+                                             total_payment=int(water_price * rng.uniform(1.3, 1.8)), **bill_dates))
+                gas_bills.append(GasBill(building=building, total_payment=rng.randint(50, 400) * 1000 * building.units,
+                                         **bill_dates))
+
+                extra_charges = [('maintenance', rng.randint(20, 80) * 1000, 1)]
+                if rng.random() < 0.3:
+                    extra_charges.append(('repair', rng.randint(10, 200) * 1000, 2))
+                debts = [(unit, rng.randint(5, 500) * 100)
+                         for unit in sorted(rng.sample(range(1, building.units + 1), k=max(1, building.units // 20)))]
+                charges.append((extra_charges, debts))
+        water_bills = self.bulk_create(WaterBill, water_bills)
+        gas_bills = self.bulk_create(GasBill, gas_bills)
+
+        calculators = []
+        for i, (water_bill, gas_bill) in enumerate(zip(water_bills, gas_bills)):
+            period = i % self.periods
+            building_usage_ids = usage_ids[water_bill.building_id]
+            calculators.append(SubmeterCalculator(water_bill=water_bill, gas_bill=gas_bill,
+                                                  previous_usage_id=building_usage_ids[period],
+                                                  current_usage_id=building_usage_ids[period + 1]))
+        calculators = self.bulk_create(SubmeterCalculator, calculators)
+
+        extra_charges = [(sc.id, *charge) for sc, (sc_charges, _) in zip(calculators, charges) for charge in sc_charges]
+        debts = [(sc.id, *debt) for sc, (_, sc_debts) in zip(calculators, charges) for debt in sc_debts]
+
+        self.copy(ExtraCharge, ('submeter_calculator_id', 'title', 'amount', 'my_order'), extra_charges)
+        self.copy(Debt, ('submeter_calculator_id', 'unit', 'amount'), debts)
+
+    def readings(self, rng: random.Random, units: int, dates: list) -> np.ndarray:
+        """
+        Monotone readings (liter) of each unit, shape (len(dates), units)
+        """
+        np_rng = np.random.default_rng(rng.getrandbits(64))
+        # Liter per day of each unit, a few heavy users
+        daily = np_rng.lognormal(mean=5.8, sigma=0.5, size=units)
+        days = np.array([(date - dates[0]).days for date in dates])
+        # More usage in summer
+        months = np.array([date.month for date in dates])
+        seasonal = 1 + 0.3 * np.sin((months - 1) / 12 * 2 * np.pi)
+        noise = np_rng.uniform(0.8, 1.2, size=(len(dates), units))
+
+        consumption = np.diff(days)[:, None] * daily[None, :] * seasonal[1:, None] * noise[1:]
+        # Every unit uses at least one liter a period so readings strictly grow
+        consumption = np.maximum(consumption.astype(np.int64), 1)
+        start = np_rng.integers(100_000, 5_000_000, size=units)
+        return np.vstack([start, start + np.cumsum(consumption, axis=0)])
+
+    def bulk_create(self, model, objects: list) -> list:
+        objects = model.objects.bulk_create(objects, batch_size=self.batch_size)
+        self.rows += len(objects)
+        return objects
+
+    def copy(self, model, columns: tuple, rows) -> None:
+        """
+        Insert plain value rows, with COPY on PostgreSQL
+        """
+        if not self.use_copy:
+            objects = [model(**dict(zip(columns, row))) for row in rows]
+            self.bulk_create(model, objects)
+            return
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        count = 0
+        with connection.cursor() as cursor:
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+                if count % self.batch_size == 0:
+                    self.copy_buffer(cursor, model, columns, buffer)
+                    buffer = io.StringIO()
+                    writer = csv.writer(buffer)
+            self.copy_buffer(cursor, model, columns, buffer)
+        self.rows += count
+
+    def copy_buffer(self, cursor, model, columns: tuple, buffer: io.StringIO) -> None:
+        if not buffer.tell():
+            return
+        buffer.seek(0)
+        sql = 'COPY %s (%s) FROM STDIN WITH (FORMAT csv)' % (
+            connection.ops.quote_name(model._meta.db_table), ', '.join(connection.ops.quote_name(c) for c in columns))
+        cursor.copy_expert(sql, buffer)
@@ -0,0 +1,40 @@
+import base64
+import hashlib
+import os
+from urllib.request import urlopen
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from building.printing import BOOTSTRAP_VERSION, INTEGRITY, write_atomic
+
+
+URL = 'https://cdn.jsdelivr.net/npm/bootstrap@%s/dist/%s'
+# {path in dist: subresource integrity}, source maps only help debugging and upstream publishes no hashes of them
+FILES = {
+    **{path[len('bootstrap/'):]: value for path, value in INTEGRITY.items() if path.startswith('bootstrap/')},
+    'css/bootstrap.min.css.map': None,
+    'js/bootstrap.bundle.min.js.map': None,
+}
+
+
+def integrity(content: bytes) -> str:
+    return 'sha384-' + base64.b64encode(hashlib.sha384(content).digest()).decode()
+
+
+class Command(BaseCommand):
+    help = 'Download Bootstrap %s into project/static/bootstrap, checked against its subresource integrity' % BOOTSTRAP_VERSION
+
+    def handle(self, *args, **options):
+        contents = {}
+        for path, expected in FILES.items():
+            with urlopen(URL % (BOOTSTRAP_VERSION, path), timeout=30) as response:
+                content = response.read()
+            if expected and integrity(content) != expected:
+                raise CommandError('%s does not match integrity of Bootstrap %s, nothing was written' % (path, BOOTSTRAP_VERSION))
+            contents[path] = content
+
+        directory = os.path.join(settings.STATICFILES_DIRS[0], 'bootstrap')
+        for path, content in contents.items():
+            write_atomic(os.path.join(directory, path), content.decode())
+        self.stdout.write('Bootstrap %s written to %s' % (BOOTSTRAP_VERSION, directory))
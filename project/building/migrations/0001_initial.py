@@ -0,0 +1,202 @@
+# Generated by Django 4.1 on 2026-10-17 00:36
+
+import ckeditor_uploader.fields
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+import django_jalali.db.models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Building',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', django_jalali.db.models.jDateTimeField(auto_now_add=True, verbose_name='creation datetime')),
+                ('name', models.CharField(max_length=63, verbose_name='building name')),
+                ('units', models.SmallIntegerField(validators=[django.core.validators.MinValueValidator(2)], verbose_name='number of units')),
+            ],
+            options={
+                'verbose_name': 'building',
+                'verbose_name_plural': 'buildings',
+            },
+        ),
+        migrations.CreateModel(
+            name='GasBill',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', django_jalali.db.models.jDateTimeField(auto_now_add=True, verbose_name='creation datetime')),
+                ('issuance_date', django_jalali.db.models.jDateField(verbose_name='issuance date')),
+                ('current_reading', django_jalali.db.models.jDateField(verbose_name='current reading')),
+                ('payment_deadline', django_jalali.db.models.jDateField(verbose_name='payment dead-line')),
+                ('total_payment', models.PositiveIntegerField(help_text='unit is Toman', verbose_name='total payment')),
+                ('building', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='gas_bills', to='building.building')),
+            ],
+            options={
+                'verbose_name': 'gas bill',
+                'verbose_name_plural': 'gas bills',
+            },
+        ),
+        migrations.CreateModel(
+            name='Result',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', django_jalali.db.models.jDateTimeField(auto_now_add=True, verbose_name='creation datetime')),
+                ('my_notes', models.TextField(blank=True, help_text='Notes just for me', null=True, verbose_name='my notes')),
+                ('client_notes', ckeditor_uploader.fields.RichTextUploadingField(blank=True, help_text='Notes for client; appears on final result page', null=True, verbose_name='client notes')),
+                ('due_date', django_jalali.db.models.jDateField(blank=True, null=True, verbose_name='due date')),
+                ('submeter_calculator_details', models.JSONField(blank=True, null=True, verbose_name='submeter calculator details')),
+            ],
+            options={
+                'verbose_name': 'result',
+                'verbose_name_plural': 'results',
+            },
+        ),
+        migrations.CreateModel(
+            name='WaterBill',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', django_jalali.db.models.jDateTimeField(auto_now_add=True, verbose_name='creation datetime')),
+                ('issuance_date', django_jalali.db.models.jDateField(verbose_name='issuance date')),
+                ('current_reading', django_jalali.db.models.jDateField(verbose_name='current reading')),
+                ('payment_deadline', django_jalali.db.models.jDateField(verbose_name='payment dead-line')),
+                ('total_payment', models.PositiveIntegerField(help_text='unit is Toman', verbose_name='total payment')),
+                ('water_consumption_price', models.PositiveIntegerField(help_text='unit is Toman', verbose_name='water consumption price')),
+                ('building', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='water_bills', to='building.building', verbose_name='building')),
+            ],
+            options={
+                'verbose_name': 'water bill',
+                'verbose_name_plural': 'water bills',
+            },
+        ),
+        migrations.CreateModel(
+            name='Usage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', django_jalali.db.models.jDateTimeField(auto_now_add=True, verbose_name='creation datetime')),
+                ('last_update', django_jalali.db.models.jDateTimeField(auto_now=True, verbose_name='last update')),
+                ('register_date', django_jalali.db.models.jDateField(verbose_name='date of registration')),
+                ('building', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='usages', to='building.building')),
+            ],
+            options={
+                'verbose_name': 'usage',
+                'verbose_name_plural': 'usages',
+            },
+        ),
+        migrations.CreateModel(
+            name='UnitUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('unit', models.PositiveSmallIntegerField(default=0, verbose_name='unit number')),
+                ('amount', models.PositiveIntegerField(verbose_name='amount in liter')),
+                ('usage', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='unit_usages', to='building.usage')),
+            ],
+            options={
+                'verbose_name': 'usage of unit',
+                'verbose_name_plural': 'usage of units',
+                'ordering': ('unit',),
+            },
+        ),
+        migrations.CreateModel(
+            name='UnitResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('unit', models.PositiveSmallIntegerField(default=0, verbose_name='unit')),
+                ('usage_amount', models.PositiveIntegerField(help_text='unit is liter', verbose_name='usage amount')),
+                ('price', models.PositiveIntegerField(help_text='unit is Toman', verbose_name='price')),
+                ('debt', models.PositiveIntegerField(blank=True, help_text='unit is Toman', null=True, verbose_name='debt')),
+                ('total_payment', models.PositiveIntegerField(help_text='unit is Toman', verbose_name='total payment')),
+                ('result', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='unit_results', to='building.result')),
+            ],
+            options={
+                'verbose_name': 'unit result',
+                'verbose_name_plural': 'units results',
+                'ordering': ('unit',),
+            },
+        ),
+        migrations.CreateModel(
+            name='SubmeterCalculator',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', django_jalali.db.models.jDateTimeField(auto_now_add=True, verbose_name='creation datetime')),
+                ('notes', models.TextField(blank=True, null=True, verbose_name='notes')),
+                ('current_usage', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='building.usage', verbose_name='current usage')),
+                ('gas_bill', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='building.gasbill')),
+                ('previous_usage', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='building.usage', verbose_name='previous usage')),
+                ('water_bill', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='building.waterbill')),
+            ],
+            options={
+                'verbose_name': 'submeter calculator',
+                'verbose_name_plural': 'submeter calculators',
+            },
+        ),
+        migrations.AddField(
+            model_name='result',
+            name='submeter_calculator',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='results', to='building.submetercalculator'),
+        ),
+        migrations.CreateModel(
+            name='ExtraCharge',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=127, verbose_name='title')),
+                ('amount', models.PositiveIntegerField(help_text='unit is Toman', verbose_name='amount')),
+                ('my_order', models.PositiveSmallIntegerField(default=0, verbose_name='order')),
+                ('submeter_calculator', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='extra_charges', to='building.submetercalculator')),
+            ],
+            options={
+                'verbose_name': 'extra charge',
+                'verbose_name_plural': 'extra charges',
+                'ordering': ('my_order',),
+            },
+        ),
+        migrations.CreateModel(
+            name='Debt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('unit', models.PositiveSmallIntegerField(verbose_name='unit')),
+                ('amount', models.PositiveIntegerField(help_text='unit is Toman', verbose_name='amount')),
+                ('submeter_calculator', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='debts', to='building.submetercalculator')),
+            ],
+            options={
+                'verbose_name': 'debt',
+                'verbose_name_plural': 'debts',
+                'ordering': ('unit',),
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='waterbill',
+            constraint=models.CheckConstraint(check=models.Q(('water_consumption_price__gt', 0)), name='wb_wcp_gt_0', violation_error_message='Field water_consumption_price must be greater than 0'),
+        ),
+        migrations.AddConstraint(
+            model_name='waterbill',
+            constraint=models.CheckConstraint(check=models.Q(('total_payment__gt', 0)), name='wb_total_payment_gt_0', violation_error_message='Field total_payment must be greater than 0'),
+        ),
+        migrations.AddConstraint(
+            model_name='waterbill',
+            constraint=models.CheckConstraint(check=models.Q(('total_payment__gt', models.F('water_consumption_price'))), name='wb_total_payment_gt_wcp', violation_error_message='total_payment must be greater than water_consumption_price'),
+        ),
+        migrations.AddConstraint(
+            model_name='unitusage',
+            constraint=models.CheckConstraint(check=models.Q(('amount__gt', 0)), name='unit_usage_amout_gt_0', violation_error_message='Field amount must be greater than 0'),
+        ),
+        migrations.AddConstraint(
+            model_name='gasbill',
+            constraint=models.CheckConstraint(check=models.Q(('total_payment__gt', 0)), name='gb_total_payment_gt_0', violation_error_message='Field total payment must be greater than 0'),
+        ),
+        migrations.AddConstraint(
+            model_name='extracharge',
+            constraint=models.CheckConstraint(check=models.Q(('amount__gt', 0)), name='extra_charge_amount_gt_0', violation_error_message='Field amount must be greater than 0'),
+        ),
+        migrations.AddConstraint(
+            model_name='debt',
+            constraint=models.CheckConstraint(check=models.Q(('amount__gt', 0)), name='debt_amount_gt_0', violation_error_message='Field amount must be greater than 0'),
+        ),
+    ]
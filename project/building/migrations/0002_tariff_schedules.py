@@ -0,0 +1,85 @@
+# Generated by Django 4.1 on 2026-10-17 00:36
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django_jalali.db.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('building', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='City',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', django_jalali.db.models.jDateTimeField(auto_now_add=True, verbose_name='creation datetime')),
+                ('name', models.CharField(max_length=63, unique=True, verbose_name='city name')),
+            ],
+            options={
+                'verbose_name': 'city',
+                'verbose_name_plural': 'cities',
+            },
+        ),
+        migrations.CreateModel(
+            name='TariffSchedule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', django_jalali.db.models.jDateTimeField(auto_now_add=True, verbose_name='creation datetime')),
+                ('title', models.CharField(max_length=127, verbose_name='title')),
+                ('valid_from', django_jalali.db.models.jDateField(verbose_name='valid from')),
+                ('valid_until', django_jalali.db.models.jDateField(blank=True, help_text='Leave empty if still valid', null=True, verbose_name='valid until')),
+            ],
+            options={
+                'verbose_name': 'tariff schedule',
+                'verbose_name_plural': 'tariff schedules',
+                'ordering': ('-valid_from',),
+            },
+        ),
+        migrations.CreateModel(
+            name='TariffBracket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('upper_bound', models.PositiveIntegerField(blank=True, help_text='unit is m3, leave empty for the last bracket', null=True, verbose_name='upper bound')),
+                ('slope', models.PositiveIntegerField(help_text='unit is Rial', verbose_name='price per m3')),
+                ('intercept', models.IntegerField(default=0, help_text='subtracted from price, unit is Rial', verbose_name='deduction')),
+                ('schedule', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='brackets', to='building.tariffschedule', verbose_name='tariff schedule')),
+            ],
+            options={
+                'verbose_name': 'tariff bracket',
+                'verbose_name_plural': 'tariff brackets',
+                'ordering': ('upper_bound',),
+            },
+        ),
+        migrations.CreateModel(
+            name='CityCoefficient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('coefficient', models.DecimalField(decimal_places=3, max_digits=6, verbose_name='price coefficient')),
+                ('valid_from', django_jalali.db.models.jDateField(verbose_name='valid from')),
+                ('valid_until', django_jalali.db.models.jDateField(blank=True, help_text='Leave empty if still valid', null=True, verbose_name='valid until')),
+                ('city', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='coefficients', to='building.city', verbose_name='city')),
+            ],
+            options={
+                'verbose_name': 'city coefficient',
+                'verbose_name_plural': 'city coefficients',
+                'ordering': ('city', '-valid_from'),
+            },
+        ),
+        migrations.AddField(
+            model_name='building',
+            name='city',
+            field=models.ForeignKey(blank=True, help_text='CITY_COEFFICIENT setting is used if empty', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='buildings', to='building.city', verbose_name='city'),
+        ),
+        migrations.AddConstraint(
+            model_name='tariffbracket',
+            constraint=models.UniqueConstraint(fields=('schedule', 'upper_bound'), name='tariff_bracket_unique_upper_bound'),
+        ),
+        migrations.AddConstraint(
+            model_name='citycoefficient',
+            constraint=models.CheckConstraint(check=models.Q(('coefficient__gt', 0)), name='city_coefficient_gt_0', violation_error_message='Field coefficient must be greater than 0'),
+        ),
+    ]
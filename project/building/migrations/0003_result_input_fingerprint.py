@@ -0,0 +1,18 @@
+# Generated by Django 4.1 on 2026-10-17 00:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('building', '0002_tariff_schedules'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='result',
+            name='input_fingerprint',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64, null=True, verbose_name='input fingerprint'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.1 on 2026-10-17 00:36
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django_jalali.db.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('building', '0003_result_input_fingerprint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CalculationJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', django_jalali.db.models.jDateTimeField(auto_now_add=True, verbose_name='creation datetime')),
+                ('force', models.BooleanField(default=False, help_text='Calculate even if a result with same inputs exists', verbose_name='force')),
+                ('status', models.CharField(choices=[('pending', 'pending'), ('running', 'running'), ('done', 'done'), ('failed', 'failed')], default='pending', max_length=15, verbose_name='status')),
+                ('started', django_jalali.db.models.jDateTimeField(blank=True, null=True, verbose_name='start datetime')),
+                ('finished', django_jalali.db.models.jDateTimeField(blank=True, null=True, verbose_name='finish datetime')),
+                ('duration', models.FloatField(blank=True, help_text='unit is second', null=True, verbose_name='duration')),
+                ('error', models.TextField(blank=True, null=True, verbose_name='error')),
+                ('result', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='building.result', verbose_name='result')),
+                ('submeter_calculator', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='calculation_jobs', to='building.submetercalculator', verbose_name='submeter calculator')),
+            ],
+            options={
+                'verbose_name': 'calculation job',
+                'verbose_name_plural': 'calculation jobs',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='calculationjob',
+            index=models.Index(fields=['status', 'id'], name='calculation_job_status_id'),
+        ),
+    ]
@@ -0,0 +1,92 @@
+# Generated by Django 4.1 on 2026-10-17 00:01
+
+import building.fields
+from django.db import migrations, models
+
+
+def backfill_jalali_periods(apps, schema_editor):
+    """
+    Compute jalali_year and jalali_month of existing rows in batches
+    """
+    related = {'Result': ['submeter_calculator__water_bill']}
+    for model_name in ('Usage', 'WaterBill', 'GasBill', 'Result'):
+        model = apps.get_model('building', model_name)
+        fields = [model._meta.get_field('jalali_year'), model._meta.get_field('jalali_month')]
+        queryset = model.objects.select_related(*related.get(model_name, [])).order_by('pk')
+
+        batch = []
+        for instance in queryset.iterator(chunk_size=2000):
+            for field in fields:
+                field.pre_save(instance, add=False)
+            batch.append(instance)
+            if len(batch) == 2000:
+                model.objects.bulk_update(batch, ['jalali_year', 'jalali_month'])
+                batch = []
+        model.objects.bulk_update(batch, ['jalali_year', 'jalali_month'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('building', '0004_calculation_jobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gasbill',
+            name='jalali_month',
+            field=building.fields.JalaliPartField(part='month', source='issuance_date', verbose_name='jalali month'),
+        ),
+        migrations.AddField(
+            model_name='gasbill',
+            name='jalali_year',
+            field=building.fields.JalaliPartField(part='year', source='issuance_date', verbose_name='jalali year'),
+        ),
+        migrations.AddField(
+            model_name='result',
+            name='jalali_month',
+            field=building.fields.JalaliPartField(part='month', source='submeter_calculator__water_bill__issuance_date', verbose_name='jalali month'),
+        ),
+        migrations.AddField(
+            model_name='result',
+            name='jalali_year',
+            field=building.fields.JalaliPartField(part='year', source='submeter_calculator__water_bill__issuance_date', verbose_name='jalali year'),
+        ),
+        migrations.AddField(
+            model_name='usage',
+            name='jalali_month',
+            field=building.fields.JalaliPartField(part='month', source='register_date', verbose_name='jalali month'),
+        ),
+        migrations.AddField(
+            model_name='usage',
+            name='jalali_year',
+            field=building.fields.JalaliPartField(part='year', source='register_date', verbose_name='jalali year'),
+        ),
+        migrations.AddField(
+            model_name='waterbill',
+            name='jalali_month',
+            field=building.fields.JalaliPartField(part='month', source='issuance_date', verbose_name='jalali month'),
+        ),
+        migrations.AddField(
+            model_name='waterbill',
+            name='jalali_year',
+            field=building.fields.JalaliPartField(part='year', source='issuance_date', verbose_name='jalali year'),
+        ),
+        migrations.RunPython(backfill_jalali_periods, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='gasbill',
+            index=models.Index(fields=['jalali_year', 'jalali_month'], name='gas_bill_jalali_period'),
+        ),
+        migrations.AddIndex(
+            model_name='result',
+            index=models.Index(fields=['jalali_year', 'jalali_month'], name='result_jalali_period'),
+        ),
+        migrations.AddIndex(
+            model_name='usage',
+            index=models.Index(fields=['jalali_year', 'jalali_month'], name='usage_jalali_period'),
+        ),
+        migrations.AddIndex(
+            model_name='waterbill',
+            index=models.Index(fields=['jalali_year', 'jalali_month'], name='water_bill_jalali_period'),
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 4.1 on 2026-10-17 00:05
+
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+
+
+def check_duplicate_units(apps, schema_editor):
+    """
+    Stop before adding unique constraints if a unit is repeated, which row is right can not be guessed
+    """
+    duplicates = []
+    for model_name, parent in (('UnitUsage', 'usage'), ('UnitResult', 'result'), ('Debt', 'submeter_calculator')):
+        model = apps.get_model('building', model_name)
+        rows = model.objects.values_list(parent, 'unit').annotate(count=Count('id')).filter(count__gt=1).order_by()
+        duplicates += ['%s %s=%s unit=%s (%d rows)' % (model_name, parent, parent_id, unit, count)
+                       for parent_id, unit, count in rows[:20]]
+    if duplicates:
+        raise RuntimeError('Remove duplicate unit rows before migrating:\n' + '\n'.join(duplicates))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('building', '0005_jalali_period_fields'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicate_units, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='usage',
+            index=models.Index(fields=['building', 'register_date'], name='usage_building_register_date'),
+        ),
+        migrations.AddIndex(
+            model_name='waterbill',
+            index=models.Index(fields=['building', 'issuance_date'], name='water_bill_building_issuance'),
+        ),
+        migrations.AddConstraint(
+            model_name='debt',
+            constraint=models.UniqueConstraint(fields=('submeter_calculator', 'unit'), name='debt_unique_unit'),
+        ),
+        migrations.AddConstraint(
+            model_name='unitresult',
+            constraint=models.UniqueConstraint(fields=('result', 'unit'), name='unit_result_unique_unit'),
+        ),
+        migrations.AddConstraint(
+            model_name='unitusage',
+            constraint=models.UniqueConstraint(fields=('usage', 'unit'), name='unit_usage_unique_unit'),
+        ),
+        # Unique constraints above start with foreign key column, its own index is not needed anymore
+        migrations.AlterField(
+            model_name='debt',
+            name='submeter_calculator',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='debts', to='building.submetercalculator'),
+        ),
+        migrations.AlterField(
+            model_name='unitresult',
+            name='result',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='unit_results', to='building.result'),
+        ),
+        migrations.AlterField(
+            model_name='unitusage',
+            name='usage',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='unit_usages', to='building.usage'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.1 on 2026-10-17 00:13
+
+import building.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('building', '0006_unit_uniqueness_and_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gasbill',
+            name='version',
+            field=building.fields.RowVersionField(verbose_name='version'),
+        ),
+        migrations.AddField(
+            model_name='result',
+            name='version',
+            field=building.fields.RowVersionField(verbose_name='version'),
+        ),
+        migrations.AddField(
+            model_name='waterbill',
+            name='version',
+            field=building.fields.RowVersionField(verbose_name='version'),
+        ),
+    ]
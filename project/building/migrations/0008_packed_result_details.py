@@ -0,0 +1,97 @@
+# Generated by Django 4.1 on 2026-10-17 00:20
+
+import json
+import struct
+
+from django.db import migrations, models
+
+
+# Format of building.calculation.pack_details when this migration was written, copied so that later
+# changes of the app do not change what this migration does
+DETAILS_JSON = 0
+DETAILS_PACKED = 1
+DETAILS_HEADER = struct.Struct('<BIIdq')
+DETAILS_LISTS = ('usage_list', 'price_list', 'price_with_ratio_list')
+
+
+def _uint32_values(values):
+    values = list(values)
+    if not all(type(value) is int and 0 <= value < 2 ** 32 for value in values):
+        return None
+    return values
+
+
+def pack_details(details):
+    if details is None:
+        return None
+    lists = None
+    if set(details) == {*DETAILS_LISTS, 'price_difference_ratio', 'extra_prices', 'debts'} \
+            and isinstance(details['price_difference_ratio'], (int, float)) and type(details['extra_prices']) is int \
+            and isinstance(details['debts'], dict) and all(str(unit).isdigit() for unit in details['debts']):
+        lists = [_uint32_values(details[key]) for key in DETAILS_LISTS]
+        lists += [_uint32_values(int(unit) for unit in details['debts']), _uint32_values(details['debts'].values())]
+    if lists is None or any(values is None for values in lists) or len({len(values) for values in lists[:3]}) != 1:
+        return bytes([DETAILS_JSON]) + json.dumps(details, separators=(',', ':')).encode()
+
+    values = [value for values in lists for value in values]
+    header = DETAILS_HEADER.pack(DETAILS_PACKED, len(lists[0]), len(lists[3]), details['price_difference_ratio'],
+                                 details['extra_prices'])
+    return header + struct.pack('<%dI' % len(values), *values)
+
+
+def unpack_details(data):
+    if data is None:
+        return None
+    data = bytes(data)
+    if data[0] == DETAILS_JSON:
+        return json.loads(data[1:])
+
+    _format, units, debts, price_difference_ratio, extra_prices = DETAILS_HEADER.unpack_from(data)
+    count = (len(data) - DETAILS_HEADER.size) // 4
+    values = list(struct.unpack_from('<%dI' % count, data, DETAILS_HEADER.size))
+    details = {key: values[i * units:(i + 1) * units] for i, key in enumerate(DETAILS_LISTS)}
+    debt_units = values[3 * units:3 * units + debts]
+    details['price_difference_ratio'] = price_difference_ratio
+    details['extra_prices'] = extra_prices
+    details['debts'] = {str(unit): amount for unit, amount in zip(debt_units, values[3 * units + debts:])}
+    return details
+
+
+def _convert(apps, source, target, convert):
+    Result = apps.get_model('building', 'Result')
+    batch = []
+    for result in Result.objects.exclude(**{source: None}).only('id', source).order_by('pk').iterator(chunk_size=2000):
+        setattr(result, target, convert(getattr(result, source)))
+        batch.append(result)
+        if len(batch) == 2000:
+            Result.objects.bulk_update(batch, [target])
+            batch = []
+    Result.objects.bulk_update(batch, [target])
+
+
+def pack_existing_details(apps, schema_editor):
+    _convert(apps, 'submeter_calculator_details', 'packed_details', pack_details)
+
+
+def unpack_existing_details(apps, schema_editor):
+    _convert(apps, 'packed_details', 'submeter_calculator_details', unpack_details)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('building', '0007_row_versions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='result',
+            name='packed_details',
+            field=models.BinaryField(blank=True, null=True, verbose_name='submeter calculator details'),
+        ),
+        migrations.RunPython(pack_existing_details, unpack_existing_details),
+        migrations.RemoveField(
+            model_name='result',
+            name='submeter_calculator_details',
+        ),
+    ]
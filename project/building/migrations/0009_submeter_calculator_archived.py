@@ -0,0 +1,18 @@
+# Generated by Django 4.1 on 2026-10-17 00:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('building', '0008_packed_result_details'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='submetercalculator',
+            name='archived',
+            field=models.BooleanField(default=False, editable=False, help_text='Results and readings were moved to archive files by archive_periods', verbose_name='archived'),
+        ),
+    ]
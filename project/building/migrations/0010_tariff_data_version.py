@@ -0,0 +1,25 @@
+# Generated by Django 4.1 on 2026-10-17 00:52
+
+import building.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('building', '0009_submeter_calculator_archived'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TariffDataVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', building.fields.RowVersionField(verbose_name='version')),
+            ],
+            options={
+                'verbose_name': 'tariff data version',
+                'verbose_name_plural': 'tariff data versions',
+            },
+        ),
+    ]
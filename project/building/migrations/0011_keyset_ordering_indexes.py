@@ -0,0 +1,25 @@
+# Generated by Django 4.1 on 2026-10-17 01:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('building', '0010_tariff_data_version'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='result',
+            index=models.Index(fields=['created', 'id'], name='result_created_id'),
+        ),
+        migrations.AddIndex(
+            model_name='submetercalculator',
+            index=models.Index(fields=['created', 'id'], name='submeter_calculator_created_id'),
+        ),
+        migrations.AddIndex(
+            model_name='usage',
+            index=models.Index(fields=['register_date', 'id'], name='usage_register_date_id'),
+        ),
+    ]
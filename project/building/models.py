@@ -1,18 +1,45 @@
 from math import ceil
 
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Coalesce
 from django.core.validators import MinValueValidator
 from django.core.exceptions import ValidationError
 from django.utils.translation import gettext_lazy as _
-from django.conf import settings
 
 from django_jalali.db import models as jmodels
 from ckeditor_uploader.fields import RichTextUploadingField
 
-from .functions import get_price_over_14_m3, round_price
+from .fields import JalaliPartField, RowVersionField, jalali_period_filter, jalali_period_range_filter
+from .functions import round_price
+from .calculation import (CalculationInputs, PriceCalculation, calculate_prices, fingerprint_inputs, pack_details,
+                          pair_unit_readings, unpack_details)
+from .tariffs import get_tariff, get_city_coefficient, refresh as refresh_tariffs
+from . import instrumentation
 from project.functions import datetime_farsi_month_name, date_farsi_month_name
 
 
+class JalaliPeriodQuerySet(jmodels.jQuerySet):
+    """
+    Filters on stored jalali_year and jalali_month fields
+    """
+
+    def in_jalali_period(self, year: int, month: int | None = None) -> 'JalaliPeriodQuerySet':
+        return self.filter(jalali_period_filter(year, month))
+
+    def in_jalali_periods(self, start: tuple, end: tuple) -> 'JalaliPeriodQuerySet':
+        """
+        start and end are (year, month), both inclusive
+        """
+        return self.filter(jalali_period_range_filter(start, end))
+
+    def jalali_periods(self) -> list:
+        """
+        Distinct (year, month) of rows, latest first
+        """
+        return list(self.filter(jalali_year__isnull=False).order_by('-jalali_year', '-jalali_month')
+                    .values_list('jalali_year', 'jalali_month').distinct())
+
+
 class Created(models.Model):
     objects = jmodels.jManager()
 
@@ -27,9 +54,95 @@ class Created(models.Model):
     created_jalali_humanize.fget.short_description = _('created')
 
 
+class City(Created):
+    name = models.CharField(max_length=63, unique=True, verbose_name=_('city name'))
+
+    class Meta:
+        verbose_name = _('city')
+        verbose_name_plural = _('cities')
+
+    def __str__(self) -> str:
+        return self.name
+
+
+class CityCoefficient(models.Model):
+    city = models.ForeignKey(to=City, on_delete=models.CASCADE, related_name='coefficients', verbose_name=_('city'))
+    coefficient = models.DecimalField(max_digits=6, decimal_places=3, verbose_name=_('price coefficient'))
+    valid_from = jmodels.jDateField(verbose_name=_('valid from'))
+    valid_until = jmodels.jDateField(blank=True, null=True, verbose_name=_('valid until'), help_text=_('Leave empty if still valid'))
+
+    class Meta:
+        verbose_name = _('city coefficient')
+        verbose_name_plural = _('city coefficients')
+        ordering = ('city', '-valid_from')
+        constraints = [
+            models.CheckConstraint(
+                check=models.Q(coefficient__gt=0),
+                name='city_coefficient_gt_0',
+                violation_error_message=_('Field coefficient must be greater than 0')
+            )
+        ]
+
+    def __str__(self) -> str:
+        return '%s | %s' % (self.city, self.coefficient)
+
+
+class TariffSchedule(Created):
+    title = models.CharField(max_length=127, verbose_name=_('title'))
+    valid_from = jmodels.jDateField(verbose_name=_('valid from'))
+    valid_until = jmodels.jDateField(blank=True, null=True, verbose_name=_('valid until'), help_text=_('Leave empty if still valid'))
+
+    class Meta:
+        verbose_name = _('tariff schedule')
+        verbose_name_plural = _('tariff schedules')
+        ordering = ('-valid_from',)
+
+    def __str__(self) -> str:
+        return self.title
+
+
+class TariffBracket(models.Model):
+    schedule = models.ForeignKey(to=TariffSchedule, on_delete=models.CASCADE, related_name='brackets',
+                                 verbose_name=_('tariff schedule'))
+    upper_bound = models.PositiveIntegerField(blank=True, null=True, verbose_name=_('upper bound'),
+                                              help_text=_('unit is m3, leave empty for the last bracket'))
+    slope = models.PositiveIntegerField(verbose_name=_('price per m3'), help_text=_('unit is Rial'))
+    intercept = models.IntegerField(default=0, verbose_name=_('deduction'), help_text=_('subtracted from price, unit is Rial'))
+
+    class Meta:
+        verbose_name = _('tariff bracket')
+        verbose_name_plural = _('tariff brackets')
+        ordering = ('upper_bound',)
+        constraints = [
+            models.UniqueConstraint(fields=('schedule', 'upper_bound'), name='tariff_bracket_unique_upper_bound'),
+        ]
+
+    def __str__(self) -> str:
+        return str(self.upper_bound or '∞')
+
+
+class TariffDataVersion(models.Model):
+    """
+    Single row whose version is replaced when tariff schedules, brackets or city coefficients change,
+    processes compare it with version of their compiled tariffs
+    """
+    version = RowVersionField(verbose_name=_('version'))
+
+    class Meta:
+        verbose_name = _('tariff data version')
+        verbose_name_plural = _('tariff data versions')
+
+    @classmethod
+    def bump(cls) -> None:
+        # Updates the row, or inserts it on first change
+        cls(id=1).save()
+
+
 class Building(Created):
     name = models.CharField(max_length=63, verbose_name=_('building name'))
     units = models.SmallIntegerField(validators=[MinValueValidator(2)], verbose_name=_('number of units'))
+    city = models.ForeignKey(to=City, on_delete=models.SET_NULL, blank=True, null=True, related_name='buildings',
+                             verbose_name=_('city'), help_text=_('CITY_COEFFICIENT setting is used if empty'))
 
     class Meta:
         verbose_name = _('building')
@@ -40,15 +153,23 @@ class Building(Created):
 
 
 class Usage(Created):
-    objects = jmodels.jManager()
+    objects = JalaliPeriodQuerySet.as_manager()
 
     building = models.ForeignKey(to=Building, on_delete=models.CASCADE, related_name='usages')
     last_update = jmodels.jDateTimeField(auto_now=True, verbose_name=_('last update'))
     register_date = jmodels.jDateField(verbose_name=_('date of registration'))
+    jalali_year = JalaliPartField(source='register_date', part='year', verbose_name=_('jalali year'))
+    jalali_month = JalaliPartField(source='register_date', part='month', verbose_name=_('jalali month'))
 
     class Meta:
         verbose_name = _('usage')
         verbose_name_plural = _('usages')
+        indexes = [
+            models.Index(fields=['jalali_year', 'jalali_month'], name='usage_jalali_period'),
+            models.Index(fields=['building', 'register_date'], name='usage_building_register_date'),
+            # Ordering of keyset pages of admin changelist
+            models.Index(fields=['register_date', 'id'], name='usage_register_date_id'),
+        ]
 
     def __str__(self) -> str:
         return str(self.register_date)
@@ -65,7 +186,8 @@ class Usage(Created):
 
 
 class UnitUsage(models.Model):
-    usage = models.ForeignKey(to=Usage, on_delete=models.CASCADE, related_name='unit_usages')
+    # Indexed by unit_usage_unique_unit which starts with usage
+    usage = models.ForeignKey(to=Usage, on_delete=models.CASCADE, related_name='unit_usages', db_index=False)
     unit = models.PositiveSmallIntegerField(default=0, blank=False, null=False, verbose_name=_('unit number'))
     amount = models.PositiveIntegerField(verbose_name=_('amount in liter'))
     class Meta:
@@ -73,6 +195,7 @@ class UnitUsage(models.Model):
         verbose_name_plural = _('usage of units')
         ordering = ('unit',)
         constraints = [
+            models.UniqueConstraint(fields=('usage', 'unit'), name='unit_usage_unique_unit'),
             models.CheckConstraint(
                 check=models.Q(amount__gt=0),
                 name='unit_usage_amout_gt_0',
@@ -85,12 +208,15 @@ class UnitUsage(models.Model):
 
 
 class BillBase(Created):
-    objects = jmodels.jManager()
+    objects = JalaliPeriodQuerySet.as_manager()
     issuance_date = jmodels.jDateField(verbose_name=_('issuance date'))
+    jalali_year = JalaliPartField(source='issuance_date', part='year', verbose_name=_('jalali year'))
+    jalali_month = JalaliPartField(source='issuance_date', part='month', verbose_name=_('jalali month'))
     current_reading = jmodels.jDateField(verbose_name=_('current reading'))
     payment_deadline = jmodels.jDateField(verbose_name=_('payment dead-line'))
     
     total_payment = models.PositiveIntegerField(verbose_name=_('total payment'), help_text=_('unit is Toman'))
+    version = RowVersionField(verbose_name=_('version'))
 
     class Meta:
         abstract = True
@@ -120,6 +246,10 @@ class WaterBill(BillBase):
     class Meta:
         verbose_name = _('water bill')
         verbose_name_plural = _('water bills')
+        indexes = [
+            models.Index(fields=['jalali_year', 'jalali_month'], name='water_bill_jalali_period'),
+            models.Index(fields=['building', 'issuance_date'], name='water_bill_building_issuance'),
+        ]
         constraints = [
             models.CheckConstraint(
                 check=models.Q(water_consumption_price__gt=0),
@@ -158,6 +288,9 @@ class GasBill(BillBase):
     class Meta:
         verbose_name = _('gas bill')
         verbose_name_plural = _('gas bills')
+        indexes = [
+            models.Index(fields=['jalali_year', 'jalali_month'], name='gas_bill_jalali_period'),
+        ]
         constraints = [
             models.CheckConstraint(
                 check=models.Q(total_payment__gt=0),
@@ -188,6 +321,8 @@ class SubmeterCalculator(Created):
                                       verbose_name=_('current usage'))
     
     notes = models.TextField(blank=True, null=True, verbose_name=_('notes'))
+    archived = models.BooleanField(default=False, editable=False, verbose_name=_('archived'),
+                                   help_text=_('Results and readings were moved to archive files by archive_periods'))
 
     # todo property totals
     # todo price_difference_ratio ?
@@ -195,104 +330,183 @@ class SubmeterCalculator(Created):
     class Meta:
         verbose_name = _('submeter calculator')
         verbose_name_plural = _('submeter calculators')
+        indexes = [
+            # Ordering of keyset pages of admin changelist
+            models.Index(fields=['created', 'id'], name='submeter_calculator_created_id'),
+        ]
 
     def __str__(self) -> str:
         return 'calculate %s bill' % self.water_bill.issuance_date
 
     @property
     def sum_of_tax_and_extra_prices(self):
-        price = self.water_bill.share_of_tax_for_each_unit + self.extra_charges.aggregate(my_sum=models.Sum('amount'))['my_sum']
+        price = self.water_bill.share_of_tax_for_each_unit + (self.extra_charges.aggregate(my_sum=models.Sum('amount'))['my_sum'] or 0)
         if self.gas_bill:
             price += self.gas_bill.share_of_price_for_each_unit
         return price
 
-    def calculate_submeter_prices(self) -> dict:
-        # Get unit usages objects
-        previous_usages = self.previous_usage.unit_usages.all()
-        current_usages = self.current_usage.unit_usages.all()
-
-        water_consumption_price = self.water_bill.water_consumption_price
-    
-        # duration between current and previous usage 
-        usage_duration_days = (self.current_usage.register_date - self.previous_usage.register_date).days
-
-        # extra_prices
-        extra_prices = self.sum_of_tax_and_extra_prices
-        
-        # debts, create a {unit: amount} dictionary
-        debts = dict(self.debts.values_list('unit', 'amount'))
-
-        usage_list = []
-        price_list = []
-        price_with_ratio_list = []
-
-        # Create a result object
-        # result_object = self.results.create()
-        result_object = Result(submeter_calculator=self)
-        
-        # Respectively [unit, usage, rounded price] collection
-        unit_usage_price_collection = []
-        # Store UnitResult objects in a list for bulk_creation
-        unit_result_objects = []
-
-        for i in range(len(current_usages)):
-
-            usage = current_usages[i].amount - previous_usages[i].amount
-            usage_list.append(usage)
-            # Our price table is for 30 days duration
-            usage_30_days = (usage * 30) / usage_duration_days
-            
-            # Price from usage-price table * affect duration on price * price coefficient of the city
-            # divide by 10 to get price as toman then ceiling to an integral at last reound it
-            price = round_price(ceil(
-                (get_price_over_14_m3(usage_30_days) * (usage_duration_days / 30) * settings.CITY_COEFFICIENT) / 10
-                ))
-            price_list.append(price)
-            
-            # unit_results.append(UnitResult(unit=i+1, usage_amount=usage, price=price, total_payment=price+extra_prices))
-            unit_usage_price_collection.append([i+1, usage, price])
-
-            print(f'unit: {i+1} usage: {usage} price {price:,}')
-
-        sum_price_list = sum(price_list)
-
-        print(f'\n\nPrice list: {price_list}\n\tsum: {sum_price_list:,} toman\n\twater_consumption_price: {water_consumption_price:,}')
-
-        # Get difference ratio between actual water_consumption_price and our calculation
-        price_difference_ratio = water_consumption_price / sum_price_list
-        print(f'\n\n price difference: {price_difference_ratio} so multiply each price with it')
-
-        # Multiply each price with price_difference_ratio to reach water_consumption_price
-        for i in unit_usage_price_collection:
-            price_with_ratio = round_price(ceil(i[2] * price_difference_ratio))
-            price_with_ratio_list.append(price_with_ratio)
-
-            # Get unit debt or zero
-            unit_debt = debts.get(i[0]) or 0
-
-            unit_result_objects.append(
-                UnitResult(result=result_object, unit=i[0], usage_amount=i[1], price=price_with_ratio,
-                           debt=unit_debt, total_payment=price_with_ratio+extra_prices+unit_debt)
+    @classmethod
+    def load_calculation_inputs_in_bulk(cls, ids, errors: dict | None = None) -> dict:
+        """
+        Load inputs of many calculators with a fixed number of queries
+        :param errors: if passed, ValidationError of each invalid calculator is stored in it by id instead of raising
+        :return {submeter_calculator.id: CalculationInputs}
+        """
+        # Another process may have changed tariffs
+        refresh_tariffs()
+        extra_charges_sum = ExtraCharge.objects.filter(submeter_calculator=models.OuterRef('pk')) \
+            .values('submeter_calculator').annotate(my_sum=models.Sum('amount')).values('my_sum')
+
+        calculators = list(
+            cls.objects.filter(pk__in=ids)
+            .select_related('water_bill__building', 'gas_bill__building', 'previous_usage', 'current_usage')
+            .annotate(extra_charges_sum=Coalesce(models.Subquery(extra_charges_sum), 0))
+        )
+
+        # {usage.id: {unit: amount}}
+        readings = {}
+        usage_ids = {sc.previous_usage_id for sc in calculators} | {sc.current_usage_id for sc in calculators}
+        for usage_id, unit, amount in UnitUsage.objects.filter(usage_id__in=usage_ids).values_list('usage_id', 'unit', 'amount'):
+            readings.setdefault(usage_id, {})[unit] = amount
+
+        # {submeter_calculator.id: {unit: amount}}
+        debts = {}
+        for sc_id, unit, amount in Debt.objects.filter(submeter_calculator_id__in=ids).values_list('submeter_calculator_id', 'unit', 'amount'):
+            debts.setdefault(sc_id, {})[unit] = amount
+
+        inputs = {}
+        for sc in calculators:
+            try:
+                units, usages = pair_unit_readings(readings.get(sc.previous_usage_id, {}),
+                                                   readings.get(sc.current_usage_id, {}),
+                                                   sc.water_bill.building.units)
+            except ValidationError as e:
+                if errors is None:
+                    raise
+                errors[sc.id] = e
+                continue
+
+            tariff_date = sc.current_usage.register_date
+
+            extra_prices = sc.water_bill.share_of_tax_for_each_unit + sc.extra_charges_sum
+            if sc.gas_bill:
+                extra_prices += sc.gas_bill.share_of_price_for_each_unit
+
+            inputs[sc.id] = CalculationInputs(
+                units=units,
+                usages=usages,
+                usage_duration_days=(sc.current_usage.register_date - sc.previous_usage.register_date).days,
+                water_consumption_price=sc.water_bill.water_consumption_price,
+                extra_prices=extra_prices,
+                debts=debts.get(sc.id, {}),
+                tariff=get_tariff(tariff_date),
+                city_coefficient=get_city_coefficient(sc.water_bill.building.city_id, tariff_date),
             )
+        return inputs
 
-        print(f'\n\nNew price list: {price_with_ratio_list}\n\tsum: {sum(price_with_ratio_list):,} toman\n\twater_consumption_price: {water_consumption_price:,}')
+    def validate_not_archived(self) -> None:
+        """
+        Archived calculators are not calculated again, a new Result would repeat the period kept in archive files
+        """
+        if self.archived:
+            raise ValidationError(_('calculator is archived, its results are kept in archive files'))
+
+    def load_calculation_inputs(self) -> CalculationInputs:
+        self.validate_not_archived()
+        return self.load_calculation_inputs_in_bulk([self.id])[self.id]
 
-        details = {
-            'usage_list': usage_list,
-            'price_list': price_list,
-            'price_difference_ratio': price_difference_ratio,
-            'price_with_ratio_list': price_with_ratio_list,
-            'extra_prices': extra_prices,
-            'debts': debts ,
-            # 'result_object': result_object,
-        }
+    def preview_submeter_prices(self) -> PriceCalculation:
+        """
+        Calculate prices without saving anything
+        """
+        with instrumentation.run('preview_submeter_prices') as current_run:
+            with current_run.span('load'):
+                inputs = self.load_calculation_inputs()
+            current_run.set_units(len(inputs.units))
 
-        result_object.submeter_calculator_details = details
-        result_object.save()
-        UnitResult.objects.bulk_create(unit_result_objects)
+            with current_run.span('compute'):
+                return calculate_prices(inputs)
 
-        details['result_object'] = result_object
-        return details
+    def calculate_submeter_prices(self, force: bool = False) -> dict:
+        """
+        Calculate and save a Result, an existing Result calculated from same inputs is returned instead
+        unless force is True
+        """
+        with instrumentation.run('calculate_submeter_prices') as current_run:
+            with current_run.span('load'):
+                inputs = self.load_calculation_inputs()
+                input_fingerprint = fingerprint_inputs(inputs)
+            current_run.set_units(len(inputs.units))
+
+            with transaction.atomic():
+                with current_run.span('reconcile'):
+                    # Lock calculator so concurrent calls with same inputs do not both create a Result
+                    SubmeterCalculator.objects.select_for_update().filter(id=self.id).exists()
+
+                    if not force:
+                        result_object = self.results.filter(input_fingerprint=input_fingerprint).order_by('-id').first()
+                        if result_object:
+                            details = dict(result_object.submeter_calculator_details)
+                            details['result_object'] = result_object
+                            return details
+
+                with current_run.span('compute'):
+                    calculation = calculate_prices(inputs)
+                    details = calculation.details()
+
+                with current_run.span('persist'):
+                    result_object = Result.objects.create(submeter_calculator=self, submeter_calculator_details=details,
+                                                          input_fingerprint=input_fingerprint)
+                    UnitResult.objects.bulk_create(result_object.build_unit_results(calculation))
+
+        # Copy so the dict stored on result_object stays JSON serializable
+        return {**details, 'result_object': result_object}
+
+    def recalculate_result(self, result_object: 'Result') -> dict:
+        """
+        Recalculate an existing Result in place, only UnitResult rows whose values changed are written
+        """
+        with instrumentation.run('recalculate_result') as current_run:
+            with current_run.span('load'):
+                inputs = self.load_calculation_inputs()
+            current_run.set_units(len(inputs.units))
+
+            with current_run.span('compute'):
+                calculation = calculate_prices(inputs)
+                details = calculation.details()
+
+            with transaction.atomic():
+                with current_run.span('reconcile'):
+                    # {unit: UnitResult}
+                    stored = {unit_result.unit: unit_result for unit_result in result_object.unit_results.select_for_update()}
+                    changed = []
+                    created = []
+                    for unit_price in calculation.units:
+                        values = {'usage_amount': unit_price.usage_amount, 'price': unit_price.price,
+                                  'debt': unit_price.debt, 'total_payment': unit_price.total_payment}
+                        unit_result = stored.pop(unit_price.unit, None)
+
+                        if unit_result is None:
+                            created.append(UnitResult(result=result_object, unit=unit_price.unit, **values))
+                        elif any(getattr(unit_result, field) != value for field, value in values.items()):
+                            for field, value in values.items():
+                                setattr(unit_result, field, value)
+                            changed.append(unit_result)
+
+                with current_run.span('persist'):
+                    UnitResult.objects.bulk_update(changed, ['usage_amount', 'price', 'debt', 'total_payment'])
+                    UnitResult.objects.bulk_create(created)
+                    # Units which are not in readings anymore
+                    if stored:
+                        UnitResult.objects.filter(id__in=[unit_result.id for unit_result in stored.values()]).delete()
+
+                    result_object.submeter_calculator_details = details
+                    result_object.input_fingerprint = fingerprint_inputs(inputs)
+                    # Version is only replaced when listed, unit result rows above were written in bulk
+                    result_object.save(update_fields=['packed_details', 'input_fingerprint', 'version'])
+
+        return {**details, 'result_object': result_object,
+                'changed_units': [unit_result.unit for unit_result in changed + created] + list(stored)}
 
     def clean(self) -> None:
         building_units = self.water_bill.building.units
@@ -339,8 +553,9 @@ class ExtraCharge(models.Model):
 
 
 class Debt(models.Model):
+    # Indexed by debt_unique_unit which starts with submeter_calculator
     submeter_calculator = models.ForeignKey(to=SubmeterCalculator, on_delete=models.CASCADE,
-                                            related_name='debts')
+                                            related_name='debts', db_index=False)
     unit = models.PositiveSmallIntegerField(verbose_name=_('unit'))
     amount = models.PositiveIntegerField(verbose_name=_('amount'), help_text=_('unit is Toman'))
 
@@ -349,6 +564,7 @@ class Debt(models.Model):
         verbose_name_plural = _('debts')
         ordering = ('unit',)
         constraints = [
+            models.UniqueConstraint(fields=('submeter_calculator', 'unit'), name='debt_unique_unit'),
             models.CheckConstraint(
                 check=models.Q(amount__gt=0),
                 name='debt_amount_gt_0',
@@ -361,21 +577,65 @@ class Debt(models.Model):
 
 class Result(Created):
 
-    objects = jmodels.jManager()
+    objects = JalaliPeriodQuerySet.as_manager()
     submeter_calculator = models.ForeignKey(to=SubmeterCalculator, on_delete=models.CASCADE,
                                             related_name='results')
     my_notes = models.TextField(blank=True, null=True, verbose_name=_('my notes'), help_text=_('Notes just for me'))
     client_notes = RichTextUploadingField(blank=True, null=True, verbose_name=_('client notes'), help_text=_('Notes for client; appears on final result page'))
     due_date = jmodels.jDateField(blank=True, null=True, verbose_name=_('due date'))
-    submeter_calculator_details = models.JSONField(blank=True, null=True, verbose_name=_('submeter calculator details'))
+    # Packed by pack_details, read and written through submeter_calculator_details
+    packed_details = models.BinaryField(blank=True, null=True, verbose_name=_('submeter calculator details'))
+    input_fingerprint = models.CharField(max_length=64, blank=True, null=True, db_index=True, editable=False,
+                                         verbose_name=_('input fingerprint'))
+    # Period of water bill, kept in sync by signals when bill date or calculator bill changes
+    jalali_year = JalaliPartField(source='submeter_calculator__water_bill__issuance_date', part='year',
+                                  verbose_name=_('jalali year'))
+    jalali_month = JalaliPartField(source='submeter_calculator__water_bill__issuance_date', part='month',
+                                   verbose_name=_('jalali month'))
+    # Also replaced by signals when a unit result or another row shown with result changes
+    version = RowVersionField(verbose_name=_('version'))
 
     class Meta:
         verbose_name = _('result')
         verbose_name_plural = _('results')
+        indexes = [
+            models.Index(fields=['jalali_year', 'jalali_month'], name='result_jalali_period'),
+            # Ordering of keyset pages of admin changelist
+            models.Index(fields=['created', 'id'], name='result_created_id'),
+        ]
+
+    # (packed_details, details) of last decoding
+    _unpacked = None
 
     def __str__(self) -> str:
         return 'result of bill %s' % str(self.submeter_calculator.water_bill)
 
+    @property
+    def submeter_calculator_details(self) -> dict | None:
+        """
+        Details of calculation, decoded on first use; assign a new dict to change them
+        """
+        if self._unpacked is None or self._unpacked[0] is not self.packed_details:
+            self._unpacked = (self.packed_details, unpack_details(self.packed_details))
+        return self._unpacked[1]
+
+    @submeter_calculator_details.setter
+    def submeter_calculator_details(self, details: dict | None) -> None:
+        self.packed_details = pack_details(details)
+
+    def recalculate(self) -> dict:
+        return self.submeter_calculator.recalculate_result(self)
+
+    def build_unit_results(self, calculation: PriceCalculation) -> list:
+        """
+        Unsaved UnitResult objects of a calculation
+        """
+        return [
+            UnitResult(result=self, unit=unit_price.unit, usage_amount=unit_price.usage_amount,
+                       price=unit_price.price, debt=unit_price.debt, total_payment=unit_price.total_payment)
+            for unit_price in calculation.units
+        ]
+
     @property
     def due_date_jalali_humanize(self) -> str:
         if self.due_date:
@@ -385,7 +645,8 @@ class Result(Created):
 
 class UnitResult(models.Model):
 
-    result = models.ForeignKey(to=Result, on_delete=models.CASCADE, related_name='unit_results')
+    # Indexed by unit_result_unique_unit which starts with result
+    result = models.ForeignKey(to=Result, on_delete=models.CASCADE, related_name='unit_results', db_index=False)
     unit = models.PositiveSmallIntegerField(default=0, blank=False, null=False, verbose_name=_('unit'))
     usage_amount = models.PositiveIntegerField(verbose_name=_('usage amount'), help_text=_('unit is liter'))
     price = models.PositiveIntegerField(verbose_name=_('price'), help_text=_('unit is Toman'))
@@ -396,6 +657,49 @@ class UnitResult(models.Model):
         verbose_name = _('unit result')
         verbose_name_plural = _('units results')
         ordering = ('unit',)
+        constraints = [
+            models.UniqueConstraint(fields=('result', 'unit'), name='unit_result_unique_unit'),
+        ]
 
     def __str__(self) -> str:
         return str(self.unit)
+
+
+class CalculationJob(Created):
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, _('pending')),
+        (RUNNING, _('running')),
+        (DONE, _('done')),
+        (FAILED, _('failed')),
+    )
+
+    submeter_calculator = models.ForeignKey(to=SubmeterCalculator, on_delete=models.CASCADE,
+                                            related_name='calculation_jobs', verbose_name=_('submeter calculator'))
+    force = models.BooleanField(default=False, verbose_name=_('force'),
+                                help_text=_('Calculate even if a result with same inputs exists'))
+    status = models.CharField(max_length=15, choices=STATUS_CHOICES, default=PENDING, verbose_name=_('status'))
+    result = models.ForeignKey(to=Result, on_delete=models.SET_NULL, blank=True, null=True, related_name='+',
+                               verbose_name=_('result'))
+    started = jmodels.jDateTimeField(blank=True, null=True, verbose_name=_('start datetime'))
+    finished = jmodels.jDateTimeField(blank=True, null=True, verbose_name=_('finish datetime'))
+    duration = models.FloatField(blank=True, null=True, verbose_name=_('duration'), help_text=_('unit is second'))
+    error = models.TextField(blank=True, null=True, verbose_name=_('error'))
+
+    class Meta:
+        verbose_name = _('calculation job')
+        verbose_name_plural = _('calculation jobs')
+        indexes = [
+            models.Index(fields=('status', 'id'), name='calculation_job_status_id'),
+        ]
+
+    def __str__(self) -> str:
+        return 'job %s | %s' % (self.id, self.status)
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in (self.DONE, self.FAILED)
@@ -0,0 +1,236 @@
+"""
+Paginators for large admin changelists
+
+EstimatedCountPaginator never counts more than count_cap rows, unfiltered
+tables on PostgreSQL are counted from planner statistics instead.
+KeysetPaginator pages by the values of the ordering columns of the last row
+shown, so a deep page costs the same as the first one.
+
+    @admin.register(Result)
+    class ResultAdmin(KeysetPaginationMixin, admin.ModelAdmin):
+        ...
+"""
+from django.contrib.admin.views.main import ChangeList, PAGE_VAR
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import Paginator, Page
+from django.db import connections
+from django.db.models import Q, QuerySet
+from django.utils.functional import cached_property
+
+
+CURSOR_VAR = 'c'
+# Cursor is direction followed by primary key of the row it starts after, like n125 or p101
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+def estimate_table_rows(queryset: QuerySet) -> int | None:
+    """
+    Row count of queryset table from PostgreSQL statistics, None when unknown
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [queryset.model._meta.db_table])
+        row = cursor.fetchone()
+    # reltuples is -1 for a table never analyzed
+    if row is None or row[0] < 0:
+        return None
+    return row[0]
+
+
+class EstimatedCountPaginator(Paginator):
+    # Counting stops after this many rows
+    count_cap = 10000
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.count_is_estimate = False
+
+    @cached_property
+    def count(self) -> int:
+        queryset = self.object_list
+        if not isinstance(queryset, QuerySet):
+            return super().count
+
+        if not queryset.query.where and not queryset.query.distinct:
+            estimate = estimate_table_rows(queryset)
+            if estimate is not None and estimate > self.count_cap:
+                self.count_is_estimate = True
+                return estimate
+
+        count = queryset.order_by()[:self.count_cap + 1].count()
+        if count > self.count_cap:
+            self.count_is_estimate = True
+            return self.count_cap
+        return count
+
+
+class KeysetPage(Page):
+    """
+    Page reached by cursor, number is unknown so it is None
+    """
+
+    def __init__(self, object_list: list, paginator: 'KeysetPaginator', has_next: bool, has_previous: bool) -> None:
+        super().__init__(object_list, None, paginator)
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self) -> str:
+        return '<Keyset page of %d objects>' % len(self.object_list)
+
+    def has_next(self) -> bool:
+        return self._has_next
+
+    def has_previous(self) -> bool:
+        return self._has_previous
+
+    @property
+    def next_cursor(self) -> str | None:
+        if not self._has_next or not self.object_list:
+            return None
+        return NEXT + str(self.object_list[-1].pk)
+
+    @property
+    def previous_cursor(self) -> str | None:
+        if not self._has_previous or not self.object_list:
+            return None
+        return PREVIOUS + str(self.object_list[0].pk)
+
+
+class KeysetPaginator(EstimatedCountPaginator):
+    """
+    Pages by cursor when ordering columns are not null local fields, by number otherwise
+    """
+
+    def __init__(self, object_list, per_page, orphans=0, allow_empty_first_page=True, cursor: str | None = None) -> None:
+        super().__init__(object_list, per_page, orphans, allow_empty_first_page)
+        self.cursor = cursor
+        # Last KeysetPage made by page(), None when paged by number
+        self.keyset_page = None
+
+    @cached_property
+    def keys(self) -> list | None:
+        """
+        [(attname, descending)] of ordering ending with a unique field, None if keyset is not possible
+        """
+        if not isinstance(self.object_list, QuerySet):
+            return None
+        opts = self.object_list.model._meta
+        keys = []
+        for item in self.object_list.query.order_by or opts.ordering:
+            if not isinstance(item, str) or item == '?':
+                return None
+            name = item.lstrip('-')
+            try:
+                field = opts.pk if name == 'pk' else opts.get_field(name)
+            except FieldDoesNotExist:
+                return None
+            if not field.concrete or field.is_relation or field.null:
+                return None
+            keys.append((field.attname, item.startswith('-')))
+            if field.unique:
+                return keys
+        # Same order as ChangeList which adds -pk to make ordering deterministic
+        keys.append((opts.pk.attname, True))
+        return keys
+
+    def page(self, number) -> Page:
+        self.keyset_page = None
+        if self.keys is None or (self.cursor is None and str(number) != '1'):
+            return super().page(number)
+
+        self.keyset_page = self._keyset_page()
+        return self.keyset_page
+
+    def _cursor_values(self) -> tuple:
+        """
+        (direction, ordering values of cursor row), (None, None) for first page
+        """
+        if not self.cursor or self.cursor[0] not in (NEXT, PREVIOUS):
+            return None, None
+        model = self.object_list.model
+        try:
+            pk = model._meta.pk.to_python(self.cursor[1:])
+        except ValidationError:
+            return None, None
+        values = model._default_manager.filter(pk=pk).values_list(*(attname for attname, _ in self.keys)).first()
+        # Row of cursor was deleted, start over
+        if values is None:
+            return None, None
+        return self.cursor[0], values
+
+    def keyset_queryset(self, values: tuple | None = None, backward: bool = False) -> QuerySet:
+        """
+        Rows of a page after ordering values of cursor row, before them when backward, with one more row to tell
+        if another page follows
+        """
+        queryset = self.object_list.order_by(*(
+            ('-' if descending != backward else '') + attname for attname, descending in self.keys
+        ))
+        if values is not None:
+            queryset = queryset.filter(self._after(values, backward))
+        return queryset[:self.per_page + 1]
+
+    def _keyset_page(self) -> KeysetPage:
+        direction, values = self._cursor_values()
+        backward = direction == PREVIOUS
+        rows = list(self.keyset_queryset(values, backward))
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backward:
+            rows.reverse()
+            return KeysetPage(rows, self, has_next=True, has_previous=has_more)
+        return KeysetPage(rows, self, has_next=has_more, has_previous=values is not None)
+
+    def _after(self, values: tuple, backward: bool) -> Q:
+        """
+        Rows after values in ordering, before them when backward
+        """
+        condition = Q()
+        for i, (attname, descending) in enumerate(self.keys):
+            lookup = 'lt' if descending != backward else 'gt'
+            equal = {self.keys[j][0]: values[j] for j in range(i)}
+            condition |= Q(**equal, **{'%s__%s' % (attname, lookup): values[i]})
+
+        # Redundant range on first column lets the database use its index on ordering columns
+        attname, descending = self.keys[0]
+        lookup = 'lte' if descending != backward else 'gte'
+        return Q(**{'%s__%s' % (attname, lookup): values[0]}) & condition
+
+
+class KeysetChangeList(ChangeList):
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    def get_query_string(self, new_params=None, remove=None):
+        # Filter and sort links start over from first page
+        if not new_params or CURSOR_VAR not in new_params:
+            remove = [*(remove or []), CURSOR_VAR]
+        return super().get_query_string(new_params, remove)
+
+    def get_results(self, request):
+        super().get_results(request)
+        self.keyset_page = self.paginator.keyset_page if self.multi_page and not self.show_all else None
+        if self.keyset_page is not None:
+            self.first_page_url = self.get_query_string(remove=[PAGE_VAR])
+            self.next_page_url = self.keyset_page.next_cursor and self.get_query_string({CURSOR_VAR: self.keyset_page.next_cursor}, [PAGE_VAR])
+            self.previous_page_url = self.keyset_page.previous_cursor and self.get_query_string({CURSOR_VAR: self.keyset_page.previous_cursor}, [PAGE_VAR])
+
+
+class KeysetPaginationMixin:
+    """
+    ModelAdmin mixin for keyset pagination and estimated counts
+    """
+    paginator = KeysetPaginator
+    show_full_result_count = False
+
+    def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
+        return self.paginator(queryset, per_page, orphans, allow_empty_first_page, cursor=request.GET.get(CURSOR_VAR))
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
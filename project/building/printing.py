@@ -0,0 +1,204 @@
+"""
+Rendering of printable results
+
+Rendered HTML is cached under the row version of each result, signals replace
+the version when the result or a row shown on the page changes so stale HTML is
+never read again, by any process sharing the database. Keys also hold a hash of
+the templates, HTML rendered by an older deploy is not read either.
+
+try_write_printable_files renders result pages and per-unit slips to files
+for the render_results command.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.cache import cache
+from django.template.loader import get_template, render_to_string
+from django.templatetags.static import static
+
+from .archive import archived_result
+from .calculation import unpack_extra_prices
+from .models import Result
+
+
+BOOTSTRAP_VERSION = '5.2.2'
+# {static path: subresource integrity} of vendored upstream files, vendor_bootstrap checks downloads against them
+INTEGRITY = {
+    'bootstrap/css/bootstrap.min.css': 'sha384-Zenh87qX5JnK2Jl0vWa8Ck2rdkQ2Bzep5IDxbcnCeuOxjzrPF/et3URy9Bv1WTRi',
+    'bootstrap/js/bootstrap.bundle.min.js': 'sha384-OERcA2EqjJCMA+/3y+gxIOqMEjwtxJY7qPCqsdltbNJuaOe923+mo//f6V8Qbsw3',
+}
+STYLESHEETS = ('bootstrap/css/bootstrap.min.css', 'css/result.css')
+SCRIPTS = ('bootstrap/js/bootstrap.bundle.min.js',)
+PRINTABLE_TEMPLATES = ('building/printable_result.html', 'building/unit_slip.html')
+# Static files rendered files need when opened from disk, result.css loads the font
+OFFLINE_ASSETS = STYLESHEETS + SCRIPTS + ('fonts/BYekan.ttf',)
+
+
+def printable_results():
+    """
+    Results with every row printable_result.html shows
+    """
+    return Result.objects.select_related(
+        'submeter_calculator__water_bill__building',
+        'submeter_calculator__gas_bill__building',
+    ).prefetch_related(
+        'unit_results',
+        'submeter_calculator__extra_charges',
+        'submeter_calculator__debts',
+    )
+
+
+def printable_result(result_id: int) -> tuple:
+    """
+    Result from printable_results or from archive and list of its unit results, raises Result.DoesNotExist
+    """
+    try:
+        result = printable_results().get(id=result_id)
+    except Result.DoesNotExist:
+        return archived_result(result_id)
+    return result, list(result.unit_results.all())
+
+
+def printable_result_context(result: Result, unit_results=None, static_prefix: str | None = None) -> dict:
+    """
+    :param unit_results: unit results of result, result.unit_results by default
+    :param static_prefix: relative path of copied OFFLINE_ASSETS for files, static URLs by default
+    """
+    def asset(path):
+        if static_prefix is not None:
+            # Browsers refuse integrity checked files opened from disk
+            return {'url': static_prefix + path}
+        return {'url': static(path), 'integrity': INTEGRITY.get(path)}
+
+    return {
+        'stylesheets': [asset(path) for path in STYLESHEETS],
+        'scripts': [asset(path) for path in SCRIPTS],
+        'result': result,
+        'unit_results': result.unit_results.all() if unit_results is None else unit_results,
+        'sc': result.submeter_calculator,
+        'water_bill': result.submeter_calculator.water_bill,
+        'gas_bill': result.submeter_calculator.gas_bill,
+    }
+
+
+def render_printable_result(result: Result, unit_results=None, static_prefix: str | None = None) -> str:
+    return render_to_string('building/printable_result.html', printable_result_context(result, unit_results, static_prefix))
+
+
+def render_unit_slip(result: Result, unit_result, static_prefix: str | None = None) -> str:
+    """
+    Payment slip of one unit, unit_result is one of result.unit_results
+    """
+    context = printable_result_context(result, static_prefix=static_prefix)
+    context['unit_result'] = unit_result
+    context['extra_prices'] = unpack_extra_prices(result.packed_details)
+    return render_to_string('building/unit_slip.html', context)
+
+
+def printable_result_fingerprint(result: Result) -> str:
+    """
+    Hash of templates and every row printable files of result show, result must come from printable_results
+    """
+    sc = result.submeter_calculator
+    canonical = json.dumps([
+        [get_template(name).template.source for name in PRINTABLE_TEMPLATES],
+        [result.id, result.due_date, result.client_notes, result.packed_details and bytes(result.packed_details).hex()],
+        [(u.unit, u.usage_amount, u.price, u.debt, u.total_payment) for u in result.unit_results.all()],
+        [(e.title, e.amount) for e in sc.extra_charges.all()],
+        [(d.unit, d.amount) for d in sc.debts.all()],
+        [sc.water_bill.issuance_date, sc.water_bill.building.name],
+        sc.gas_bill and [sc.gas_bill.total_payment, sc.gas_bill.building.units],
+    ], default=str, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def write_atomic(path: str, content: str) -> None:
+    """
+    Readers see old or new file, never a partly written one
+    """
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as file:
+            file.write(content)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def copy_offline_assets(output: str) -> None:
+    """
+    Copy OFFLINE_ASSETS into static directory of output, rendered files link to them relatively
+    """
+    for path in OFFLINE_ASSETS:
+        target = os.path.join(output, 'static', path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.copyfile(finders.find(path), target)
+
+
+def printable_result_paths(result: Result) -> dict:
+    """
+    {unit or None for result page: path relative to output directory}
+    """
+    directory = '%s/%s' % (result.submeter_calculator.water_bill.building_id, result.id)
+    paths = {None: directory + '/result.html'}
+    for unit_result in result.unit_results.all():
+        paths[unit_result.unit] = '%s/unit-%s.html' % (directory, unit_result.unit)
+    return paths
+
+
+def try_write_printable_files(item: tuple) -> tuple:
+    """
+    Render result page and unit slips into output directory, for process pools
+    :param item: (Result from printable_results, output directory)
+    :return (result id, paths, None) or (result id, None, error message)
+    """
+    result, output = item
+    try:
+        unit_results = {unit_result.unit: unit_result for unit_result in result.unit_results.all()}
+        paths = printable_result_paths(result)
+        for unit, path in paths.items():
+            # From directory of file back to output
+            static_prefix = '../' * path.count('/') + 'static/'
+            if unit is None:
+                content = render_printable_result(result, static_prefix=static_prefix)
+            else:
+                content = render_unit_slip(result, unit_results[unit], static_prefix=static_prefix)
+            write_atomic(os.path.join(output, path), content)
+        return result.id, list(paths.values()), None
+    except Exception as e:
+        return result.id, None, '%s: %s' % (type(e).__name__, e)
+
+
+def printable_result_html_version() -> str:
+    """
+    Hash of templates and static URLs cached HTML was rendered with, so HTML of a previous deploy is not read
+    """
+    canonical = json.dumps([
+        [get_template(name).template.source for name in PRINTABLE_TEMPLATES],
+        [static(path) for path in STYLESHEETS + SCRIPTS],
+    ], separators=(',', ':'))
+    return hashlib.sha256(canonical.encode()).hexdigest()[:16]
+
+
+def get_printable_result_html(result_id: int) -> str:
+    """
+    Cached HTML of result, raises Result.DoesNotExist
+    """
+    # Version in database is replaced whenever a row shown on the page changes, every process reads the same key
+    version = Result.objects.filter(id=result_id).values_list('version', flat=True).first()
+    # Archived results do not change anymore
+    key = 'building:printable_result:%s:%s:%s' % (
+        result_id, version.hex if version else 'archived', printable_result_html_version())
+    html = cache.get(key)
+    if html is None:
+        html = render_printable_result(*printable_result(result_id))
+        cache.set(key, html, timeout=settings.PRINTABLE_RESULT_CACHE_TIMEOUT)
+    return html
@@ -0,0 +1,301 @@
+"""
+Import of meter readings from CSV and XLSX files
+
+Files have a header row with building, date, unit and liters columns. building
+is an id or a name, date is jalali like 1402-07-01 or a date cell of XLSX.
+Rows are read one by one and validated and written in chunks, so memory does
+not grow with file size. Rows of one building and date become one Usage, or
+are added to the Usage already registered on that date. A reading must not be
+less than the previous reading of its unit, or greater than a later stored one.
+Invalid rows are reported by line number and skipped, the rest of the file is
+still imported.
+
+    importer = ReadingImporter()
+    importer.import_file(file, 'readings.xlsx')
+"""
+import csv
+import datetime
+import io
+import os
+from itertools import islice
+
+import jdatetime
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import OuterRef, Q, Subquery
+from django.utils.translation import gettext_lazy as _
+
+from .models import Building, Usage, UnitUsage
+
+
+COLUMNS = ('building', 'date', 'unit', 'liters')
+FORMATS = ('.csv', '.xlsx')
+
+
+def _read_csv(file):
+    # Wrapper is detached at the end so closing it does not close file
+    text = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+    try:
+        reader = csv.reader(text)
+        for values in reader:
+            yield reader.line_num, values
+    finally:
+        text.detach()
+
+
+def _read_xlsx(file):
+    # openpyxl is only needed for XLSX files
+    from openpyxl import load_workbook
+
+    # Read only mode streams rows instead of loading the whole sheet
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        yield from enumerate(workbook.worksheets[0].iter_rows(values_only=True), start=1)
+    finally:
+        workbook.close()
+
+
+def read_rows(file, name: str):
+    """
+    Yield (line number, {column: value}) of rows of first sheet, blank rows are skipped
+    :param file: binary file
+    :param name: file name, its extension picks the format
+    """
+    extension = os.path.splitext(name)[1].lower()
+    if extension not in FORMATS:
+        raise ValidationError({'file': _('file must be one of %s') % ', '.join(FORMATS)})
+    rows = _read_csv(file) if extension == '.csv' else _read_xlsx(file)
+
+    indexes = None
+    for line, values in rows:
+        values = ['' if value is None else value for value in values]
+        if not any(str(value).strip() for value in values):
+            continue
+        if indexes is None:
+            header = [str(value).strip().lower() for value in values]
+            missing = [column for column in COLUMNS if column not in header]
+            if missing:
+                raise ValidationError({'file': _('header has no %s column') % ', '.join(missing)})
+            indexes = {column: header.index(column) for column in COLUMNS}
+            continue
+        yield line, {column: values[index] if index < len(values) else '' for column, index in indexes.items()}
+
+
+def parse_integer(value, name: str) -> int:
+    # XLSX number cells are floats
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    try:
+        if isinstance(value, bool) or isinstance(value, float):
+            raise ValueError
+        return int(str(value).strip())
+    except ValueError:
+        raise ValidationError(_('%(name)s %(value)r is not an integer') % {'name': name, 'value': value})
+
+
+def parse_date(value) -> jdatetime.date:
+    """
+    Jalali date of a cell, text is jalali and XLSX date cells are gregorian
+    """
+    if isinstance(value, datetime.datetime):
+        value = value.date()
+    if isinstance(value, datetime.date):
+        return jdatetime.date.fromgregorian(date=value)
+    try:
+        return jdatetime.datetime.strptime(str(value).strip().replace('/', '-'), '%Y-%m-%d').date()
+    except ValueError:
+        raise ValidationError(_('date %r is not a jalali date like 1402-07-01') % (value,))
+
+
+class ReadingImporter:
+    """
+    Validates and writes readings chunk by chunk, see module docstring
+    """
+
+    def __init__(self, chunk_size: int = 1000, batch_size: int = 1000, max_errors: int = 1000) -> None:
+        self.chunk_size = chunk_size
+        self.batch_size = batch_size
+        # Errors after this many are counted but not kept
+        self.max_errors = max_errors
+        self.rows = 0
+        self.imported = 0
+        self.usages_created = 0
+        # [(line, message)]
+        self.errors = []
+        self.error_count = 0
+        # {building column value: Building or None}
+        self._buildings = {}
+
+    def error(self, line: int, message: str) -> None:
+        self.error_count += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append((line, str(message)))
+
+    def import_file(self, file, name: str) -> 'ReadingImporter':
+        return self.import_rows(read_rows(file, name))
+
+    def import_rows(self, rows) -> 'ReadingImporter':
+        """
+        :param rows: iterable of (line number, {column: value})
+        """
+        rows = iter(rows)
+        while chunk := list(islice(rows, self.chunk_size)):
+            self.rows += len(chunk)
+            self.import_chunk(chunk)
+        return self
+
+    def import_chunk(self, chunk: list) -> None:
+        first_error = len(self.errors)
+        self.validate_and_save(chunk)
+        # Report errors of chunk in line order
+        self.errors[first_error:] = sorted(self.errors[first_error:])
+
+    def validate_and_save(self, chunk: list) -> None:
+        groups = self.parse_chunk(chunk)
+
+        # {(building id, date): usage id} of usages already registered
+        existing = {}
+        for usage_id, building_id, register_date in Usage.objects.filter(
+                building_id__in={building_id for building_id, _date in groups},
+                register_date__in={register_date for _building_id, register_date in groups},
+        ).order_by('id').values_list('id', 'building_id', 'register_date'):
+            existing.setdefault((building_id, register_date), usage_id)
+
+        # {(building id, unit): {date: (liters, stored)}} of stored readings and readings of chunk
+        series = {}
+        for usage_id, building_id, register_date, unit, amount in self.nearby_readings(groups):
+            if usage_id == existing.get((building_id, register_date), usage_id):
+                series.setdefault((building_id, unit), {})[register_date] = (amount, True)
+        for (building_id, register_date), rows in groups.items():
+            for unit, (_line, liters) in rows.items():
+                series.setdefault((building_id, unit), {}).setdefault(register_date, (liters, False))
+
+        for key in sorted(groups):
+            building_id, register_date = key
+            rows = groups[key]
+            for unit, (line, liters) in list(rows.items()):
+                unit_series = series[building_id, unit]
+                dates = sorted(unit_series)
+                index = dates.index(register_date)
+                previous = unit_series[dates[index - 1]][0] if index else None
+                # Later readings of chunk are not validated yet, they are checked against this one instead
+                following = next((unit_series[date][0] for date in dates[index + 1:] if unit_series[date][1]), None)
+
+                if unit_series[register_date][1]:
+                    self.error(line, _('unit %(unit)d already has a reading on %(date)s') % {'unit': unit, 'date': register_date})
+                    # Series keeps the stored reading
+                    del rows[unit]
+                    continue
+                if previous is not None and liters < previous:
+                    self.error(line, _('reading %(liters)d of unit %(unit)d is less than previous reading %(previous)d') % {
+                        'liters': liters, 'unit': unit, 'previous': previous})
+                elif following is not None and liters > following:
+                    self.error(line, _('reading %(liters)d of unit %(unit)d is greater than next reading %(next)d') % {
+                        'liters': liters, 'unit': unit, 'next': following})
+                else:
+                    continue
+                del rows[unit]
+                del unit_series[register_date]
+
+        groups = {key: rows for key, rows in groups.items() if rows}
+        try:
+            self.save(groups, existing)
+        except IntegrityError:
+            # Rows written by someone else since validation, find failed groups by saving one by one
+            for key, rows in groups.items():
+                try:
+                    self.save({key: rows}, existing)
+                except IntegrityError as e:
+                    for line, _liters in rows.values():
+                        self.error(line, 'IntegrityError: %s' % e)
+
+    def parse_chunk(self, chunk: list) -> dict:
+        """
+        Parse and validate rows on their own
+        :return {(building id, date): {unit: (line, liters)}}
+        """
+        self.load_buildings(row['building'] for _, row in chunk)
+        groups = {}
+        for line, row in chunk:
+            try:
+                building = self._buildings[self.building_key(row['building'])]
+                if building is None:
+                    raise ValidationError(_('building %r does not exist') % (row['building'],))
+                register_date = parse_date(row['date'])
+                unit = parse_integer(row['unit'], 'unit')
+                liters = parse_integer(row['liters'], 'liters')
+                if not 1 <= unit <= building.units:
+                    raise ValidationError(_('unit %(unit)d is not between 1 and %(units)d') % {'unit': unit, 'units': building.units})
+                if liters <= 0:
+                    raise ValidationError(_('liters must be greater than 0'))
+            except ValidationError as e:
+                self.error(line, ' '.join(e.messages))
+                continue
+
+            rows = groups.setdefault((building.id, register_date), {})
+            if unit in rows:
+                self.error(line, _('unit %(unit)d is repeated, first on line %(line)d') % {'unit': unit, 'line': rows[unit][0]})
+                continue
+            rows[unit] = (line, liters)
+        return groups
+
+    @staticmethod
+    def building_key(value) -> tuple:
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        value = str(value).strip()
+        return ('id', int(value)) if value.isdigit() else ('name', value)
+
+    def load_buildings(self, values) -> None:
+        keys = {self.building_key(value) for value in values} - self._buildings.keys()
+        if not keys:
+            return
+        ids = [value for kind, value in keys if kind == 'id']
+        names = [value for kind, value in keys if kind == 'name']
+        for key in keys:
+            self._buildings[key] = None
+        for building in Building.objects.filter(Q(id__in=ids) | Q(name__in=names)).only('id', 'name', 'units'):
+            for key in (('id', building.id), ('name', building.name)):
+                if key in keys:
+                    self._buildings[key] = building
+
+    @staticmethod
+    def nearby_readings(groups: dict) -> list:
+        """
+        [(usage id, building id, date, unit, liters)] of stored readings of units of chunk from first date of their
+        building in chunk to its last date, and the reading of each unit before and after them, ordered by id
+        """
+        ranges = {}
+        units = {}
+        for (building_id, register_date), rows in groups.items():
+            first, last = ranges.get(building_id, (register_date, register_date))
+            ranges[building_id] = (min(first, register_date), max(last, register_date))
+            units.setdefault(building_id, set()).update(rows)
+
+        condition = Q(pk__in=[])
+        for building_id, (first, last) in ranges.items():
+            readings = UnitUsage.objects.filter(usage__building_id=building_id, unit=OuterRef('unit'))
+            before = readings.filter(usage__register_date__lt=first) \
+                .order_by('-usage__register_date', '-usage_id').values('usage__register_date')[:1]
+            after = readings.filter(usage__register_date__gt=last) \
+                .order_by('usage__register_date', 'usage_id').values('usage__register_date')[:1]
+            # Stored readings between dates of chunk are neighbours of imported rows too
+            condition |= Q(usage__building_id=building_id, unit__in=units[building_id]) & (
+                Q(usage__register_date__range=(first, last))
+                | Q(usage__register_date=Subquery(before)) | Q(usage__register_date=Subquery(after))
+            )
+        return list(UnitUsage.objects.filter(condition).order_by('id')
+                    .values_list('usage_id', 'usage__building_id', 'usage__register_date', 'unit', 'amount'))
+
+    @transaction.atomic
+    def save(self, groups: dict, existing: dict) -> None:
+        new_keys = [key for key in groups if key not in existing]
+        usages = Usage.objects.bulk_create([Usage(building_id=building_id, register_date=register_date)
+                                            for building_id, register_date in new_keys])
+        usage_ids = {**existing, **{key: usage.id for key, usage in zip(new_keys, usages)}}
+        created = UnitUsage.objects.bulk_create([
+            UnitUsage(usage_id=usage_ids[key], unit=unit, amount=liters)
+            for key, rows in groups.items() for unit, (_line, liters) in rows.items()
+        ], batch_size=self.batch_size)
+        self.usages_created += len(usages)
+        self.imported += len(created)
@@ -0,0 +1,82 @@
+from uuid import uuid4
+
+from django.db.models import QuerySet
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from . import tariffs
+from .models import (TariffSchedule, TariffBracket, CityCoefficient, Building, WaterBill, GasBill, SubmeterCalculator,
+                     ExtraCharge, Debt, Result, UnitResult)
+
+
+@receiver(post_save, sender=TariffSchedule)
+@receiver(post_delete, sender=TariffSchedule)
+@receiver(post_save, sender=TariffBracket)
+@receiver(post_delete, sender=TariffBracket)
+@receiver(post_save, sender=CityCoefficient)
+@receiver(post_delete, sender=CityCoefficient)
+def clear_tariff_cache(sender, **kwargs) -> None:
+    """
+    Compiled tariffs are cached per process, replace version of tariff data so every process reloads them
+    """
+    tariffs.data_changed()
+
+
+def results_changed(result_ids) -> None:
+    """
+    A row shown with results changed, replace their versions so API ETags and cached printable HTML change
+    """
+    result_ids = list(result_ids)
+    if result_ids:
+        Result.objects.filter(id__in=result_ids).update(version=uuid4())
+
+
+@receiver(post_save, sender=UnitResult)
+@receiver(post_delete, sender=UnitResult)
+def unit_result_changed(sender, instance, origin=None, **kwargs) -> None:
+    # Deleting results deletes their unit results too, there is no version left to replace
+    if isinstance(origin, Result) or isinstance(origin, QuerySet) and origin.model is Result:
+        return
+    results_changed([instance.result_id])
+
+
+# Lookup from Result to each model shown on printable result and API
+_PRINTABLE_RESULT_RELATIONS = {
+    SubmeterCalculator: 'submeter_calculator',
+    ExtraCharge: 'submeter_calculator__extra_charges',
+    Debt: 'submeter_calculator__debts',
+    WaterBill: 'submeter_calculator__water_bill',
+    GasBill: 'submeter_calculator__gas_bill',
+    Building: 'submeter_calculator__water_bill__building',
+}
+
+
+def related_row_changed(sender, instance, **kwargs) -> None:
+    lookup = _PRINTABLE_RESULT_RELATIONS[sender]
+    results_changed(Result.objects.filter(**{lookup: instance.pk}).values_list('id', flat=True))
+
+
+for model in _PRINTABLE_RESULT_RELATIONS:
+    post_save.connect(related_row_changed, sender=model)
+    post_delete.connect(related_row_changed, sender=model)
+
+
+@receiver(post_save, sender=WaterBill)
+@receiver(post_save, sender=SubmeterCalculator)
+def sync_result_jalali_period(sender, instance, **kwargs) -> None:
+    """
+    Result period follows issuance date of its water bill
+    """
+    # New bills and calculators have no results yet
+    if kwargs.get('created'):
+        return
+
+    if sender is WaterBill:
+        water_bill = instance
+        results = Result.objects.filter(submeter_calculator__water_bill=instance)
+    else:
+        water_bill = instance.water_bill
+        results = instance.results.all()
+
+    date = water_bill._meta.get_field('issuance_date').to_python(water_bill.issuance_date)
+    results.exclude(jalali_year=date.year, jalali_month=date.month).update(jalali_year=date.year, jalali_month=date.month)
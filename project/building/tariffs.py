@@ -0,0 +1,182 @@
+import hashlib
+from bisect import bisect_left, bisect_right
+from threading import Lock
+
+import numpy as np
+from django.conf import settings
+
+from .functions import WATER_TARIFF_BOUNDS, WATER_TARIFF_SLOPES, WATER_TARIFF_INTERCEPTS
+
+
+class CompiledTariff:
+    """
+    In-memory form of a water price table
+    bracket i covers (bounds[i-1], bounds[i]] m3, last bracket has no upper bound
+    """
+    __slots__ = ('bounds', 'slopes', 'intercepts', 'version', '_bounds_array', '_slopes_array', '_intercepts_array')
+
+    def __init__(self, bounds, slopes, intercepts, version: str) -> None:
+        if len(slopes) != len(bounds) + 1 or len(intercepts) != len(slopes):
+            raise ValueError('a tariff needs one more slope and intercept than bounds')
+        if list(bounds) != sorted(set(bounds)):
+            raise ValueError('tariff bounds must be strictly increasing')
+
+        self.bounds = tuple(bounds)
+        self.slopes = tuple(slopes)
+        self.intercepts = tuple(intercepts)
+        self.version = version
+        self._bounds_array = np.array(self.bounds)
+        self._slopes_array = np.array(self.slopes)
+        self._intercepts_array = np.array(self.intercepts)
+
+    def __repr__(self) -> str:
+        return f'<CompiledTariff {self.version}>'
+
+    def price(self, usage: int | float) -> float:
+        """
+        Pass usage as liter
+        """
+        # convert  liter to m3
+        usage = usage / 1000
+        if usage < 0:
+            raise ValueError('usage must not be negative')
+        bracket = bisect_left(self.bounds, usage)
+        return (usage * self.slopes[bracket]) - self.intercepts[bracket]
+
+    def prices(self, usages: np.ndarray) -> np.ndarray:
+        """
+        Pass usages as liter
+        :return prices as float64 array
+        """
+        # convert  liter to m3
+        usages = np.asarray(usages) / 1000
+        if (usages < 0).any():
+            raise ValueError('usages must not be negative')
+        brackets = np.searchsorted(self._bounds_array, usages, side='left')
+        return (usages * self._slopes_array[brackets]) - self._intercepts_array[brackets]
+
+
+def compile_tariff(schedule) -> CompiledTariff:
+    """
+    Compile a TariffSchedule with prefetched brackets
+    """
+    # Bracket without upper_bound is the last one
+    brackets = sorted(schedule.brackets.all(), key=lambda b: (b.upper_bound is None, b.upper_bound or 0))
+    if not brackets or brackets[-1].upper_bound is not None or any(b.upper_bound is None for b in brackets[:-1]):
+        raise ValueError('tariff schedule %s must end with exactly one bracket without upper bound' % schedule.pk)
+
+    bounds = [b.upper_bound for b in brackets[:-1]]
+    slopes = [b.slope for b in brackets]
+    intercepts = [b.intercept for b in brackets]
+    digest = hashlib.sha1(repr((bounds, slopes, intercepts)).encode()).hexdigest()[:12]
+    return CompiledTariff(bounds, slopes, intercepts, version='%s-%s' % (schedule.pk, digest))
+
+
+BUILTIN_TARIFF = CompiledTariff(WATER_TARIFF_BOUNDS.tolist(), WATER_TARIFF_SLOPES.tolist(),
+                                WATER_TARIFF_INTERCEPTS.tolist(), version='builtin')
+
+
+class _Periods:
+    """
+    Values with validity date ranges, sorted by start date for bisect lookup
+    """
+    __slots__ = ('starts', 'items')
+
+    def __init__(self, items) -> None:
+        # items: [(valid_from, valid_until or None, value)]
+        items = sorted(items, key=lambda item: item[0])
+        self.starts = [item[0] for item in items]
+        self.items = items
+
+    def get(self, date, default=None):
+        # Latest period started on or before date
+        index = bisect_right(self.starts, date) - 1
+        if index >= 0:
+            valid_until, value = self.items[index][1:]
+            if valid_until is None or date <= valid_until:
+                return value
+        return default
+
+
+_lock = Lock()
+# (tariff data version, tariff periods, {city.id: coefficient periods}) or None when not loaded yet
+_cache = None
+
+
+def _data_version():
+    from .models import TariffDataVersion
+    return TariffDataVersion.objects.filter(id=1).values_list('version', flat=True).first()
+
+
+def _get_cache() -> tuple:
+    global _cache
+    from .models import TariffSchedule, CityCoefficient
+
+    cache = _cache
+    if cache is not None:
+        return cache
+
+    with _lock:
+        if _cache is None:
+            # Read before rows, a change made meanwhile reloads them on next refresh
+            version = _data_version()
+            schedules = TariffSchedule.objects.prefetch_related('brackets')
+            tariffs = _Periods(
+                (schedule.valid_from.togregorian(), schedule.valid_until and schedule.valid_until.togregorian(), compile_tariff(schedule))
+                for schedule in schedules
+            )
+
+            per_city = {}
+            for city_id, valid_from, valid_until, coefficient in CityCoefficient.objects.values_list('city_id', 'valid_from', 'valid_until', 'coefficient'):
+                per_city.setdefault(city_id, []).append((valid_from.togregorian(), valid_until and valid_until.togregorian(), float(coefficient)))
+
+            _cache = (version, tariffs, {city_id: _Periods(items) for city_id, items in per_city.items()})
+        return _cache
+
+
+def clear_cache() -> None:
+    global _cache
+    with _lock:
+        _cache = None
+
+
+def refresh() -> None:
+    """
+    Drop compiled tariffs if tariff data changed since they were loaded, in this or another process
+    Costs one query, lookups themselves never query once tariffs are loaded
+    """
+    global _cache
+    cache = _cache
+    if cache is None:
+        return
+    version = _data_version()
+    with _lock:
+        if _cache is cache and cache[0] != version:
+            _cache = None
+
+
+def data_changed() -> None:
+    """
+    Tariff rows changed, replace the version every process checks and drop compiled tariffs of this one
+    """
+    from .models import TariffDataVersion
+    TariffDataVersion.bump()
+    clear_cache()
+
+
+def get_tariff(date) -> CompiledTariff:
+    """
+    Water price table valid on date (jdatetime.date), BUILTIN_TARIFF if no schedule covers it
+    """
+    tariffs = _get_cache()[1]
+    return tariffs.get(date.togregorian(), BUILTIN_TARIFF)
+
+
+def get_city_coefficient(city_id: int | None, date) -> float:
+    """
+    Price coefficient of city valid on date (jdatetime.date), settings.CITY_COEFFICIENT if none covers it
+    """
+    periods = _get_cache()[2].get(city_id)
+    if periods is None:
+        return settings.CITY_COEFFICIENT
+    return periods.get(date.togregorian(), settings.CITY_COEFFICIENT)
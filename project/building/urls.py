@@ -0,0 +1,14 @@
+from django.urls import path
+
+from . import views
+
+
+app_name = 'building'
+
+urlpatterns = [
+    path('buildings/<int:building_id>/results/', views.building_results, name='api_building_results'),
+    path('buildings/<int:building_id>/units/<int:unit>/results/', views.unit_results, name='api_unit_results'),
+    path('buildings/<int:building_id>/water-bills/', views.water_bills, name='api_water_bills'),
+    path('buildings/<int:building_id>/gas-bills/', views.gas_bills, name='api_gas_bills'),
+    path('results/<int:result_id>/', views.result_detail, name='api_result'),
+]
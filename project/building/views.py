@@ -1,3 +1,269 @@
-from django.shortcuts import render
+"""
+Read-only JSON API of results, unit results and bills
 
-# Create your views here.
+Lists are newest first and paged by key: each page has next, the value of its
+after parameter, which stays right however many rows are added meanwhile.
+Every response carries a strong ETag made of id and version of each row it
+shows, so polling with If-None-Match is answered 304 by a query of ids and
+versions only, without serializing anything. Views are async, under ASGI they
+do not hold a worker thread while waiting for the database.
+"""
+import hashlib
+
+from asgiref.sync import sync_to_async
+from django.http import Http404, HttpResponseNotAllowed, JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+
+from .calculation import unpack_extra_prices
+from .functions import period_str, str_or_none
+from .models import Building, GasBill, Result, UnitResult, WaterBill
+
+
+# Changes whenever shape of responses changes, so old ETags do not match
+API_VERSION = '1'
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+
+class BadRequest(Exception):
+    pass
+
+
+def _etag(versions: list, next_after: int | None = None) -> str:
+    """
+    Strong ETag of [(id, version)] of rows shown in a response
+    """
+    digest = hashlib.sha256(('%s;%s;' % (API_VERSION, next_after)).encode())
+    for row_id, version in versions:
+        digest.update(('%d:%s;' % (row_id, version)).encode())
+    return '"%s"' % digest.hexdigest()
+
+
+def _private(response):
+    # Clients revalidate every time and shared caches keep nothing
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ['Cookie'])
+    return response
+
+
+def _not_modified(request, versions: list, next_after: int | None = None):
+    """
+    304 response if client has current version of rows, None otherwise
+    """
+    response = get_conditional_response(request, etag=_etag(versions, next_after))
+    return response and _private(response)
+
+
+def _respond(data: dict, versions: list, next_after: int | None = None) -> JsonResponse:
+    response = JsonResponse(data, json_dumps_params={'ensure_ascii': False})
+    response['ETag'] = _etag(versions, next_after)
+    return _private(response)
+
+
+def _page_params(request) -> tuple:
+    """
+    (after, limit) of request
+    """
+    try:
+        after = int(request.GET['after']) if request.GET.get('after') else None
+        limit = int(request.GET.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        raise BadRequest('after and limit must be integers')
+    if not 1 <= limit <= MAX_LIMIT:
+        raise BadRequest('limit must be between 1 and %d' % MAX_LIMIT)
+    return after, limit
+
+
+async def _page(queryset, after: int | None, limit: int, key: str = 'id') -> tuple:
+    """
+    ([(id, version)] of page, after value of next page or None)
+    :param queryset: values_list of key and version
+    """
+    if after is not None:
+        queryset = queryset.filter(**{key + '__lt': after})
+    versions = [row async for row in queryset.order_by('-' + key)[:limit + 1]]
+    if len(versions) > limit:
+        return versions[:limit], versions[limit - 1][0]
+    return versions, None
+
+
+async def _building_exists(building_id: int) -> None:
+    if not await Building.objects.filter(id=building_id).aexists():
+        raise Http404
+
+
+def api_view(permission: str):
+    """
+    Async GET view answering errors as JSON, user needs permission
+    """
+    def decorator(view):
+        # Decorators of Django 4.1 like require_GET would make the view sync
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return HttpResponseNotAllowed(['GET', 'HEAD'])
+            # request.user is loaded lazily by a query, so it is checked in a thread
+            allowed = await sync_to_async(lambda: request.user.is_authenticated and request.user.has_perm(permission))()
+            if not allowed:
+                return JsonResponse({'detail': 'permission denied'}, status=403)
+            try:
+                return await view(request, *args, **kwargs)
+            except BadRequest as e:
+                return JsonResponse({'detail': str(e)}, status=400)
+            except Http404:
+                return JsonResponse({'detail': 'not found'}, status=404)
+
+        wrapper.__name__ = view.__name__
+        wrapper.__doc__ = view.__doc__
+        return wrapper
+    return decorator
+
+
+RESULT_FIELDS = (
+    'id', 'version', 'submeter_calculator__water_bill__building_id', 'submeter_calculator__water_bill__building__name',
+    'jalali_year', 'jalali_month', 'submeter_calculator__water_bill__issuance_date',
+    'submeter_calculator__water_bill__payment_deadline', 'submeter_calculator__water_bill__total_payment',
+    'submeter_calculator__gas_bill__total_payment', 'due_date', 'packed_details',
+)
+UNIT_FIELDS = ('unit', 'usage_amount', 'price', 'debt', 'total_payment')
+
+
+async def _serialize_results(ids: list) -> tuple:
+    """
+    ([result data], [(id, version)]) in order of ids, two queries however many results there are
+    """
+    units = {}
+    async for result_id, *values in UnitResult.objects.filter(result_id__in=ids).order_by('result_id', 'unit') \
+            .values_list('result_id', *UNIT_FIELDS):
+        units.setdefault(result_id, []).append(dict(zip(UNIT_FIELDS, values)))
+
+    rows = {row[0]: row async for row in Result.objects.filter(id__in=ids).values_list(*RESULT_FIELDS)}
+    data = []
+    versions = []
+    for result_id in ids:
+        if result_id not in rows:
+            continue
+        (_id, version, building_id, building_name, year, month, issuance_date, payment_deadline,
+         water_bill_total, gas_bill_total, due_date, packed_details) = rows[result_id]
+        versions.append((result_id, version))
+        data.append({
+            'id': result_id,
+            'building': {'id': building_id, 'name': building_name},
+            'period': period_str(year, month),
+            'issuance_date': str_or_none(issuance_date),
+            'payment_deadline': str_or_none(payment_deadline),
+            'due_date': str_or_none(due_date),
+            'water_bill_total': water_bill_total,
+            'gas_bill_total': gas_bill_total,
+            'extra_prices': unpack_extra_prices(packed_details),
+            'total_payment': sum(unit['total_payment'] for unit in units.get(result_id, [])),
+            'units': units.get(result_id, []),
+        })
+    return data, versions
+
+
+@api_view('building.view_result')
+async def building_results(request, building_id: int):
+    """
+    Results of a building with payment of each unit, ?period=1402-07 filters by water bill period
+    """
+    after, limit = _page_params(request)
+    await _building_exists(building_id)
+    queryset = Result.objects.filter(submeter_calculator__water_bill__building_id=building_id)
+    if request.GET.get('period'):
+        try:
+            year, month = map(int, request.GET['period'].split('-'))
+        except ValueError:
+            raise BadRequest('period must be like 1402-07')
+        queryset = queryset.in_jalali_period(year, month)
+
+    versions, next_after = await _page(queryset.values_list('id', 'version'), after, limit)
+    response = _not_modified(request, versions, next_after)
+    if response is not None:
+        return response
+
+    data, versions = await _serialize_results([result_id for result_id, _version in versions])
+    return _respond({'results': data, 'next': next_after}, versions, next_after)
+
+
+@api_view('building.view_result')
+async def result_detail(request, result_id: int):
+    versions = [row async for row in Result.objects.filter(id=result_id).values_list('id', 'version')]
+    if not versions:
+        raise Http404
+    response = _not_modified(request, versions)
+    if response is not None:
+        return response
+
+    data, versions = await _serialize_results([result_id])
+    if not data:
+        raise Http404
+    return _respond(data[0], versions)
+
+
+@api_view('building.view_result')
+async def unit_results(request, building_id: int, unit: int):
+    """
+    Payments of one unit of a building, newest result first
+    """
+    after, limit = _page_params(request)
+    await _building_exists(building_id)
+    queryset = UnitResult.objects.filter(result__submeter_calculator__water_bill__building_id=building_id, unit=unit)
+
+    # Unit results only change with a new version of their result
+    page, next_after = await _page(queryset.values_list('result_id', 'result__version'), after, limit, key='result_id')
+    response = _not_modified(request, page, next_after)
+    if response is not None:
+        return response
+
+    data = []
+    versions = []
+    rows = queryset.filter(result_id__in=[result_id for result_id, _version in page]).order_by('-result_id').values_list(
+        'result_id', 'result__version', 'result__jalali_year', 'result__jalali_month',
+        'result__submeter_calculator__water_bill__issuance_date', 'result__due_date', *UNIT_FIELDS[1:],
+    )
+    async for result_id, version, year, month, issuance_date, due_date, *values in rows:
+        versions.append((result_id, version))
+        data.append({'result': result_id, 'period': period_str(year, month), 'issuance_date': str_or_none(issuance_date),
+                     'due_date': str_or_none(due_date), **dict(zip(UNIT_FIELDS[1:], values))})
+    return _respond({'results': data, 'next': next_after}, versions, next_after)
+
+
+BILL_FIELDS = ('id', 'version', 'jalali_year', 'jalali_month', 'issuance_date', 'current_reading', 'payment_deadline',
+               'total_payment')
+
+
+async def _bills(request, model, building_id: int, extra_fields: tuple = ()):
+    after, limit = _page_params(request)
+    await _building_exists(building_id)
+    queryset = model.objects.filter(building_id=building_id)
+
+    page, next_after = await _page(queryset.values_list('id', 'version'), after, limit)
+    response = _not_modified(request, page, next_after)
+    if response is not None:
+        return response
+
+    data = []
+    versions = []
+    rows = queryset.filter(id__in=[bill_id for bill_id, _version in page]).order_by('-id').values_list(*BILL_FIELDS, *extra_fields)
+    async for bill_id, version, year, month, issuance_date, current_reading, payment_deadline, total_payment, *extra in rows:
+        versions.append((bill_id, version))
+        data.append({'id': bill_id, 'period': period_str(year, month), 'issuance_date': str_or_none(issuance_date),
+                     'current_reading': str_or_none(current_reading), 'payment_deadline': str_or_none(payment_deadline),
+                     'total_payment': total_payment, **dict(zip(extra_fields, extra))})
+    return _respond({'bills': data, 'next': next_after}, versions, next_after)
+
+
+@api_view('building.view_waterbill')
+async def water_bills(request, building_id: int):
+    """
+    Water bills of a building, newest first
+    """
+    return await _bills(request, WaterBill, building_id, ('water_consumption_price',))
+
+
+@api_view('building.view_gasbill')
+async def gas_bills(request, building_id: int):
+    """
+    Gas bills of a building, newest first
+    """
+    return await _bills(request, GasBill, building_id)
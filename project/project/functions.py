@@ -1,36 +1,63 @@
 import datetime
+from functools import lru_cache
 from django.utils import timezone
 import jdatetime
 
 
 months_fa = ['', 'فروردین', 'اردیبهشت', 'خرداد', 'تیر', 'مرداد', 'شهریور', 'مهر', 'آبان', 'آذر', 'دی', 'بهمن', 'اسفند']
 
+# Distinct dates kept by each cache, about eleven years of days
+JALALI_CACHE_SIZE = 4096
 
-def convert_to_jalali_date(my_date: datetime.date) -> jdatetime.date:
+
+@lru_cache(maxsize=JALALI_CACHE_SIZE)
+def _jalali_date(my_date: datetime.date) -> jdatetime.date:
     return jdatetime.date.fromgregorian(date=my_date)
 
+@lru_cache(maxsize=JALALI_CACHE_SIZE)
+def _jalali_date_string(year: int, month: int, day: int) -> str:
+    return '%(day)d %(month)s %(year)d' % {
+        'day': day,
+        'month': months_fa[month],
+        'year': year,
+        }
+
+def _gregorian_date_string(my_date: datetime.date) -> str:
+    jalali_date = _jalali_date(my_date)
+    return _jalali_date_string(jalali_date.year, jalali_date.month, jalali_date.day)
+
+def clear_jalali_caches() -> None:
+    _jalali_date.cache_clear()
+    _jalali_date_string.cache_clear()
+
+def convert_to_jalali_date(my_date: datetime.date) -> jdatetime.date:
+    if isinstance(my_date, datetime.datetime):
+        my_date = my_date.date()
+    return _jalali_date(my_date)
+
 def convert_to_jalali_datetime(my_datetime: datetime.datetime) -> jdatetime.datetime:
     return jdatetime.datetime.fromgregorian(datetime=timezone.localtime(my_datetime))
 
 def date_farsi_month_name(my_date: datetime.date | jdatetime.date) -> str:
-    if not isinstance(my_date, jdatetime.date):
-        my_date = convert_to_jalali_date(my_date)
-
-    return '%(day)d %(month)s %(year)d' % {
-        'day': my_date.day,
-        'month': months_fa[my_date.month],
-        'year': my_date.year,
+    if isinstance(my_date, jdatetime.date):
+        return _jalali_date_string(my_date.year, my_date.month, my_date.day)
+    if isinstance(my_date, datetime.datetime):
+        my_date = my_date.date()
+    return _gregorian_date_string(my_date)
+
+def _gregorian_datetime_string(local_datetime: datetime.datetime) -> str:
+    # Only the date part needs converting, time of day is same in both calendars
+    return '%(date)s - %(hour)d:%(minute)d' % {
+        'date': _gregorian_date_string(local_datetime.date()),
+        'hour': local_datetime.hour,
+        'minute': local_datetime.minute,
         }
 
 def datetime_farsi_month_name(my_datetime: datetime.datetime | jdatetime.datetime) -> str:
     if not isinstance(my_datetime, jdatetime.datetime):
-        my_datetime = convert_to_jalali_datetime(my_datetime)
-    return '%(day)d %(month)s %(year)d - %(hour)d:%(minute)d' % {
-        'day': my_datetime.day,
-        'month': months_fa[my_datetime.month],
-        'year': my_datetime.year,
+        return _gregorian_datetime_string(timezone.localtime(my_datetime))
+    return '%(date)s - %(hour)d:%(minute)d' % {
+        'date': _jalali_date_string(my_datetime.year, my_datetime.month, my_datetime.day),
         'hour': my_datetime.hour,
         'minute': my_datetime.minute,
         }
-
-
@@ -65,6 +65,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Serves collected static files, precompressed variants and far-future cache headers for hashed names
+    'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     # 'django.middleware.locale.LocaleMiddleware',  # for localization
     'django.middleware.common.CommonMiddleware',
@@ -149,6 +151,10 @@ STATICFILES_DIRS = [
 ]
 STATIC_URL = 'static/'
 STATIC_ROOT = BASE_DIR / 'static'
+# collectstatic writes content hashed copies of files plus gzip and brotli variants of them,
+# debug keeps plain names so nothing has to be collected while developing
+if not DEBUG:
+    STATICFILES_STORAGE = 'project.storage.StaticFilesStorage'
 
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
@@ -168,6 +174,19 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # My variables
 CITY_COEFFICIENT = 1.49  # tehran
 
+# Callables which receive timing summary of each calculation, empty list disables timing
+# e.g. ['building.instrumentation.log_collector']
+BUILDING_INSTRUMENTATION_COLLECTORS = env.list('BUILDING_INSTRUMENTATION_COLLECTORS', default=[])
+
+# Seconds rendered printable results stay in cache, saving a result or its rows replaces it anyway
+PRINTABLE_RESULT_CACHE_TIMEOUT = env.int('PRINTABLE_RESULT_CACHE_TIMEOUT', default=7 * 24 * 60 * 60)
+
+# Seconds a calculation job may run, longer running jobs were left by a stopped worker and are marked failed
+CALCULATION_JOB_TIMEOUT = env.int('CALCULATION_JOB_TIMEOUT', default=15 * 60)
+
+# Directory of results and readings moved out of database by archive_periods
+ARCHIVE_ROOT = env.str('ARCHIVE_ROOT', default=str(BASE_DIR / 'archive'))
+
 # CKEditor configs
 CKEDITOR_UPLOAD_PATH = "ck_uploads/"
 # Restrict access to uploaded images to the uploading user
@@ -20,6 +20,7 @@ from django.conf.urls.static import static
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('api/', include('building.urls')),
 
     path('ckeditor/', include('ckeditor_uploader.urls')),
 ]
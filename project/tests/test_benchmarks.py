@@ -0,0 +1,33 @@
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from benchmarks.suite import compare, measure
+
+
+class TestBenchmarkSuite(TestCase):
+
+    def test_measure(self) -> None:
+        metrics = measure(lambda: list(range(1000)), repeat=2)
+        self.assertEqual(metrics['queries'], 0)
+        self.assertGreater(metrics['peak_memory'], 0)
+        self.assertGreaterEqual(metrics['seconds'], 0)
+
+    def test_compare(self) -> None:
+        baseline = {
+            'a': {'seconds': 1.0, 'queries': 5, 'peak_memory': 1000},
+            'b': {'seconds': 1.0, 'queries': 5, 'peak_memory': 1000},
+        }
+        results = {
+            'a': {'seconds': 1.2, 'queries': 5, 'peak_memory': 1100},
+            'b': {'seconds': 1.3, 'queries': 6, 'peak_memory': 1000},
+            'new': {'seconds': 9.0, 'queries': 90, 'peak_memory': 9000},
+        }
+        self.assertListEqual(compare(results, baseline, threshold=0.25),
+                             [('b', 'seconds', 1.0, 1.3), ('b', 'queries', 5, 6)])
+
+    def test_measure_setup_is_not_counted(self) -> None:
+        runs = []
+        metrics = measure(lambda: runs.append('func'), repeat=2,
+                          setup=lambda: runs.append(list(User.objects.all())))
+        self.assertEqual(metrics['queries'], 0)
+        self.assertListEqual([run == 'func' for run in runs], [False, True] * 3)
@@ -0,0 +1,168 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.contrib import admin
+from django.contrib.messages import get_messages
+from django.contrib.messages.storage.fallback import FallbackStorage
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.test import RequestFactory, override_settings
+from django.urls import reverse
+
+from building.archive import PeriodArchiver, archive_key, readings_archive, results_archive
+from building.exports import reading_export, unit_result_export
+from building.jobs import enqueue_calculation, run_pending_jobs
+from building.models import CalculationJob, Result, SubmeterCalculator, UnitResult, UnitUsage, Usage, WaterBill
+from building.printing import printable_result, render_printable_result
+
+import jdatetime
+import numpy as np
+
+from test_building_admin import AdminTestCase, create_submeter_calculator
+
+
+class ArchiveTest(AdminTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        settings = override_settings(ARCHIVE_ROOT=self.directory)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        # Bills of 1401-06 and one more bill of 1401-08 for first building
+        self.results = [create_submeter_calculator(units=units, name='B%d' % units).calculate_submeter_prices()['result_object']
+                        for units in (2, 3)]
+        sc = self.results[0].submeter_calculator
+        usage = Usage.objects.create(building=sc.water_bill.building, register_date=jdatetime.date(1401, 7, 19))
+        UnitUsage.objects.bulk_create([UnitUsage(usage=usage, unit=unit, amount=1010000 + unit * 7000) for unit in (1, 2)])
+        water_bill = WaterBill.objects.create(building=sc.water_bill.building, issuance_date=jdatetime.date(1401, 8, 1),
+                                              current_reading=jdatetime.date(1401, 8, 1), payment_deadline=jdatetime.date(1401, 8, 1),
+                                              water_consumption_price=695800, total_payment=1227700)
+        self.open_result = SubmeterCalculator.objects.create(
+            water_bill=water_bill, previous_usage=sc.current_usage, current_usage=usage,
+        ).calculate_submeter_prices()['result_object']
+
+    def archive(self, *args) -> dict:
+        out = StringIO()
+        call_command('archive_periods', '--before', '1401-07-01', '--json', *args, stdout=out)
+        return json.loads(out.getvalue())
+
+    def test_archive_periods(self) -> None:
+        unit_results = sorted(unit_result_export().rows)
+        readings = sorted(reading_export().rows)
+        html = render_printable_result(*printable_result(self.results[1].id))
+
+        self.assertEqual(self.archive('--dry-run')['results'], 2)
+        self.assertEqual(Result.objects.count(), 3)
+
+        summary = self.archive()
+        # Usages read by calculator of 1401-08 and last usages of buildings stay in database
+        self.assertEqual([summary[key] for key in ('results', 'unit_results', 'usages', 'unit_usages')], [2, 5, 2, 5])
+        self.assertListEqual(list(Result.objects.values_list('id', flat=True)), [self.open_result.id])
+        self.assertEqual(UnitResult.objects.count(), 2)
+        self.assertEqual(UnitUsage.objects.count(), 7)
+        self.assertEqual(Usage.objects.count(), 5)
+
+        # Archived rows are read transparently
+        self.assertListEqual(sorted(unit_result_export().rows), unit_results)
+        self.assertListEqual(sorted(reading_export().rows), readings)
+        self.assertEqual(render_printable_result(*printable_result(self.results[1].id)), html)
+        response = self.client.get(reverse('admin:building_result_printable_result', args=[self.results[0].id]))
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(self.archive()['results'], 0)
+        self.assertEqual(len(results_archive.index), 5)
+
+    def test_archived_calculators_are_not_calculated_again(self) -> None:
+        self.archive()
+        archived = SubmeterCalculator.objects.filter(archived=True)
+        self.assertSetEqual(set(archived.values_list('id', flat=True)), {result.submeter_calculator_id for result in self.results})
+
+        out = StringIO()
+        call_command('calculate_all', '--json', '--workers', '1', stdout=out)
+        summary = json.loads(out.getvalue())
+        self.assertEqual((summary['calculators'], summary['failed']), (0, 0))
+
+    def test_archived_calculator_is_not_queued(self) -> None:
+        # Queued before its period was archived
+        job = enqueue_calculation(self.results[0].submeter_calculator, force=True)
+        self.archive()
+        sc = SubmeterCalculator.objects.get(id=self.results[0].submeter_calculator_id)
+
+        with self.assertRaises(ValidationError):
+            enqueue_calculation(sc)
+        run_pending_jobs()
+        job.refresh_from_db()
+        self.assertEqual(job.status, CalculationJob.FAILED)
+        self.assertIn('archived', job.error)
+        self.assertFalse(Result.objects.filter(submeter_calculator=sc).exists())
+
+    def test_archived_calculator_admin(self) -> None:
+        self.archive()
+        sc = self.results[0].submeter_calculator
+        change_url = reverse('admin:building_submetercalculator_change', args=[sc.id])
+
+        response = self.client.get(reverse('admin:building_submetercalculator_preview', args=[sc.id]), follow=True)
+        self.assertRedirects(response, change_url)
+        self.assertContains(response, 'is archived')
+
+        response = self.client.post(reverse('admin:building_submetercalculator_commit', args=[sc.id]), follow=True)
+        self.assertRedirects(response, change_url)
+        self.assertContains(response, 'is archived')
+        self.assertFalse(CalculationJob.objects.exists())
+
+    def test_result_of_archived_calculator_is_not_recalculated(self) -> None:
+        self.archive()
+        result = Result.objects.create(submeter_calculator_id=self.results[0].submeter_calculator_id)
+        request = RequestFactory().post('/', {'_recalculate': '1'})
+        request.session = self.client.session
+        request._messages = FallbackStorage(request)
+
+        admin.site._registry[Result].response_change(request, result)
+        self.assertIn('calculator is archived', [str(message) for message in get_messages(request)][0])
+        self.assertFalse(result.unit_results.exists())
+
+    def test_filters(self) -> None:
+        self.archive()
+        building = self.results[0].submeter_calculator.water_bill.building_id
+        self.assertEqual(len(list(unit_result_export(buildings=[building]).rows)), 4)
+        self.assertEqual(len(list(unit_result_export(buildings=[building], end=(1401, 6)).rows)), 2)
+        self.assertEqual(len(list(unit_result_export(start=(1401, 7)).rows)), 2)
+        self.assertEqual(len(list(reading_export(buildings=[building], end=(1401, 4)).rows)), 2)
+        usage = Usage.objects.get(building=building, register_date=jdatetime.date(1401, 4, 10))
+        self.assertEqual(len(list(reading_export(queryset=Usage.objects.filter(id=usage.id)).rows)), 2)
+
+        entries = results_archive.find(buildings=[building], start=(1401, 6), end=(1401, 6))
+        self.assertListEqual(sorted(set(entries['record'].tolist())), [self.results[0].id])
+        self.assertEqual(entries['key'][0], archive_key(building, 1401, 6, 1))
+        self.assertIsNone(results_archive.get(self.open_result.id))
+        with self.assertRaises(Result.DoesNotExist):
+            printable_result(self.open_result.id + 1)
+
+    def test_interrupted_run(self) -> None:
+        # Archived by an earlier run which stopped before deleting rows
+        archiver = PeriodArchiver(jdatetime.date(1401, 7, 1))
+        results_archive.append(archiver.result_blocks([self.results[0].id]))
+        usage = self.results[0].submeter_calculator.previous_usage
+        readings_archive.append(archiver.usage_blocks([usage.id]))
+        UnitUsage.objects.create(usage=usage, unit=3, amount=1000000)
+
+        summary = self.archive()
+        self.assertEqual([summary[key] for key in ('results', 'unit_results', 'usages', 'unit_usages')], [1, 3, 2, 4])
+        self.assertEqual(len(results_archive.index), 5)
+        self.assertEqual(Result.objects.count(), 1)
+        # Reading added after its usage was archived is in a new block of usage
+        rows = sorted(reading_export(queryset=Usage.objects.filter(id=usage.id)).rows)
+        self.assertListEqual([unit for _building, _date, unit, _amount in rows], [1, 2, 3])
+
+    def test_index_is_memory_mapped(self) -> None:
+        self.archive()
+        self.assertIsInstance(results_archive.index, np.memmap)
+        for name in ('results', 'readings'):
+            for suffix in ('.data', '.index.npy', '.records.npy'):
+                self.assertTrue(os.path.exists(os.path.join(self.directory, name + suffix)))
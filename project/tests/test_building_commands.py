@@ -0,0 +1,216 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from building.models import Building, ExtraCharge, Result, SubmeterCalculator, UnitUsage, Usage
+
+from test_building_admin import create_submeter_calculator
+
+
+class TestCalculateAllCommand(TestCase):
+
+    def setUp(self) -> None:
+        self.calculators = [create_submeter_calculator(units=units, name='B%d' % units) for units in (4, 8, 12)]
+        # Already calculated
+        self.calculated = create_submeter_calculator(name='done')
+        self.calculated.calculate_submeter_prices()
+        # Invalid readings
+        self.broken = create_submeter_calculator(name='broken')
+        self.broken.current_usage.unit_usages.filter(unit=4).delete()
+
+    def call(self, *args) -> dict:
+        out = StringIO()
+        call_command('calculate_all', '--json', *args, stdout=out)
+        return json.loads(out.getvalue())
+
+    def test_calculate_all(self) -> None:
+        for workers in ('1', '2'):
+            with self.subTest(workers=workers):
+                summary = self.call('--workers', workers, '--batch-size', '2')
+
+                self.assertEqual(summary['calculators'], 4)
+                self.assertEqual(summary['succeeded'], 3)
+                self.assertEqual(summary['units'], 24)
+                self.assertDictEqual(summary['failures'], {str(self.broken.id): 'current usage has no reading for units [4]'})
+
+                for sc in self.calculators:
+                    result = Result.objects.get(submeter_calculator=sc)
+                    self.assertEqual(result.unit_results.count(), sc.water_bill.building.units)
+                    self.assertEqual((result.jalali_year, result.jalali_month), (1401, 6))
+                    self.assertDictEqual(result.submeter_calculator_details,
+                                         json.loads(json.dumps(sc.preview_submeter_prices().details())))
+                self.assertEqual(self.calculated.results.count(), 1)
+
+                Result.objects.exclude(submeter_calculator=self.calculated).delete()
+
+    def test_calculate_all_dry_run(self) -> None:
+        summary = self.call('--workers', '1', '--dry-run')
+        self.assertEqual(summary['succeeded'], 3)
+        self.assertEqual(Result.objects.count(), 1)
+
+    def test_calculate_all_filters(self) -> None:
+        building = self.calculators[1].water_bill.building
+        summary = self.call('--workers', '1', '--building', str(building.id))
+        self.assertEqual(summary['calculators'], 1)
+
+        summary = self.call('--workers', '1', '--from-date', '1401-07-01')
+        self.assertEqual(summary['calculators'], 0)
+        summary = self.call('--workers', '1', '--to-date', '1401-06-01')
+        self.assertEqual(summary['calculators'], 3)
+
+
+class TestSeedSyntheticCommand(TestCase):
+
+    def call(self, *args) -> None:
+        call_command('seed_synthetic', '--buildings', '3', '--units', '4-8', '--periods', '3', '--chunk-size', '2',
+                     *args, stdout=StringIO())
+
+    def readings(self) -> list:
+        return list(UnitUsage.objects.order_by('usage__building__name', 'usage__register_date', 'unit')
+                    .values_list('usage__building__name', 'usage__register_date', 'unit', 'amount'))
+
+    def test_seed_synthetic(self) -> None:
+        self.call('--seed', '7')
+
+        self.assertEqual(Building.objects.count(), 3)
+        self.assertEqual(Usage.objects.count(), 3 * 4)
+        self.assertEqual(SubmeterCalculator.objects.count(), 3 * 3)
+        for building in Building.objects.all():
+            self.assertTrue(4 <= building.units <= 8)
+            amounts = {}
+            for usage in building.usages.order_by('register_date').prefetch_related('unit_usages'):
+                self.assertEqual(usage.unit_usages.count(), building.units)
+                for unit_usage in usage.unit_usages.all():
+                    # Readings only grow
+                    self.assertGreater(unit_usage.amount, amounts.get(unit_usage.unit, 0))
+                    amounts[unit_usage.unit] = unit_usage.amount
+
+        # Generated data is valid input of calculation
+        for sc in SubmeterCalculator.objects.all():
+            self.assertEqual(len(sc.preview_submeter_prices().units), sc.water_bill.building.units)
+
+    def test_seed_synthetic_is_deterministic(self) -> None:
+        self.call('--seed', '7')
+        readings = self.readings()
+        Building.objects.all().delete()
+
+        self.call('--seed', '7', '--chunk-size', '1', '--batch-size', '5')
+        self.assertListEqual(self.readings(), readings)
+        Building.objects.all().delete()
+
+        self.call('--seed', '8')
+        self.assertNotEqual(self.readings(), readings)
+
+
+class TestImportReadingsCommand(TestCase):
+
+    def setUp(self) -> None:
+        self.building = Building.objects.create(name='H2', units=2)
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'readings.csv')
+        with open(self.path, 'w') as file:
+            file.write('building,date,unit,liters\nH2,1402-07-01,1,100\nH2,1402-07-01,2,200\nH2,1402-07-01,3,300\n')
+
+    def test_import_readings(self) -> None:
+        out, err = StringIO(), StringIO()
+        call_command('import_readings', self.path, stdout=out, stderr=err)
+        self.assertIn('2 of 3 rows imported into 1 new usages, 1 rows failed', out.getvalue())
+        self.assertIn('readings.csv:4: unit 3 is not between 1 and 2', err.getvalue())
+        self.assertDictEqual(dict(UnitUsage.objects.filter(usage__building=self.building).values_list('unit', 'amount')),
+                             {1: 100, 2: 200})
+
+        out = StringIO()
+        call_command('import_readings', self.path, '--json', stdout=out)
+        summary = json.loads(out.getvalue())
+        self.assertEqual((summary['imported'], summary['errors']), (0, 3))
+
+
+class TestExportResultsCommand(TestCase):
+
+    def setUp(self) -> None:
+        for units in (2, 3):
+            create_submeter_calculator(units=units, name='B%d' % units).calculate_submeter_prices()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_export_results(self) -> None:
+        path = os.path.join(self.directory, 'unit-results.csv')
+        out = StringIO()
+        call_command('export_results', path, stdout=out)
+        self.assertIn('5 rows exported', out.getvalue())
+        with open(path) as file:
+            self.assertEqual(len(file.read().splitlines()), 6)
+
+        out, err = StringIO(), StringIO()
+        building = Building.objects.get(name='B3').id
+        call_command('export_results', '-', '--format', 'jsonl', '--readings', '--building', str(building),
+                     '--from-period', '1401-05', stdout=out, stderr=err)
+        self.assertEqual([json.loads(line)['building'] for line in out.getvalue().splitlines()], [building] * 3)
+        self.assertIn('3 rows exported', err.getvalue())
+
+
+class TestRenderResultsCommand(TestCase):
+
+    def setUp(self) -> None:
+        self.output = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.output)
+        self.results = [create_submeter_calculator(units=units, name='B%d' % units).calculate_submeter_prices()['result_object']
+                        for units in (4, 6)]
+
+    def call(self, *args) -> str:
+        out = StringIO()
+        call_command('render_results', self.output, *args, stdout=out)
+        return out.getvalue()
+
+    def test_render_results(self) -> None:
+        for workers in ('1', '2'):
+            with self.subTest(workers=workers):
+                self.assertIn('2 of 2 results rendered (12 files)', self.call('--workers', workers, '--force'))
+
+                with open(os.path.join(self.output, 'index.json')) as file:
+                    entries = json.load(file)['results']
+                self.assertListEqual([entry['result'] for entry in entries], [result.id for result in self.results])
+                for entry, result in zip(entries, self.results):
+                    self.assertEqual(len(entry['files']), result.unit_results.count() + 1)
+                    for path in entry['files']:
+                        self.assertTrue(os.path.exists(os.path.join(self.output, path)))
+                self.assertTrue(os.path.exists(os.path.join(self.output, 'index.html')))
+
+                with open(os.path.join(self.output, entries[0]['files'][1]), encoding='utf-8') as file:
+                    self.assertIn('B4', file.read())
+
+    def test_files_open_from_disk(self) -> None:
+        self.call('--workers', '1')
+        path = os.path.join(self.output, '%s/%s/result.html' % (self.results[0].submeter_calculator.water_bill.building_id,
+                                                                self.results[0].id))
+        with open(path, encoding='utf-8') as file:
+            html = file.read()
+        self.assertNotIn('"/static/', html)
+        self.assertNotIn('integrity=', html)
+        for asset in ('bootstrap/css/bootstrap.min.css', 'bootstrap/js/bootstrap.bundle.min.js', 'css/result.css', 'fonts/BYekan.ttf'):
+            self.assertTrue(os.path.exists(os.path.join(self.output, 'static', asset)))
+        for stylesheet in ('bootstrap/css/bootstrap.min.css', 'css/result.css'):
+            self.assertIn('href="../../static/%s"' % stylesheet, html)
+            self.assertTrue(os.path.exists(os.path.join(os.path.dirname(path), '../../static', stylesheet)))
+
+    def test_skip_up_to_date(self) -> None:
+        self.call('--workers', '1')
+        self.assertIn('0 of 2 results rendered (0 files), 2 up to date', self.call('--workers', '1'))
+
+        ExtraCharge.objects.create(submeter_calculator=self.results[1].submeter_calculator, title='cleaning', amount=1000)
+        self.assertIn('1 of 2 results rendered (7 files), 1 up to date', self.call('--workers', '1'))
+
+        # Missing file is rendered again
+        os.remove(os.path.join(self.output, '%s/%s/unit-1.html' % (self.results[0].submeter_calculator.water_bill.building_id,
+                                                                  self.results[0].id)))
+        self.assertIn('1 of 2 results rendered (5 files), 1 up to date', self.call('--workers', '1'))
+
+    def test_filters(self) -> None:
+        self.assertIn('1 of 1 results rendered', self.call('--workers', '1', '--result', str(self.results[0].id)))
+        self.assertIn('0 of 0 results rendered', self.call('--workers', '1', '--from-date', '1402-01-01'))
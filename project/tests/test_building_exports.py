@@ -0,0 +1,88 @@
+import csv
+import io
+import json
+
+from django.http import FileResponse, StreamingHttpResponse
+from django.test import TestCase
+
+from building.exports import export_response, reading_export, unit_result_export, write_export
+from building.models import Result, Usage
+from building.readings import ReadingImporter, read_rows
+
+import jdatetime
+import openpyxl
+
+from test_building_admin import create_submeter_calculator
+
+
+class ExportTest(TestCase):
+
+    def setUp(self) -> None:
+        self.results = [create_submeter_calculator(units=units, name='B%d' % units).calculate_submeter_prices()['result_object']
+                        for units in (2, 3)]
+        water_bill = self.results[1].submeter_calculator.water_bill
+        water_bill.issuance_date = jdatetime.date(1402, 7, 1)
+        water_bill.save()
+
+    def test_unit_result_export(self) -> None:
+        export = unit_result_export()
+        rows = list(export.rows)
+        self.assertEqual(len(rows), 5)
+        row = dict(zip(export.columns, rows[-1]))
+        unit_result = self.results[1].unit_results.get(unit=3)
+        self.assertDictEqual(row, {
+            'result': self.results[1].id, 'building_id': self.results[1].submeter_calculator.water_bill.building_id,
+            'building': 'B3', 'period': '1402-07', 'issuance_date': '1402-07-01', 'due_date': None, 'unit': 3,
+            'usage_amount': unit_result.usage_amount, 'price': unit_result.price, 'debt': unit_result.debt,
+            'total_payment': unit_result.total_payment,
+        })
+
+    def test_filters(self) -> None:
+        building = self.results[0].submeter_calculator.water_bill.building_id
+        self.assertEqual(len(list(unit_result_export(buildings=[building]).rows)), 2)
+        self.assertEqual(len(list(unit_result_export(start=(1402, 1)).rows)), 3)
+        self.assertEqual(len(list(unit_result_export(end=(1401, 12)).rows)), 2)
+        self.assertEqual(len(list(unit_result_export(start=(1401, 7), end=(1402, 6)).rows)), 0)
+        self.assertEqual(len(list(unit_result_export(queryset=Result.objects.filter(id=self.results[1].id)).rows)), 3)
+        self.assertEqual(len(list(reading_export(buildings=[building], start=(1401, 5), end=(1401, 5)).rows)), 2)
+
+    def test_formats(self) -> None:
+        text = io.StringIO()
+        write_export(unit_result_export(), 'csv', text)
+        rows = list(csv.DictReader(io.StringIO(text.getvalue())))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[0]['building'], 'B2')
+
+        text = io.StringIO()
+        write_export(unit_result_export(), 'jsonl', text)
+        rows = [json.loads(line) for line in text.getvalue().splitlines()]
+        self.assertEqual([row['unit'] for row in rows], [1, 2, 1, 2, 3])
+
+        binary = io.BytesIO()
+        write_export(unit_result_export(), 'xlsx', binary)
+        sheet = openpyxl.load_workbook(io.BytesIO(binary.getvalue())).active
+        self.assertEqual(sheet.max_row, 6)
+        self.assertEqual(sheet.cell(row=2, column=3).value, 'B2')
+
+    def test_response_streams(self) -> None:
+        # Nothing is read before response is consumed
+        with self.assertNumQueries(0):
+            response = export_response(unit_result_export(), 'csv', 'unit-results')
+        self.assertIsInstance(response, StreamingHttpResponse)
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="unit-results.csv"')
+        with self.assertNumQueries(1):
+            self.assertEqual(len(b''.join(response.streaming_content).splitlines()), 6)
+
+        response = export_response(unit_result_export(), 'xlsx', 'unit-results')
+        self.assertIsInstance(response, FileResponse)
+        response.close()
+
+    def test_readings_can_be_imported(self) -> None:
+        text = io.StringIO()
+        write_export(reading_export(), 'csv', text)
+        rows = list(read_rows(io.BytesIO(text.getvalue().encode()), 'readings.csv'))
+        self.assertEqual(len(rows), 10)
+
+        Usage.objects.all().delete()
+        importer = ReadingImporter().import_rows(rows)
+        self.assertEqual((importer.imported, importer.usages_created, importer.error_count), (10, 4, 0))
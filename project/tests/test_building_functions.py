@@ -1,6 +1,29 @@
 from django.test import TestCase
 
-from building.functions import get_price_over_14_m3, round_price
+import numpy as np
+
+from building.functions import get_price_over_14_m3, get_prices_over_14_m3, round_price, round_prices
+
+
+def legacy_round_price(price: int) -> int:
+    """
+    String based round_price, kept as reference for equivalence tests
+    """
+    if price == 0:
+        return 0
+
+    if len(str(price)) <= 2:
+        return 100
+
+    else:
+        price //= 10
+        if price % 10 >= 5:
+            price //= 10
+            price += 1
+        else:
+            price //= 10
+        price *= 100
+        return price
 
 
 class TestFunctions(TestCase):
@@ -30,6 +53,25 @@ class TestFunctions(TestCase):
             with self.subTest(i=i):
                 self.assertEqual(get_price_over_14_m3(i[0]), i[1])
     
+    def test_get_price_over_14_m3_zero_usage(self) -> None:
+        self.assertEqual(get_price_over_14_m3(0), 0)
+
+    def test_get_prices_over_14_m3(self) -> None:
+        usages = [0, 1, 356, 12568, 43889, 73452, 102480, 23456.789]
+        # Both sides of every bracket boundary
+        for bound in [5, 10, 14, 21, 28, 42, 56]:
+            usages.extend([bound * 1000 - 1, bound * 1000 - 0.001, bound * 1000, bound * 1000 + 0.001, bound * 1000 + 1])
+
+        prices = get_prices_over_14_m3(np.array(usages))
+
+        for usage, price in zip(usages, prices):
+            with self.subTest(usage=usage):
+                self.assertEqual(price, get_price_over_14_m3(usage))
+
+    def test_get_prices_over_14_m3_negative_usage(self) -> None:
+        with self.assertRaises(ValueError):
+            get_prices_over_14_m3(np.array([1000, -1]))
+
     def test_round_price(self) -> None:
         to_test = [
             [0, 0],
@@ -55,3 +97,14 @@ class TestFunctions(TestCase):
         for i in to_test:
             with self.subTest(i=i):
                 self.assertEqual(round_price(i[0]), i[1])
+
+    def test_round_prices(self) -> None:
+        prices = [0, 1, 99, 100, 153, 978, 8649, 8650, 8651, 9980, 14500, 14560, 112120, 260800]
+        self.assertListEqual(round_prices(np.array(prices)).tolist(), [round_price(i) for i in prices])
+
+    def test_round_price_equivalence_with_legacy(self) -> None:
+        prices = range(10 ** 7 + 1)
+        legacy = np.fromiter(map(legacy_round_price, prices), dtype=np.int64, count=len(prices))
+
+        np.testing.assert_array_equal(np.fromiter(map(round_price, prices), dtype=np.int64, count=len(prices)), legacy)
+        np.testing.assert_array_equal(round_prices(np.arange(len(prices))), legacy)
@@ -0,0 +1,63 @@
+from django.test import TestCase
+
+from building import instrumentation, tariffs
+
+import jdatetime
+
+from test_building_admin import create_submeter_calculator
+
+
+class TestInstrumentation(TestCase):
+
+    def setUp(self) -> None:
+        self.runs = []
+        self.sc = create_submeter_calculator(units=6)
+        # Loaded tariffs only check their version
+        tariffs.get_tariff(jdatetime.date(1401, 6, 1))
+
+    def collect(self) -> None:
+        instrumentation.add_collector(self.runs.append)
+        self.addCleanup(instrumentation.remove_collector, self.runs.append)
+
+    def test_disabled_without_collectors(self) -> None:
+        current_run = instrumentation.run('test')
+        self.assertIs(current_run, instrumentation._NULL_RUN)
+        self.assertIs(current_run.span('load'), current_run)
+
+        self.sc.calculate_submeter_prices()
+        self.assertEqual(self.runs, [])
+
+    def test_calculate_submeter_prices_run(self) -> None:
+        self.collect()
+        self.sc.calculate_submeter_prices()
+
+        current_run, = self.runs
+        self.assertEqual(current_run.name, 'calculate_submeter_prices')
+        self.assertEqual(current_run.units, 6)
+        self.assertListEqual(list(current_run.phases), ['load', 'reconcile', 'compute', 'persist'])
+        self.assertEqual(current_run.phases['load']['queries'], 4)
+        self.assertEqual(current_run.phases['compute']['queries'], 0)
+        self.assertGreaterEqual(current_run.queries, sum(phase['queries'] for phase in current_run.phases.values()))
+        self.assertGreaterEqual(current_run.seconds, sum(phase['seconds'] for phase in current_run.phases.values()))
+        self.assertIsNone(current_run.error)
+
+    def test_failed_run_is_collected(self) -> None:
+        self.collect()
+        self.sc.current_usage.unit_usages.filter(unit=1).delete()
+
+        with self.assertRaises(Exception):
+            self.sc.preview_submeter_prices()
+
+        current_run, = self.runs
+        self.assertEqual(current_run.name, 'preview_submeter_prices')
+        self.assertIn('ValidationError', current_run.error)
+
+    def test_failing_collector_does_not_break_calculation(self) -> None:
+        def broken_collector(current_run):
+            raise RuntimeError
+
+        instrumentation.add_collector(broken_collector)
+        self.addCleanup(instrumentation.remove_collector, broken_collector)
+
+        with self.assertLogs('building.instrumentation', 'ERROR'):
+            self.sc.preview_submeter_prices()
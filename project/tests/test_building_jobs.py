@@ -0,0 +1,90 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from building.jobs import enqueue_calculation, claim_next_job, run_job, run_pending_jobs
+from building.models import CalculationJob, Result
+
+from test_building_admin import create_submeter_calculator
+
+
+class TestCalculationJobs(TestCase):
+
+    def setUp(self) -> None:
+        self.sc = create_submeter_calculator()
+
+    def test_enqueue_reuses_unfinished_job(self) -> None:
+        job = enqueue_calculation(self.sc)
+        self.assertEqual(job.status, CalculationJob.PENDING)
+        self.assertEqual(enqueue_calculation(self.sc), job)
+        self.assertNotEqual(enqueue_calculation(self.sc, force=True), job)
+
+        job.status = CalculationJob.DONE
+        job.save()
+        self.assertNotEqual(enqueue_calculation(self.sc), job)
+
+    @override_settings(CALCULATION_JOB_TIMEOUT=60)
+    def test_stale_running_job_is_failed(self) -> None:
+        job = enqueue_calculation(self.sc)
+        claim_next_job()
+        self.assertEqual(enqueue_calculation(self.sc), job)
+
+        # Worker died a while after claiming the job
+        CalculationJob.objects.filter(id=job.id).update(started=timezone.now() - timedelta(seconds=61))
+        new_job = enqueue_calculation(self.sc)
+        self.assertNotEqual(new_job, job)
+        job.refresh_from_db()
+        self.assertEqual(job.status, CalculationJob.FAILED)
+        self.assertIsNotNone(job.finished)
+        self.assertIn('60 seconds', job.error)
+
+        self.assertEqual(run_pending_jobs(), 1)
+        new_job.refresh_from_db()
+        self.assertEqual(new_job.status, CalculationJob.DONE)
+
+    def test_claim_next_job(self) -> None:
+        first = enqueue_calculation(self.sc)
+        second = enqueue_calculation(create_submeter_calculator(name='G1'))
+
+        claimed = claim_next_job()
+        self.assertEqual(claimed, first)
+        self.assertEqual(claimed.status, CalculationJob.RUNNING)
+        self.assertIsNotNone(claimed.started)
+
+        self.assertEqual(claim_next_job(), second)
+        self.assertIsNone(claim_next_job())
+
+    def test_run_job(self) -> None:
+        enqueue_calculation(self.sc)
+        job = run_job(claim_next_job())
+        job.refresh_from_db()
+
+        self.assertEqual(job.status, CalculationJob.DONE)
+        self.assertEqual(job.result, Result.objects.get(submeter_calculator=self.sc))
+        self.assertIsNotNone(job.finished)
+        self.assertGreater(job.duration, 0)
+        self.assertIsNone(job.error)
+
+    def test_run_job_failure(self) -> None:
+        self.sc.current_usage.unit_usages.filter(unit=2).delete()
+        enqueue_calculation(self.sc)
+        job = run_job(claim_next_job())
+        job.refresh_from_db()
+
+        self.assertEqual(job.status, CalculationJob.FAILED)
+        self.assertIsNone(job.result)
+        self.assertEqual(job.error, 'current usage has no reading for units [2]')
+
+    def test_worker_command(self) -> None:
+        enqueue_calculation(self.sc)
+        enqueue_calculation(create_submeter_calculator(name='G1'))
+
+        out = StringIO()
+        call_command('calculation_worker', '--burst', stdout=out)
+
+        self.assertEqual(out.getvalue().strip(), '2 calculation jobs done')
+        self.assertEqual(CalculationJob.objects.filter(status=CalculationJob.DONE).count(), 2)
+        self.assertEqual(Result.objects.count(), 2)
@@ -1,13 +1,17 @@
 import datetime
+import json
 from math import ceil
 
 from django.test import TestCase
 from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
 from django.db.models import Sum
 from django.conf import settings
 
 from building.models import Building, Debt, Usage, UnitUsage, WaterBill, GasBill, SubmeterCalculator, ExtraCharge, Result, UnitResult
 from building.functions import round_price, get_price_over_14_m3
+from building import tariffs
+from building.calculation import fingerprint_inputs, pack_details, unpack_details, unpack_extra_prices
 
 import jdatetime
 from freezegun import freeze_time
@@ -136,6 +140,13 @@ class TestUnitUsageModel(TestCase):
         unit_usage = UnitUsage.objects.create(usage=self.month7_usage, unit=15, amount=1250)
         self.assertEqual(str(unit_usage), '15')
 
+    def test_duplicate_unit(self) -> None:
+        UnitUsage.objects.create(usage=self.month7_usage, unit=15, amount=1250)
+        with self.assertRaises(ValidationError):
+            UnitUsage(usage=self.month7_usage, unit=15, amount=1300).full_clean()
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            UnitUsage.objects.create(usage=self.month7_usage, unit=15, amount=1300)
+
 
 class TestWaterBill(TestCase):
 
@@ -551,6 +562,111 @@ class SubmeterCalculatorTest(TestCase):
                 self.assertEqual(unit_result.debt, unit_debt)
                 self.assertEqual(unit_result.total_payment, price_with_ratio_list[i]+extra_prices+unit_debt)
     
+    def test_calculate_submeter_prices_reuses_result_of_same_inputs(self) -> None:
+        first = self.sc.calculate_submeter_prices()['result_object']
+
+        second = self.sc.calculate_submeter_prices()['result_object']
+        self.assertEqual(second, first)
+        self.assertEqual(self.sc.results.filter(input_fingerprint=first.input_fingerprint).count(), 1)
+
+        # Forced
+        forced = self.sc.calculate_submeter_prices(force=True)['result_object']
+        self.assertNotEqual(forced, first)
+        self.assertEqual(forced.input_fingerprint, first.input_fingerprint)
+
+    def test_calculate_submeter_prices_fingerprint_changes_with_inputs(self) -> None:
+        first = self.sc.calculate_submeter_prices()['result_object']
+
+        Debt.objects.create(submeter_calculator=self.sc, unit=3, amount=1000)
+        with_debt = self.sc.calculate_submeter_prices()['result_object']
+        self.assertNotEqual(with_debt.input_fingerprint, first.input_fingerprint)
+
+        self.cur_usage.unit_usages.filter(unit=5).update(amount=4866568)
+        with_reading = self.sc.calculate_submeter_prices()['result_object']
+        self.assertNotIn(with_reading.input_fingerprint, [first.input_fingerprint, with_debt.input_fingerprint])
+
+        self.water_bill.water_consumption_price += 100
+        self.water_bill.save()
+        with_bill = self.sc.calculate_submeter_prices()['result_object']
+        self.assertEqual(self.sc.results.exclude(input_fingerprint=None).values('input_fingerprint').distinct().count(), 4)
+        self.assertEqual(with_bill.unit_results.count(), 16)
+
+    def test_recalculate_result_updates_changed_rows_only(self) -> None:
+        result_object = self.sc.calculate_submeter_prices()['result_object']
+        before = {ur.unit: ur for ur in result_object.unit_results.all()}
+
+        Debt.objects.create(submeter_calculator=self.sc, unit=3, amount=1000)
+        details = result_object.recalculate()
+
+        self.assertEqual(details['changed_units'], [3])
+        after = {ur.unit: ur for ur in result_object.unit_results.all()}
+        self.assertEqual([ur.id for ur in after.values()], [ur.id for ur in before.values()])
+        self.assertEqual(after[3].debt, 1000)
+        self.assertEqual(after[3].total_payment, before[3].total_payment + 1000)
+
+        result_object.refresh_from_db()
+        self.assertEqual(result_object.input_fingerprint, fingerprint_inputs(self.sc.load_calculation_inputs()))
+        self.assertEqual(result_object.submeter_calculator_details['debts'], {'1': 5000, '3': 1000, '9': 97500, '14': 246200})
+
+    def test_recalculate_result_reading_changes_every_price(self) -> None:
+        result_object = self.sc.calculate_submeter_prices()['result_object']
+
+        # Ratio depends on sum of prices so one reading may change other units too
+        self.cur_usage.unit_usages.filter(unit=5).update(amount=4966567)
+        details = result_object.recalculate()
+
+        self.assertIn(5, details['changed_units'])
+        self.assertListEqual(list(result_object.unit_results.values_list('price', flat=True)), details['price_with_ratio_list'])
+
+    def test_preview_submeter_prices(self) -> None:
+        results_count = Result.objects.count()
+        unit_results_count = UnitResult.objects.count()
+
+        calculation = self.sc.preview_submeter_prices()
+
+        self.assertEqual(Result.objects.count(), results_count)
+        self.assertEqual(UnitResult.objects.count(), unit_results_count)
+
+        calculated_dict = self.sc.calculate_submeter_prices()
+        result_object = calculated_dict.pop('result_object')
+        self.assertDictEqual(calculation.details(), calculated_dict)
+        self.assertListEqual(
+            [(u.unit, u.usage_amount, u.price, u.debt, u.total_payment) for u in calculation.units],
+            list(result_object.unit_results.values_list('unit', 'usage_amount', 'price', 'debt', 'total_payment')),
+        )
+
+    def test_preview_submeter_prices_is_immutable(self) -> None:
+        calculation = self.sc.preview_submeter_prices()
+        with self.assertRaises(AttributeError):
+            calculation.price_list = ()
+        with self.assertRaises(AttributeError):
+            calculation.units[0].price = 0
+        with self.assertRaises(AttributeError):
+            calculation.units[0].note = ''
+
+    def test_result_details_are_packed(self) -> None:
+        calculation = self.sc.preview_submeter_prices()
+        result_id = self.sc.calculate_submeter_prices()['result_object'].id
+        stored = json.loads(json.dumps(calculation.details()))
+
+        result_object = Result.objects.get(id=result_id)
+        self.assertLess(len(result_object.packed_details), len(json.dumps(stored)) / 2)
+        self.assertIsNone(result_object._unpacked)
+        self.assertEqual(unpack_extra_prices(result_object.packed_details), calculation.extra_prices)
+        self.assertDictEqual(result_object.submeter_calculator_details, stored)
+        self.assertIs(result_object.submeter_calculator_details, result_object.submeter_calculator_details)
+
+        result_object.submeter_calculator_details = None
+        self.assertIsNone(result_object.packed_details)
+        self.assertIsNone(result_object.submeter_calculator_details)
+
+    def test_details_of_other_shapes_are_kept(self) -> None:
+        details = self.sc.preview_submeter_prices().details()
+        for other in ({'note': 'old'}, {**details, 'price_list': [1.5]}, {**details, 'debts': {'1': -5}}):
+            with self.subTest(other=other):
+                self.assertDictEqual(unpack_details(pack_details(other)), json.loads(json.dumps(other)))
+        self.assertIsNone(unpack_details(pack_details(None)))
+
     def test_str_magic_method(self) -> None:
         self.assertEqual(str(self.sc), 'calculate %s bill' % self.water_bill.issuance_date)
 
@@ -621,3 +737,136 @@ class SubmeterCalculatorTest(TestCase):
     def test_unit_result_str_magic_method(self) -> None:
         unit_result = self.unit_results[0]
         self.assertEqual(str(unit_result), str(unit_result.unit))
+
+
+class SubmeterCalculatorLoadingTest(TestCase):
+
+    jalali_date = jdatetime.date(1401, 6, 1)
+
+    def setUp(self) -> None:
+        # Compiled tariffs are loaded once per process, keep them out of the count
+        tariffs.clear_cache()
+        tariffs.get_tariff(self.jalali_date)
+
+    def create_submeter_calculator(self, units: int) -> SubmeterCalculator:
+        building = Building.objects.create(name='B%d' % units, units=units)
+        pre_usage = Usage.objects.create(building=building, register_date=jdatetime.date(1401, 4, 10))
+        cur_usage = Usage.objects.create(building=building, register_date=jdatetime.date(1401, 5, 19))
+
+        unit_usage_objects = []
+        for unit in range(1, units + 1):
+            unit_usage_objects.append(UnitUsage(usage=pre_usage, unit=unit, amount=1000000 + unit))
+            unit_usage_objects.append(UnitUsage(usage=cur_usage, unit=unit, amount=1000000 + unit * 500))
+        UnitUsage.objects.bulk_create(unit_usage_objects)
+
+        water_bill = WaterBill.objects.create(building=building, issuance_date=self.jalali_date,
+                                              current_reading=self.jalali_date, payment_deadline=self.jalali_date,
+                                              water_consumption_price=695800, total_payment=1227700)
+        gas_bill = GasBill.objects.create(building=building, issuance_date=self.jalali_date,
+                                          current_reading=self.jalali_date, payment_deadline=self.jalali_date,
+                                          total_payment=339300)
+        sc = SubmeterCalculator.objects.create(water_bill=water_bill, gas_bill=gas_bill,
+                                               previous_usage=pre_usage, current_usage=cur_usage)
+        ExtraCharge.objects.create(submeter_calculator=sc, title='charge', amount=30000)
+        Debt.objects.bulk_create([Debt(submeter_calculator=sc, unit=unit, amount=1000) for unit in range(1, units + 1, 3)])
+        return sc
+
+    def test_load_calculation_inputs_query_count_is_constant(self) -> None:
+        for units in [4, 64, 1024]:
+            with self.subTest(units=units):
+                sc = SubmeterCalculator.objects.get(id=self.create_submeter_calculator(units).id)
+                # Calculators, readings and debts, plus version of tariff data
+                with self.assertNumQueries(4):
+                    inputs = sc.load_calculation_inputs()
+
+                self.assertEqual(inputs.units, tuple(range(1, units + 1)))
+                self.assertEqual(inputs.usages, tuple(unit * 499 for unit in range(1, units + 1)))
+                self.assertEqual(inputs.extra_prices, sc.sum_of_tax_and_extra_prices)
+                self.assertDictEqual(inputs.debts, dict(sc.debts.values_list('unit', 'amount')))
+
+    def test_load_calculation_inputs_pairs_readings_by_unit(self) -> None:
+        sc = self.create_submeter_calculator(4)
+        # Reverse insertion order of current readings
+        amounts = list(sc.current_usage.unit_usages.values_list('unit', 'amount'))
+        sc.current_usage.unit_usages.all().delete()
+        UnitUsage.objects.bulk_create([UnitUsage(usage=sc.current_usage, unit=unit, amount=amount) for unit, amount in reversed(amounts)])
+
+        self.assertEqual(sc.load_calculation_inputs().usages, (499, 998, 1497, 1996))
+
+    def test_load_calculation_inputs_missing_unit(self) -> None:
+        sc = self.create_submeter_calculator(4)
+        sc.current_usage.unit_usages.filter(unit=3).update(unit=5)
+
+        with self.assertRaises(ValidationError) as context_manager:
+            sc.load_calculation_inputs()
+        self.assertEqual(context_manager.exception.message_dict.get('previous_usage'),
+                         ['previous usage has no reading for units [5]'])
+
+    def test_load_calculation_inputs_decreased_reading(self) -> None:
+        sc = self.create_submeter_calculator(4)
+        sc.current_usage.unit_usages.filter(unit=2).update(amount=1)
+
+        with self.assertRaises(ValidationError) as context_manager:
+            sc.load_calculation_inputs()
+        self.assertEqual(context_manager.exception.message_dict.get('current_usage'),
+                         ['current reading is less than previous reading for units [2]'])
+
+
+class JalaliPeriodTest(TestCase):
+
+    def setUp(self) -> None:
+        self.building = Building.objects.create(name='H2', units=4)
+
+    def create_water_bill(self, issuance_date) -> WaterBill:
+        return WaterBill.objects.create(building=self.building, issuance_date=issuance_date, current_reading=issuance_date,
+                                        payment_deadline=issuance_date, water_consumption_price=1000, total_payment=2000)
+
+    def test_fields_follow_source_date(self) -> None:
+        usage = Usage.objects.create(building=self.building, register_date=jdatetime.date(1402, 7, 15))
+        self.assertEqual((usage.jalali_year, usage.jalali_month), (1402, 7))
+
+        # Gregorian dates are converted too
+        usage.register_date = datetime.date(2024, 3, 20)
+        usage.save()
+        usage.refresh_from_db()
+        self.assertEqual((usage.jalali_year, usage.jalali_month), (1403, 1))
+
+        usages = Usage.objects.bulk_create([Usage(building=self.building, register_date=jdatetime.date(1401, 12, 29))])
+        self.assertEqual(Usage.objects.filter(id=usages[0].id).values_list('jalali_year', 'jalali_month').get(), (1401, 12))
+
+    def test_result_follows_water_bill(self) -> None:
+        water_bill = self.create_water_bill(jdatetime.date(1402, 7, 1))
+        usage = Usage.objects.create(building=self.building, register_date=jdatetime.date(1402, 7, 1))
+        sc = SubmeterCalculator.objects.create(water_bill=water_bill, previous_usage=usage, current_usage=usage)
+        result = Result.objects.create(submeter_calculator=sc)
+        self.assertEqual((result.jalali_year, result.jalali_month), (1402, 7))
+
+        water_bill.issuance_date = jdatetime.date(1402, 8, 2)
+        water_bill.save()
+        result.refresh_from_db()
+        self.assertEqual((result.jalali_year, result.jalali_month), (1402, 8))
+
+        sc.water_bill = self.create_water_bill(jdatetime.date(1402, 9, 3))
+        sc.save()
+        result.refresh_from_db()
+        self.assertEqual((result.jalali_year, result.jalali_month), (1402, 9))
+
+    def test_queryset_api(self) -> None:
+        for month in (1401, 11), (1401, 12), (1402, 1), (1402, 7), (1402, 7):
+            self.create_water_bill(jdatetime.date(*month, 10))
+
+        self.assertEqual(WaterBill.objects.in_jalali_period(1402, 7).count(), 2)
+        self.assertEqual(WaterBill.objects.in_jalali_period(1402).count(), 3)
+        self.assertEqual(WaterBill.objects.in_jalali_periods((1401, 12), (1402, 7)).count(), 4)
+        self.assertEqual(WaterBill.objects.in_jalali_periods((1401, 11), (1401, 12)).count(), 2)
+        self.assertListEqual(WaterBill.objects.jalali_periods(), [(1402, 7), (1402, 1), (1401, 12), (1401, 11)])
+
+    def test_backfill_migration(self) -> None:
+        from importlib import import_module
+        from django.apps import apps
+
+        self.create_water_bill(jdatetime.date(1402, 7, 10))
+        WaterBill.objects.update(jalali_year=None, jalali_month=None)
+
+        import_module('building.migrations.0005_jalali_period_fields').backfill_jalali_periods(apps, None)
+        self.assertEqual(WaterBill.objects.values_list('jalali_year', 'jalali_month').get(), (1402, 7))
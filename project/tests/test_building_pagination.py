@@ -0,0 +1,103 @@
+from django.test import TestCase
+from django.urls import reverse
+
+from building.models import Building, Usage
+from building.pagination import EstimatedCountPaginator, KeysetPaginator
+
+from test_building_admin import AdminTestCase
+
+import jdatetime
+
+
+def create_usages(count: int) -> Building:
+    building = Building.objects.create(name='H2', units=4)
+    # Several usages share a date so ordering relies on pk too
+    Usage.objects.bulk_create([
+        Usage(building=building, register_date=jdatetime.date(1401, 1, 1) + jdatetime.timedelta(days=i // 3))
+        for i in range(count)
+    ])
+    return building
+
+
+class KeysetPaginatorTest(TestCase):
+
+    def setUp(self) -> None:
+        create_usages(25)
+        self.queryset = Usage.objects.order_by('-register_date', '-pk')
+
+    def test_keys(self) -> None:
+        self.assertListEqual(KeysetPaginator(self.queryset, 10).keys, [('register_date', True), ('id', True)])
+        self.assertListEqual(KeysetPaginator(Usage.objects.order_by('register_date'), 10).keys,
+                             [('register_date', False), ('id', True)])
+        # Related and nullable columns fall back to page numbers
+        self.assertIsNone(KeysetPaginator(Usage.objects.order_by('building__name'), 10).keys)
+        self.assertIsNone(KeysetPaginator(Usage.objects.order_by('?'), 10).keys)
+
+    def test_walk_forward_and_backward(self) -> None:
+        expected = list(self.queryset)
+
+        pages = [KeysetPaginator(self.queryset, 10).page(1)]
+        while pages[-1].has_next():
+            pages.append(KeysetPaginator(self.queryset, 10, cursor=pages[-1].next_cursor).page(1))
+        self.assertListEqual([len(page) for page in pages], [10, 10, 5])
+        self.assertListEqual([usage for page in pages for usage in page], expected)
+        self.assertFalse(pages[0].has_previous())
+        self.assertTrue(pages[-1].has_previous())
+
+        previous = KeysetPaginator(self.queryset, 10, cursor=pages[-1].previous_cursor).page(1)
+        self.assertListEqual(list(previous), list(pages[1]))
+        self.assertTrue(previous.has_next())
+        self.assertTrue(previous.has_previous())
+        first = KeysetPaginator(self.queryset, 10, cursor=previous.previous_cursor).page(1)
+        self.assertListEqual(list(first), list(pages[0]))
+        self.assertFalse(first.has_previous())
+
+    def test_deep_page_does_not_offset(self) -> None:
+        cursor = 'n%d' % list(self.queryset)[19].pk
+        with self.assertNumQueries(2):
+            page = KeysetPaginator(self.queryset, 10, cursor=cursor).page(1)
+            self.assertEqual(len(page), 5)
+
+    def test_invalid_cursor_starts_over(self) -> None:
+        for cursor in ('n999999', 'nx', 'x1', ''):
+            with self.subTest(cursor=cursor):
+                page = KeysetPaginator(self.queryset, 10, cursor=cursor).page(1)
+                self.assertListEqual(list(page), list(self.queryset[:10]))
+
+
+class EstimatedCountPaginatorTest(TestCase):
+
+    def test_capped_count(self) -> None:
+        create_usages(7)
+
+        paginator = EstimatedCountPaginator(Usage.objects.order_by('pk'), 2)
+        self.assertEqual(paginator.count, 7)
+        self.assertFalse(paginator.count_is_estimate)
+
+        paginator = EstimatedCountPaginator(Usage.objects.order_by('pk'), 2)
+        paginator.count_cap = 5
+        self.assertEqual(paginator.count, 5)
+        self.assertTrue(paginator.count_is_estimate)
+
+
+class KeysetChangelistTest(AdminTestCase):
+
+    def test_usage_changelist_pages_by_cursor(self) -> None:
+        create_usages(150)
+        url = reverse('admin:building_usage_changelist')
+
+        response = self.client.get(url)
+        cl = response.context['cl']
+        self.assertEqual(len(cl.result_list), 100)
+        self.assertFalse(cl.keyset_page.has_previous())
+        self.assertContains(response, '150 usages')
+
+        response = self.client.get(url + cl.next_page_url)
+        self.assertEqual(response.status_code, 200)
+        cl = response.context['cl']
+        self.assertEqual(len(cl.result_list), 50)
+        self.assertIsNone(cl.next_page_url)
+        self.assertEqual(response.context['cl'].get_query_string({'o': '1'}), '?o=1')
+
+        response = self.client.get(url + cl.previous_page_url)
+        self.assertEqual(len(response.context['cl'].result_list), 100)
@@ -0,0 +1,108 @@
+import os
+import shutil
+import tempfile
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import get_template
+from django.test import override_settings
+from django.urls import reverse
+
+from building.models import GasBill, ExtraCharge, Debt, Result, UnitResult
+from building.printing import INTEGRITY, printable_results, render_printable_result, get_printable_result_html
+
+from test_building_admin import AdminTestCase, create_submeter_calculator
+
+
+class PrintableResultTest(AdminTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+        self.sc = create_submeter_calculator(units=8)
+        water_bill = self.sc.water_bill
+        self.sc.gas_bill = GasBill.objects.create(building=water_bill.building, issuance_date=water_bill.issuance_date,
+                                                  current_reading=water_bill.current_reading,
+                                                  payment_deadline=water_bill.payment_deadline, total_payment=800000)
+        self.sc.save()
+        ExtraCharge.objects.create(submeter_calculator=self.sc, title='cleaning', amount=50000)
+        Debt.objects.create(submeter_calculator=self.sc, unit=2, amount=12000)
+        self.result = self.sc.calculate_submeter_prices()['result_object']
+
+    def test_render_queries(self) -> None:
+        # Result with calculator, bills and building, then unit results, extra charges and debts
+        with self.assertNumQueries(4):
+            html = render_printable_result(printable_results().get(id=self.result.id))
+        self.assertIn('cleaning', html)
+
+    def test_assets_are_self_hosted(self) -> None:
+        html = render_printable_result(printable_results().get(id=self.result.id))
+        self.assertNotIn('https://', html)
+        self.assertIn('/static/bootstrap/css/bootstrap.min.css', html)
+        for integrity in INTEGRITY.values():
+            self.assertIn('integrity="%s" crossorigin="anonymous"' % integrity, html)
+
+    def test_cached_html(self) -> None:
+        html = get_printable_result_html(self.result.id)
+        # Only version of result is read
+        with self.assertNumQueries(1):
+            self.assertEqual(get_printable_result_html(self.result.id), html)
+
+    def test_cache_invalidation(self) -> None:
+        def edit_extra_charge():
+            ExtraCharge.objects.filter(submeter_calculator=self.sc).get().save()
+
+        def edit_unit_result():
+            UnitResult.objects.filter(result=self.result).first().save()
+
+        def edit_building():
+            self.sc.water_bill.building.save()
+
+        def edit_result():
+            self.result.save()
+
+        def edit_in_other_process():
+            # Cache of this process knows nothing about it, version in database is enough
+            Result.objects.filter(id=self.result.id).update(version=uuid4())
+
+        for edit in (edit_extra_charge, edit_unit_result, edit_building, edit_result, edit_in_other_process):
+            with self.subTest(edit=edit.__name__):
+                get_printable_result_html(self.result.id)
+                edit()
+                with self.assertNumQueries(5):
+                    get_printable_result_html(self.result.id)
+
+    def test_cache_of_previous_deploy(self) -> None:
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        os.makedirs(os.path.join(directory, 'building'))
+        with open(os.path.join(directory, 'building', 'printable_result.html'), 'w') as file:
+            file.write(get_template('building/printable_result.html').template.source + '<!-- new deploy -->')
+        templates = [{**settings.TEMPLATES[0], 'DIRS': [directory, *settings.TEMPLATES[0]['DIRS']]}]
+
+        for deploy in (override_settings(TEMPLATES=templates), override_settings(STATIC_URL='/new-static/')):
+            with self.subTest(deploy=deploy.options):
+                get_printable_result_html(self.result.id)
+                with deploy, self.assertNumQueries(5):
+                    html = get_printable_result_html(self.result.id)
+                self.assertNotEqual(html, get_printable_result_html(self.result.id))
+
+        with override_settings(TEMPLATES=templates):
+            self.assertIn('<!-- new deploy -->', get_printable_result_html(self.result.id))
+
+    def test_printable_result_view(self) -> None:
+        url = reverse('admin:building_result_printable_result', args=[self.result.id])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'cleaning')
+
+        debt = Debt.objects.get(submeter_calculator=self.sc)
+        debt.amount = 987654
+        debt.save()
+        self.assertContains(self.client.get(url), '۹۸۷,۶۵۴')
+
+        url = reverse('admin:building_result_printable_result', args=[self.result.id + 1])
+        self.assertEqual(self.client.get(url).status_code, 404)
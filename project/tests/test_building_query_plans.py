@@ -0,0 +1,105 @@
+import re
+from io import StringIO
+
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connections
+from django.test import RequestFactory, TestCase
+
+from building.models import Debt, Result, SubmeterCalculator, UnitResult, UnitUsage, Usage, WaterBill
+
+import jdatetime
+
+
+# Lines of a query plan that read every row of a table
+SEQUENTIAL_SCAN = {
+    'sqlite': re.compile(r'\bSCAN (?:TABLE )?(\w+)'),
+    'postgresql': re.compile(r'\bSeq Scan on (\w+)'),
+}
+# Lines of a query plan that read a table in index order, PostgreSQL names them index scans already
+INDEX_WALK = {
+    'sqlite': re.compile(r'\bSCAN (?:TABLE )?\w+ USING (?:COVERING )?INDEX \w+'),
+}
+# Lines of a query plan that sort rows instead of reading them in index order
+SORT = {
+    'sqlite': re.compile(r'TEMP B-TREE FOR (?:RIGHT PART OF )?ORDER BY'),
+    'postgresql': re.compile(r'\bSort\b'),
+}
+
+
+def query_plan(queryset) -> str:
+    """
+    Plan of queryset, PostgreSQL is told to avoid sequential scans so one is chosen only if no index can be used
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.explain()
+    with connection.cursor() as cursor:
+        cursor.execute('SET enable_seqscan = off')
+        try:
+            return queryset.explain()
+        finally:
+            cursor.execute('RESET enable_seqscan')
+
+
+class QueryPlanTestCase(TestCase):
+
+    def assertNoSequentialScan(self, queryset, allow_sort: bool = True) -> None:
+        """
+        Fail if a table of queryset is read row by row, or rows are sorted when allow_sort is False
+        """
+        vendor = connections[queryset.db].vendor
+        if vendor not in SEQUENTIAL_SCAN:
+            self.skipTest('query plans of %s are not checked' % vendor)
+        plan = query_plan(queryset)
+        if queryset.query.high_mark is not None and vendor in INDEX_WALK:
+            # Walking an index in order stops after the limit
+            plan = INDEX_WALK[vendor].sub('', plan)
+        tables = SEQUENTIAL_SCAN[vendor].findall(plan)
+        self.assertFalse(tables, 'sequential scan of %s in plan of\n%s\n%s' % (', '.join(tables), queryset.query, plan))
+        if not allow_sort:
+            self.assertIsNone(SORT[vendor].search(plan), 'sort in plan of\n%s\n%s' % (queryset.query, plan))
+
+
+class HotQueryPlanTest(QueryPlanTestCase):
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        call_command('seed_synthetic', '--buildings', '4', '--units', '8', '--periods', '6', stdout=StringIO())
+        call_command('calculate_all', stdout=StringIO())
+        cls.usage = Usage.objects.order_by('id').first()
+        cls.result = Result.objects.order_by('id').first()
+        cls.sc = cls.result.submeter_calculator
+
+    def test_detects_sequential_scan(self) -> None:
+        with self.assertRaises(AssertionError):
+            self.assertNoSequentialScan(UnitUsage.objects.filter(amount=1))
+        with self.assertRaises(AssertionError):
+            self.assertNoSequentialScan(Usage.objects.filter(building=self.usage.building_id).order_by('last_update'),
+                                        allow_sort=False)
+
+    def test_unit_rows(self) -> None:
+        self.assertNoSequentialScan(UnitUsage.objects.filter(usage=self.usage, unit=3))
+        self.assertNoSequentialScan(UnitUsage.objects.filter(usage_id__in=[self.usage.id]).values_list('usage_id', 'unit', 'amount'))
+        self.assertNoSequentialScan(self.result.unit_results.all(), allow_sort=False)
+        self.assertNoSequentialScan(UnitResult.objects.filter(result=self.result, unit=3))
+        self.assertNoSequentialScan(Debt.objects.filter(submeter_calculator_id__in=[self.sc.id]).values_list('unit', 'amount'))
+
+    def test_building_history(self) -> None:
+        building = self.usage.building_id
+        self.assertNoSequentialScan(Usage.objects.filter(building=building, register_date__lt=jdatetime.date(1405, 1, 1))
+                                    .order_by('-register_date'), allow_sort=False)
+        self.assertNoSequentialScan(WaterBill.objects.filter(building=building).order_by('-issuance_date'), allow_sort=False)
+        self.assertNoSequentialScan(Result.objects.in_jalali_period(1402, 7))
+
+    def test_keyset_changelists(self) -> None:
+        request = RequestFactory().get('/')
+        request.user = User.objects.create_superuser(username='admin', password='admin')
+        for model in (Usage, SubmeterCalculator, Result):
+            with self.subTest(model=model.__name__):
+                paginator = admin.site._registry[model].get_changelist_instance(request).paginator
+                values = model.objects.values_list(*(attname for attname, _ in paginator.keys)).order_by('id').first()
+                self.assertNoSequentialScan(paginator.keyset_queryset(), allow_sort=False)
+                self.assertNoSequentialScan(paginator.keyset_queryset(values), allow_sort=False)
+                self.assertNoSequentialScan(paginator.keyset_queryset(values, backward=True), allow_sort=False)
@@ -0,0 +1,142 @@
+import datetime
+import io
+
+from django.core.exceptions import ValidationError
+from django.test import TestCase
+
+from building.models import Building, Usage, UnitUsage
+from building.readings import ReadingImporter, read_rows
+
+import jdatetime
+import openpyxl
+
+
+def csv_file(*lines) -> io.BytesIO:
+    return io.BytesIO('\n'.join(('building,date,unit,liters',) + lines).encode())
+
+
+class ReadRowsTest(TestCase):
+
+    def test_csv(self) -> None:
+        file = io.BytesIO('﻿Unit, Liters ,Building,Date,note\n1,100,H2,1402-07-01,x\n\n2,200,H2,1402-07-01\n'.encode())
+        self.assertListEqual(list(read_rows(file, 'readings.CSV')), [
+            (2, {'building': 'H2', 'date': '1402-07-01', 'unit': '1', 'liters': '100'}),
+            (4, {'building': 'H2', 'date': '1402-07-01', 'unit': '2', 'liters': '200'}),
+        ])
+        self.assertFalse(file.closed)
+
+    def test_xlsx(self) -> None:
+        workbook = openpyxl.Workbook()
+        workbook.active.append(['building', 'date', 'unit', 'liters'])
+        workbook.active.append([3, datetime.date(2023, 9, 23), 1, 100.0])
+        file = io.BytesIO()
+        workbook.save(file)
+        file.seek(0)
+        self.assertListEqual(list(read_rows(file, 'readings.xlsx')), [
+            (2, {'building': 3, 'date': datetime.datetime(2023, 9, 23), 'unit': 1, 'liters': 100}),
+        ])
+
+    def test_invalid_file(self) -> None:
+        with self.assertRaises(ValidationError):
+            list(read_rows(io.BytesIO(b''), 'readings.txt'))
+        with self.assertRaises(ValidationError):
+            list(read_rows(io.BytesIO(b'building,date,unit\n'), 'readings.csv'))
+
+
+class ReadingImporterTest(TestCase):
+
+    def setUp(self) -> None:
+        self.building = Building.objects.create(name='H2', units=3)
+        usage = Usage.objects.create(building=self.building, register_date=jdatetime.date(1402, 6, 1))
+        UnitUsage.objects.bulk_create([UnitUsage(usage=usage, unit=unit, amount=1000) for unit in (1, 2, 3)])
+
+    def import_lines(self, *lines, chunk_size: int = 1000) -> ReadingImporter:
+        return ReadingImporter(chunk_size=chunk_size).import_file(csv_file(*lines), 'readings.csv')
+
+    def readings(self, register_date: jdatetime.date) -> dict:
+        return dict(UnitUsage.objects.filter(usage__building=self.building, usage__register_date=register_date)
+                    .values_list('unit', 'amount'))
+
+    def test_import(self) -> None:
+        for chunk_size in (1, 2, 1000):
+            with self.subTest(chunk_size=chunk_size):
+                Usage.objects.filter(register_date__gt=jdatetime.date(1402, 6, 1)).delete()
+                importer = self.import_lines(
+                    'H2,1402-07-01,1,1100', 'H2,1402-07-01,2,1200', '%d,1402/07/01,3,1300' % self.building.id,
+                    'H2,1402-08-01,1,1150', 'H2,1402-08-01,2,1250', 'H2,1402-08-01,3,1350',
+                    chunk_size=chunk_size,
+                )
+                self.assertEqual((importer.rows, importer.imported, importer.usages_created, importer.error_count), (6, 6, 2, 0))
+                self.assertDictEqual(self.readings(jdatetime.date(1402, 7, 1)), {1: 1100, 2: 1200, 3: 1300})
+                self.assertDictEqual(self.readings(jdatetime.date(1402, 8, 1)), {1: 1150, 2: 1250, 3: 1350})
+
+    def test_invalid_rows_are_skipped(self) -> None:
+        for chunk_size in (1, 1000):
+            with self.subTest(chunk_size=chunk_size):
+                Usage.objects.filter(register_date__gt=jdatetime.date(1402, 6, 1)).delete()
+                importer = self.import_lines(
+                    'H2,1402-07-01,1,1100',
+                    'H2,1402-07-01,1,1101',
+                    'H2,1402-07-01,4,1100',
+                    'H2,1402-07-01,2,900',
+                    'H3,1402-07-01,3,1300',
+                    'H2,1402-07-41,3,1300',
+                    'H2,1402-07-01,3,-5',
+                    'H2,1402-08-01,1,1050',
+                    'H2,1402-08-01,2,950',
+                    'H2,1402-08-01,3,1200',
+                    chunk_size=chunk_size,
+                )
+                self.assertEqual([line for line, _ in importer.errors], [3, 4, 5, 6, 7, 8, 9, 10])
+                # Repeated in same chunk or already imported from an earlier chunk
+                self.assertIn('unit 1 ', importer.errors[0][1])
+                self.assertIn('less than previous reading 1000', importer.errors[2][1])
+                self.assertIn('less than previous reading 1100', importer.errors[-2][1])
+                # Unit 2 has no valid reading on 1402-07-01 so it is checked against 1402-06-01
+                self.assertIn('less than previous reading 1000', importer.errors[-1][1])
+                self.assertDictEqual(self.readings(jdatetime.date(1402, 7, 1)), {1: 1100})
+                self.assertDictEqual(self.readings(jdatetime.date(1402, 8, 1)), {3: 1200})
+
+    def test_adds_to_existing_usage(self) -> None:
+        usage = Usage.objects.create(building=self.building, register_date=jdatetime.date(1402, 7, 1))
+        UnitUsage.objects.create(usage=usage, unit=1, amount=1100)
+
+        importer = self.import_lines('H2,1402-07-01,1,1100', 'H2,1402-07-01,2,1200')
+        self.assertEqual((importer.imported, importer.usages_created), (1, 0))
+        self.assertIn('already has a reading', importer.errors[0][1])
+        self.assertDictEqual(dict(usage.unit_usages.values_list('unit', 'amount')), {1: 1100, 2: 1200})
+
+    def test_backdated_reading_is_checked_against_next_reading(self) -> None:
+        usage = Usage.objects.create(building=self.building, register_date=jdatetime.date(1402, 8, 1))
+        UnitUsage.objects.bulk_create([UnitUsage(usage=usage, unit=unit, amount=1200) for unit in (1, 2)])
+
+        importer = self.import_lines('H2,1402-07-01,1,1300', 'H2,1402-07-01,2,1100', 'H2,1402-07-01,3,5000')
+        self.assertIn('greater than next reading 1200', importer.errors[0][1])
+        self.assertEqual(len(importer.errors), 1)
+        # Unit 3 has no later reading
+        self.assertDictEqual(self.readings(jdatetime.date(1402, 7, 1)), {2: 1100, 3: 5000})
+
+    def test_stored_reading_between_imported_dates(self) -> None:
+        usage = Usage.objects.create(building=self.building, register_date=jdatetime.date(1402, 7, 15))
+        UnitUsage.objects.create(usage=usage, unit=1, amount=5000)
+
+        importer = self.import_lines('H2,1402-07-01,1,1100', 'H2,1402-08-01,1,4000', 'H2,1402-08-01,2,1200')
+        self.assertEqual([line for line, _ in importer.errors], [3])
+        self.assertIn('less than previous reading 5000', importer.errors[0][1])
+        self.assertDictEqual(self.readings(jdatetime.date(1402, 7, 1)), {1: 1100})
+        self.assertDictEqual(self.readings(jdatetime.date(1402, 8, 1)), {2: 1200})
+
+    def test_queries_do_not_grow_with_dates(self) -> None:
+        lines = ['H2,1402-%02d-01,%d,%d' % (month, unit, 1000 + month * 100) for month in range(7, 13) for unit in (1, 2, 3)]
+        # Buildings, usages on dates of chunk, neighbouring readings of units, then usages and readings written in a savepoint
+        with self.assertNumQueries(7):
+            importer = self.import_lines(*lines)
+        self.assertEqual((importer.imported, importer.usages_created, importer.error_count), (18, 6, 0))
+
+    def test_queries_do_not_grow_with_rows(self) -> None:
+        building = Building.objects.create(name='H3', units=120)
+        lines = ['H3,1402-07-01,%d,%d' % (unit, unit * 100) for unit in range(1, 121)]
+        with self.assertNumQueries(7):
+            importer = self.import_lines(*lines)
+        self.assertEqual(importer.imported, 120)
+        self.assertEqual(UnitUsage.objects.filter(usage__building=building).count(), 120)
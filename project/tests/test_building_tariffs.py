@@ -0,0 +1,104 @@
+from decimal import Decimal
+from uuid import uuid4
+
+import numpy as np
+from django.test import TestCase
+from django.conf import settings
+
+from building import tariffs
+from building.functions import get_price_over_14_m3, get_prices_over_14_m3
+from building.models import City, CityCoefficient, TariffDataVersion, TariffSchedule, TariffBracket
+
+import jdatetime
+
+
+class TestCompiledTariff(TestCase):
+
+    usages = [0, 1, 356, 4999, 5000, 5001, 13999, 14000, 14001, 23456.789, 55999, 56000, 56001, 102480]
+
+    def test_builtin_tariff_price(self) -> None:
+        for usage in self.usages:
+            with self.subTest(usage=usage):
+                self.assertEqual(tariffs.BUILTIN_TARIFF.price(usage), get_price_over_14_m3(usage))
+
+    def test_builtin_tariff_prices(self) -> None:
+        np.testing.assert_array_equal(tariffs.BUILTIN_TARIFF.prices(np.array(self.usages)),
+                                      get_prices_over_14_m3(np.array(self.usages)))
+
+    def test_invalid_bounds(self) -> None:
+        with self.assertRaises(ValueError):
+            tariffs.CompiledTariff([10, 5], [1, 2, 3], [0, 0, 0], version='x')
+        with self.assertRaises(ValueError):
+            tariffs.CompiledTariff([5, 10], [1, 2], [0, 0], version='x')
+
+
+class TestTariffCache(TestCase):
+
+    def setUp(self) -> None:
+        tariffs.clear_cache()
+        self.addCleanup(tariffs.clear_cache)
+
+        self.schedule = TariffSchedule.objects.create(title='1401', valid_from=jdatetime.date(1401, 1, 1),
+                                                      valid_until=jdatetime.date(1401, 12, 29))
+        TariffBracket.objects.bulk_create([
+            TariffBracket(schedule=self.schedule, upper_bound=10, slope=3000, intercept=0),
+            TariffBracket(schedule=self.schedule, upper_bound=None, slope=6000, intercept=30000),
+        ])
+
+        self.city = City.objects.create(name='Tehran')
+        CityCoefficient.objects.create(city=self.city, coefficient=Decimal('1.49'), valid_from=jdatetime.date(1400, 1, 1),
+                                       valid_until=jdatetime.date(1400, 12, 29))
+        CityCoefficient.objects.create(city=self.city, coefficient=Decimal('1.62'), valid_from=jdatetime.date(1401, 1, 1))
+
+    def test_get_tariff(self) -> None:
+        tariff = tariffs.get_tariff(jdatetime.date(1401, 5, 19))
+        self.assertEqual(tariff.bounds, (10,))
+        self.assertEqual(tariff.price(10000), 30000)
+        self.assertEqual(tariff.price(12000), 42000)
+
+        # Outside of schedule validity
+        self.assertIs(tariffs.get_tariff(jdatetime.date(1402, 1, 1)), tariffs.BUILTIN_TARIFF)
+        self.assertIs(tariffs.get_tariff(jdatetime.date(1400, 12, 29)), tariffs.BUILTIN_TARIFF)
+
+    def test_get_city_coefficient(self) -> None:
+        self.assertEqual(tariffs.get_city_coefficient(self.city.id, jdatetime.date(1400, 6, 1)), 1.49)
+        self.assertEqual(tariffs.get_city_coefficient(self.city.id, jdatetime.date(1403, 6, 1)), 1.62)
+        self.assertEqual(tariffs.get_city_coefficient(self.city.id, jdatetime.date(1399, 6, 1)), settings.CITY_COEFFICIENT)
+        self.assertEqual(tariffs.get_city_coefficient(None, jdatetime.date(1401, 6, 1)), settings.CITY_COEFFICIENT)
+
+    def test_lookup_does_not_query_once_loaded(self) -> None:
+        tariffs.get_tariff(jdatetime.date(1401, 5, 19))
+        with self.assertNumQueries(0):
+            tariffs.get_tariff(jdatetime.date(1401, 5, 19))
+            tariffs.get_city_coefficient(self.city.id, jdatetime.date(1401, 5, 19))
+
+    def test_cache_invalidated_on_save_and_delete(self) -> None:
+        date = jdatetime.date(1401, 5, 19)
+        old_version = tariffs.get_tariff(date).version
+
+        self.schedule.brackets.filter(upper_bound=10).update(slope=1)
+        # Queryset update does not send signals
+        self.assertEqual(tariffs.get_tariff(date).version, old_version)
+
+        bracket = self.schedule.brackets.get(upper_bound=None)
+        bracket.slope = 7000
+        bracket.save()
+        self.assertNotEqual(tariffs.get_tariff(date).version, old_version)
+        self.assertEqual(tariffs.get_tariff(date).slopes, (1, 7000))
+
+        self.schedule.delete()
+        self.assertIs(tariffs.get_tariff(date), tariffs.BUILTIN_TARIFF)
+
+    def test_change_by_other_process(self) -> None:
+        date = jdatetime.date(1401, 5, 19)
+        old_version = tariffs.get_tariff(date).version
+        with self.assertNumQueries(1):
+            tariffs.refresh()
+        self.assertEqual(tariffs.get_tariff(date).version, old_version)
+
+        # Other process saved a bracket, which sends signals there only
+        self.schedule.brackets.filter(upper_bound=None).update(slope=7000)
+        TariffDataVersion.objects.update(version=uuid4())
+        self.assertEqual(tariffs.get_tariff(date).version, old_version)
+        tariffs.refresh()
+        self.assertEqual(tariffs.get_tariff(date).slopes[-1], 7000)
@@ -0,0 +1,192 @@
+from django.contrib.auth.models import Permission, User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from building.models import Result
+
+from test_building_admin import AdminTestCase, create_submeter_calculator
+
+
+def create_results(count: int, units: int = 2) -> list:
+    results = []
+    for _ in range(count):
+        submeter_calculator = create_submeter_calculator(units=units)
+        results.append(submeter_calculator.calculate_submeter_prices()['result_object'])
+    return results
+
+
+class ResultsApiTest(AdminTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.result = create_results(1)[0]
+        self.building = self.result.submeter_calculator.water_bill.building
+        self.url = reverse('building:api_building_results', args=[self.building.id])
+
+    def test_results(self) -> None:
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('private', response['Cache-Control'])
+        data = response.json()
+        self.assertIsNone(data['next'])
+        result = data['results'][0]
+        self.assertEqual(result['id'], self.result.id)
+        self.assertEqual(result['building'], {'id': self.building.id, 'name': 'H2'})
+        self.assertEqual(result['period'], '1401-06')
+        self.assertEqual(result['issuance_date'], '1401-06-01')
+        self.assertListEqual([unit['unit'] for unit in result['units']], [1, 2])
+        self.assertEqual(result['total_payment'], sum(unit['total_payment'] for unit in result['units']))
+
+        self.assertEqual(self.client.get(self.url, {'period': '1401-06'}).json()['results'][0]['id'], self.result.id)
+        self.assertListEqual(self.client.get(self.url, {'period': '1401-07'}).json()['results'], [])
+
+        response = self.client.get(reverse('building:api_result', args=[self.result.id]))
+        self.assertEqual(response.json(), result)
+
+    def test_not_modified(self) -> None:
+        etag = self.client.get(self.url)['ETag']
+        with self.assertNumQueries(4):  # session, user, building and ids and versions of page
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+        detail_url = reverse('building:api_result', args=[self.result.id])
+        response = self.client.get(detail_url, HTTP_IF_NONE_MATCH=self.client.get(detail_url)['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_etag_changes_with_shown_rows(self) -> None:
+        etag = self.client.get(self.url)['ETag']
+
+        unit_result = self.result.unit_results.get(unit=1)
+        unit_result.debt = 5000
+        unit_result.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['units'][0]['debt'], 5000)
+
+        etag = response['ETag']
+        self.building.name = 'H3'
+        self.building.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['building']['name'], 'H3')
+
+        # Saving a stale instance does not bring back an old version
+        etag = response['ETag']
+        self.result.save()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_etag_changes_on_recalculation(self) -> None:
+        detail_url = reverse('building:api_result', args=[self.result.id])
+        etags = [self.client.get(url)['ETag'] for url in (self.url, detail_url)]
+
+        submeter_calculator = self.result.submeter_calculator
+        unit_usage = submeter_calculator.current_usage.unit_usages.get(unit=1)
+        unit_usage.amount += 3000
+        unit_usage.save()
+        submeter_calculator.recalculate_result(self.result)
+
+        for url, etag in zip((self.url, detail_url), etags):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response['ETag'], etag)
+
+    def test_deleting_results_does_not_replace_versions(self) -> None:
+        results = create_results(2, units=4) + [self.result]
+        with CaptureQueriesContext(connection) as context:
+            Result.objects.filter(id__in=[result.id for result in results[1:]]).delete()
+            results[0].delete()
+        self.assertFalse(Result.objects.exists())
+        self.assertFalse([query for query in context.captured_queries if query['sql'].startswith('UPDATE "building_result"')])
+
+    def test_errors(self) -> None:
+        self.assertEqual(self.client.get(self.url, {'limit': 0}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'after': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'period': '1401'}).status_code, 400)
+        self.assertEqual(self.client.post(self.url).status_code, 405)
+        response = self.client.get(reverse('building:api_building_results', args=[self.building.id + 1]))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json(), {'detail': 'not found'})
+        self.assertEqual(self.client.get(reverse('building:api_result', args=[self.result.id + 1])).status_code, 404)
+
+
+class PagingApiTest(AdminTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.results = create_results(5)
+        # Every result in same building
+        building = self.results[0].submeter_calculator.water_bill.building
+        for result in self.results[1:]:
+            water_bill = result.submeter_calculator.water_bill
+            water_bill.building = building
+            water_bill.save()
+        self.building = building
+
+    def test_pages(self) -> None:
+        url = reverse('building:api_building_results', args=[self.building.id])
+        ids = []
+        params = {'limit': 2}
+        while True:
+            data = self.client.get(url, params).json()
+            ids += [result['id'] for result in data['results']]
+            if data['next'] is None:
+                break
+            params['after'] = data['next']
+        self.assertListEqual(ids, [result.id for result in reversed(self.results)])
+
+    def test_queries_do_not_grow_with_results(self) -> None:
+        url = reverse('building:api_building_results', args=[self.building.id])
+        with self.assertNumQueries(6):  # session, user, building, page, unit results and results
+            self.client.get(url, {'limit': 1})
+        with self.assertNumQueries(6):
+            self.client.get(url, {'limit': 5})
+
+    def test_unit_results(self) -> None:
+        url = reverse('building:api_unit_results', args=[self.building.id, 2])
+        data = self.client.get(url, {'limit': 3}).json()
+        self.assertListEqual([row['result'] for row in data['results']], [result.id for result in self.results[:1:-1]])
+        self.assertEqual(data['next'], self.results[2].id)
+        expected = self.results[4].unit_results.get(unit=2)
+        self.assertEqual(data['results'][0]['total_payment'], expected.total_payment)
+        self.assertEqual(data['results'][0]['period'], '1401-06')
+
+        data = self.client.get(url, {'limit': 3, 'after': data['next']}).json()
+        self.assertEqual(len(data['results']), 2)
+        self.assertIsNone(data['next'])
+
+    def test_bills(self) -> None:
+        url = reverse('building:api_water_bills', args=[self.building.id])
+        response = self.client.get(url, {'limit': 10})
+        bills = response.json()['bills']
+        self.assertEqual(len(bills), 5)
+        self.assertEqual(bills[0]['water_consumption_price'], 695800)
+        self.assertEqual(bills[0]['current_reading'], '1401-06-01')
+
+        water_bill = self.results[4].submeter_calculator.water_bill
+        water_bill.total_payment += 1
+        water_bill.save()
+        self.assertEqual(self.client.get(url, {'limit': 10}, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+        response = self.client.get(reverse('building:api_gas_bills', args=[self.building.id]))
+        self.assertEqual(response.json(), {'bills': [], 'next': None})
+
+
+class ApiPermissionTest(TestCase):
+
+    def setUp(self) -> None:
+        self.result = create_results(1)[0]
+        self.url = reverse('building:api_result', args=[self.result.id])
+
+    def test_permission(self) -> None:
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+        user = User.objects.create_user(username='viewer', password='viewer')
+        self.client.force_login(user)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+        user.user_permissions.add(Permission.objects.get(codename='view_result'))
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.assertEqual(Result.objects.count(), 1)
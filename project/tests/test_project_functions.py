@@ -1,6 +1,7 @@
 from django.test import TestCase
 from freezegun import freeze_time 
-from project.functions import (datetime, jdatetime, timezone,convert_to_jalali_date, convert_to_jalali_datetime, date_farsi_month_name, datetime_farsi_month_name)
+from project.functions import (datetime, jdatetime, timezone,convert_to_jalali_date, convert_to_jalali_datetime, date_farsi_month_name, datetime_farsi_month_name,
+                               _jalali_date, clear_jalali_caches)
 
 
 class TestFunctions(TestCase):
@@ -30,4 +31,12 @@ class TestFunctions(TestCase):
     def test_datetime_farsi_month_name_pass_gregorian(self):
         gregorian_datetime = timezone.now()
         self.assertEqual(datetime_farsi_month_name(gregorian_datetime), '6 شهریور 1401 - 15:35')
-    
\ No newline at end of file
+    
+
+    def test_conversions_are_memoized(self):
+        clear_jalali_caches()
+        for _ in range(3):
+            self.assertEqual(date_farsi_month_name(datetime.date(2022, 8, 28)), '6 شهریور 1401')
+            self.assertEqual(convert_to_jalali_date(datetime.datetime(2022, 8, 28, 10)), jdatetime.date(1401, 6, 6))
+        self.assertEqual(_jalali_date.cache_info().misses, 1)
+        self.assertEqual(_jalali_date.cache_info().hits, 5)
@@ -0,0 +1,58 @@
+import base64
+import hashlib
+import os
+import shutil
+import tempfile
+
+from django.contrib.staticfiles import finders
+from django.test import SimpleTestCase
+
+from building.printing import INTEGRITY
+from project.storage import StaticFilesStorage
+
+
+class StaticFilesStorageTest(SimpleTestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.storage = StaticFilesStorage(location=self.directory, base_url='/static/')
+
+    def collect(self, files: dict) -> None:
+        """
+        Write {path: content} into storage and post process them like collectstatic
+        """
+        for path, content in files.items():
+            os.makedirs(os.path.dirname(self.storage.path(path)), exist_ok=True)
+            with open(self.storage.path(path), 'wb') as file:
+                file.write(content)
+        for _name, _hashed_name, processed in self.storage.post_process({path: (self.storage, path) for path in files}):
+            if isinstance(processed, Exception):
+                raise processed
+
+    def test_missing_reference_is_left_as_is(self) -> None:
+        self.assertEqual(self.storage.hashed_name('images/missing.png'), 'images/missing.png')
+
+        self.collect({'css/theme.css': b'.icon { background: url("../images/missing.png"); }'})
+        with self.storage.open(self.storage.stored_name('css/theme.css')) as file:
+            self.assertIn(b'url("../images/missing.png")', file.read())
+
+    def test_existing_file_is_hashed(self) -> None:
+        self.collect({'images/logo.png': b'png', 'css/theme.css': b'.logo { background: url("../images/logo.png"); }'})
+        logo = self.storage.stored_name('images/logo.png')
+        self.assertNotEqual(logo, 'images/logo.png')
+        with self.storage.open(self.storage.stored_name('css/theme.css')) as file:
+            self.assertIn(('url("../%s")' % logo).encode(), file.read())
+
+    def test_vendored_files_keep_their_integrity(self) -> None:
+        paths = [*INTEGRITY, *(path + '.map' for path in INTEGRITY)]
+        files = {}
+        for path in paths:
+            with open(finders.find(path), 'rb') as file:
+                files[path] = file.read()
+        self.collect(files)
+
+        for path, expected in INTEGRITY.items():
+            with self.storage.open(self.storage.stored_name(path)) as file:
+                content = file.read()
+            self.assertEqual('sha384-' + base64.b64encode(hashlib.sha384(content).digest()).decode(), expected, path)